@@ -0,0 +1,253 @@
+# /benchmarks/bench_api.py
+
+"""
+Endpoint benchmark suite for the dashboard API
+
+Runs in-process with Flask's test client (no server or network needed). Every
+GET route under /api is swept over a fixed set of filter combinations: no
+filters, each of the six filters on its own, and all six together. Each case
+records p50/p95/p99 latency, response bytes and peak Python allocations.
+
+The response cache is disabled, so every request does the full computation.
+A fixed pandas workload is timed alongside the suite. Baseline latencies are
+scaled by its ratio before comparison, so a busier or slower machine isn't
+reported as a regression. Cases that still look slower are re-measured
+(--confirm times, with 3x the iterations) and only fail if every run is slower.
+
+Usage:
+    python benchmarks/bench_api.py                      # compare with the stored baseline
+    python benchmarks/bench_api.py --save               # record a new baseline
+    python benchmarks/bench_api.py --only kpis --iterations 100
+    python benchmarks/bench_api.py --data big.csv --baseline big_baseline.json --save
+
+Exits with status 1 when any case regresses by more than --threshold.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+DEFAULT_BASELINE = os.path.join(PROJECT_ROOT, 'benchmarks', 'baseline_api.json')
+
+# Query parameter -> dataset column, as understood by apply_filters
+FILTER_COLUMNS = {
+    'year': 'Year',
+    'quarter': 'Quarter',
+    'region': 'Region',
+    'product': 'Product',
+    'retailer': 'Retailer',
+    'sales_method': 'Sales Method',
+}
+
+# Latency differences below this are treated as noise, whatever the ratio
+MIN_LATENCY_DELTA_MS = 2.0
+
+
+def calibrate(runs=7):
+    """Median time (ms) of a fixed groupby + JSON workload, as a machine speed reference"""
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({'key': rng.integers(0, 50, 200_000), 'value': rng.random(200_000)})
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        json.dumps(frame.groupby('key')['value'].agg(['sum', 'mean']).to_dict())
+        frame['value'].to_json()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def create_bench_app(data_path=None):
+    """Build the dashboard app quietly, with the response cache off"""
+    os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    os.environ['DATA_RELOAD_INTERVAL'] = '0'
+    if data_path:
+        os.environ['DATA_PATH'] = os.path.abspath(data_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from dashboard import create_app
+        return create_app()
+
+
+def api_endpoints(app):
+    """Every parameterless GET route of the api blueprint"""
+    return sorted(rule.rule for rule in app.url_map.iter_rules()
+                  if rule.endpoint.startswith('api.') and 'GET' in rule.methods
+                  and not rule.arguments)
+
+
+def filter_combinations(df):
+    """
+    Representative filter sets: none, each filter alone and all six at once.
+    Values are the most common ones, and the six-filter set is the most
+    frequent full combination, so no case filters down to an empty frame.
+    """
+    combos = [('none', {})]
+    for param, col in FILTER_COLUMNS.items():
+        value = df[col].value_counts().idxmax()
+        combos.append((param, {param: str(value)}))
+    columns = list(FILTER_COLUMNS.values())
+    top = df.groupby(columns).size().idxmax()
+    combos.append(('all', {param: str(value) for param, value in zip(FILTER_COLUMNS, top)}))
+    return combos
+
+
+def run_case(client, url, iterations, warmup):
+    """Latency percentiles, response size and peak allocations for one URL"""
+    for _ in range(warmup):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned {response.status_code}')
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = client.get(url)
+        body = response.get_data()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Separate pass: tracemalloc slows allocations down and would skew the timings
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    client.get(url).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'bytes': len(body),
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def run_suite(app, iterations, warmup, only=None):
+    client = app.test_client()
+    with app.app_context():
+        df = app.dataset.df
+    combos = filter_combinations(df)
+    results = {}
+    for endpoint in api_endpoints(app):
+        if only and only not in endpoint:
+            continue
+        for name, params in combos:
+            query = '&'.join(f'{key}={value}' for key, value in params.items())
+            url = f'{endpoint}?{query}' if query else endpoint
+            results[f'{endpoint} [{name}]'] = dict(run_case(client, url, iterations, warmup), url=url)
+            print(f"  {endpoint:36} {name:13} p50 {results[f'{endpoint} [{name}]']['p50_ms']:8.2f} ms")
+    return results
+
+
+def find_regressions(baseline, results, threshold, speed=1.0):
+    """
+    Cases slower, larger or allocating more than threshold over the baseline.
+    Baseline latencies are multiplied by speed (current / baseline calibration).
+    """
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            expected = round(previous[metric] * speed, 3)
+            if (current[metric] - expected > MIN_LATENCY_DELTA_MS
+                    and current[metric] > expected * (1 + threshold)):
+                regressions.append((case, metric, expected, current[metric]))
+        for metric in ('bytes', 'peak_alloc_kb'):
+            if current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((case, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every /api endpoint across filter combinations')
+    parser.add_argument('--data', help='CSV to serve (default: $DATA_PATH or the bundled dataset)')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed requests per case')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per case')
+    parser.add_argument('--only', help='Only endpoints whose path contains this text')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed relative increase before a case counts as a regression')
+    parser.add_argument('--confirm', type=int, default=2,
+                        help='Re-runs of a slower-looking case before it counts as a regression')
+    args = parser.parse_args()
+
+    app = create_bench_app(args.data)
+    print(f"Benchmarking {len(app.dataset):,} rows, {args.iterations} iterations per case")
+    calibration = calibrate()
+    results = run_suite(app, args.iterations, args.warmup, args.only)
+    calibration = min(calibration, calibrate())
+
+    if args.save:
+        # A partial run (--only) updates its cases and keeps the rest
+        if args.only and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                results = dict(json.load(f)['results'], **results)
+        report = {
+            'meta': {
+                'calibration_ms': round(calibration, 3),
+                'rows': len(app.dataset),
+                'iterations': args.iterations,
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'machine': platform.machine(),
+            },
+            'results': results,
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\n[OK] Baseline written to: {args.baseline} ({len(results)} cases)")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save to record one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['meta']['rows'] != len(app.dataset):
+        print(f"\nWARNING: baseline was recorded on {baseline['meta']['rows']:,} rows, "
+              f"this run used {len(app.dataset):,}")
+
+    speed = calibration / baseline['meta']['calibration_ms']
+    print(f"\nMachine speed vs baseline: calibration {calibration:.1f} ms "
+          f"vs {baseline['meta']['calibration_ms']:.1f} ms (x{speed:.2f})")
+    regressions = find_regressions(baseline['results'], results, args.threshold, speed)
+
+    # Latency is noisy: re-measure suspects and keep their best run
+    suspects = sorted({case for case, metric, _, _ in regressions if metric.endswith('_ms')})
+    if suspects and args.confirm:
+        print(f"Re-measuring {len(suspects)} slower case(s)...")
+        client = app.test_client()
+        for case in suspects:
+            for _ in range(args.confirm):
+                rerun = run_case(client, results[case]['url'], 3 * args.iterations, args.warmup)
+                for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+                    results[case][metric] = min(results[case][metric], rerun[metric])
+        regressions = find_regressions(baseline['results'], results, args.threshold, speed)
+    if not regressions:
+        print(f"\n[OK] No regressions beyond {args.threshold:.0%} across {len(results)} cases")
+        return 0
+
+    print(f"\n[FAIL] {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+    for case, metric, before, after in regressions:
+        print(f"  {case:52} {metric:14} {before:>10} -> {after:>10} ({after / before - 1:+.0%})")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
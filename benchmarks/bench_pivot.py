@@ -0,0 +1,121 @@
+# /benchmarks/bench_pivot.py
+
+"""
+Pivot engine benchmark
+
+Runs a set of pivot specs through dashboard/pivot.py (bincount over integer
+group codes) and through the equivalent pandas groupby + unstack, checks
+that both give the same numbers, and reports the time of each. Each spec is
+timed unfiltered and filtered to the last year in the data.
+
+Usage:
+    python benchmarks/bench_pivot.py
+    python benchmarks/bench_pivot.py --data sales_1M.csv --repeat 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from dashboard.data_loader import load_data
+from dashboard.dataset import Dataset
+from dashboard.pivot import PIVOT_DIMENSIONS, PIVOT_MEASURES, parse_dimensions, parse_values, pivot
+
+DEFAULT_DATA = os.path.join(PROJECT_ROOT, 'data', 'adidas_sales_cleaned.csv')
+
+# (rows, columns, values)
+SPECS = [
+    ('region', '', 'sales:sum'),
+    ('product', 'year', 'sales:sum,profit:sum,count'),
+    ('region,product', 'quarter', 'sales:sum,units:mean,margin:weighted'),
+    ('state', 'sales_method', 'sales:sum,price:mean,count'),
+    ('city,product', 'year,month', 'sales:sum,margin:mean'),
+]
+
+
+def pandas_pivot(df, rows, columns, values):
+    """The same table with groupby + unstack: {value name: rows x columns DataFrame}"""
+    keys = [PIVOT_DIMENSIONS[dim] for dim in rows + columns]
+    frame = df.assign(_one=1)
+    sums = frame.groupby(keys, dropna=False, observed=True)[
+        list(PIVOT_MEASURES.values()) + ['_one']].sum() if keys else frame[
+        list(PIVOT_MEASURES.values()) + ['_one']].sum().to_frame().T
+    tables = {}
+    for measure, agg in values:
+        if agg == 'count':
+            cells = sums['_one']
+        elif agg == 'sum':
+            cells = sums[PIVOT_MEASURES[measure]]
+        elif agg == 'mean':
+            cells = sums[PIVOT_MEASURES[measure]] / sums['_one']
+        else:
+            cells = sums['Operating Profit'] / sums['Total Sales']
+        name = agg if measure is None else f'{measure}_{agg}'
+        if columns:
+            tables[name] = cells.unstack([PIVOT_DIMENSIONS[dim] for dim in columns]).sort_index(axis=1)
+        else:
+            tables[name] = cells.to_frame()
+    return tables
+
+
+def check(result, tables):
+    """Compare the engine's matrices with the pandas tables, cell by cell"""
+    for value in result['values']:
+        expected = tables[value['name']]
+        actual = np.array([[np.nan if cell is None else cell for cell in row] for row in value['data']],
+                          dtype=np.float64)
+        if expected.shape != actual.shape:
+            raise AssertionError(f"{value['name']}: shape {actual.shape} != {expected.shape}")
+        if not np.allclose(actual, expected.to_numpy(dtype=np.float64), equal_nan=True):
+            raise AssertionError(f"{value['name']}: values differ")
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pivot engine vs pandas groupby')
+    parser.add_argument('--data', default=DEFAULT_DATA, help='Sales CSV')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is kept)')
+    args = parser.parse_args()
+
+    df = load_data(args.data)
+    dataset = Dataset(df)
+    # A year-sized slice of the rows, like a ?year= filter
+    years = sorted(df['Year'].unique())
+    positions = np.flatnonzero(df['Year'].to_numpy() == years[-1])
+    print(f"{len(df):,} rows, filtered runs keep {len(positions):,}\n")
+
+    header = f"{'rows':<16} {'columns':<12} {'values':<36} {'filter':<7} {'engine':>9} {'pandas':>9} {'speedup':>8}"
+    print(header)
+    print('-' * len(header))
+    for rows, columns, values in SPECS:
+        rows, columns, values = parse_dimensions(rows), parse_dimensions(columns), parse_values(values)
+        for label, subset in (('none', None), ('year', positions)):
+            frame = df if subset is None else df.take(subset)
+            result = pivot(dataset, rows, columns, values, subset)
+            check(result, pandas_pivot(frame, rows, columns, values))
+            engine_ms = best_of(lambda: pivot(dataset, rows, columns, values, subset), args.repeat)
+            # The pandas path has to cut the filtered frame too
+            pandas_ms = best_of(lambda: pandas_pivot(df if subset is None else df.take(subset),
+                                                     rows, columns, values), args.repeat)
+            spec_values = ','.join(f'{m}:{a}' if m else a for m, a in values)
+            print(f"{','.join(rows):<16} {','.join(columns):<12} {spec_values:<36} {label:<7} "
+                  f"{engine_ms:>7.2f}ms {pandas_ms:>7.2f}ms {pandas_ms / engine_ms:>7.1f}x")
+    print("\nAll results match pandas.")
+
+
+if __name__ == '__main__':
+    main()
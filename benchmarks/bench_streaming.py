@@ -0,0 +1,122 @@
+# /benchmarks/bench_streaming.py
+
+"""
+Scaling benchmark for the streaming loader
+
+Builds larger CSVs by tiling the bundled dataset, then loads each one in a
+fresh interpreter with load_data (full frame) and with the streaming rollup.
+Reports load time, peak RSS and the rows kept in memory against the row count.
+
+By default the copies cover the same period with perturbed measures, like a
+transaction-level history with many sales per day, product and store. With
+--shift-years each copy is moved forward instead, so every copy adds new
+keys: the worst case for the rollup, whose size tracks distinct keys.
+
+Usage:
+    python benchmarks/bench_streaming.py                  # 1x, 4x, 16x, 64x
+    python benchmarks/bench_streaming.py --scales 1 10 100 --skip-full
+    python benchmarks/bench_streaming.py --shift-years
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from dashboard.data_loader import COLUMNS
+
+DEFAULT_DATA = os.path.join(PROJECT_ROOT, 'data', 'adidas_sales_cleaned.csv')
+
+# Peak RSS is measured in a fresh interpreter so loads don't share a heap.
+# The baseline is taken after the imports, so only the load itself counts.
+LOAD_PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+from dashboard.data_loader import load_data
+from dashboard.streaming import load_rollup
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+df = load_data({path!r}) if {mode!r} == 'full' else load_rollup({path!r}, {chunksize})
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'peak_mb': (peak - baseline) / 1024,
+                  'rows_in_memory': len(df)}}))
+"""
+
+
+def write_scaled_csv(source, scale, path, shift_years=False):
+    """
+    Write `scale` copies of source.
+    Copies share the original dates with units scaled by a random factor, or
+    with shift_years, copy i is moved forward by 4 * i years.
+    """
+    df = pd.read_csv(source)
+    dates = pd.to_datetime(df['Invoice Date'])
+    rng = np.random.default_rng(0)
+    with open(path, 'w') as f:
+        for i in range(scale):
+            if shift_years:
+                shifted = dates + pd.DateOffset(years=4 * i)
+                copy = df.assign(**{
+                    'Invoice Date': shifted.dt.strftime('%Y-%m-%d'),
+                    'Year': shifted.dt.year,
+                    'Day_of_Week': shifted.dt.day_name(),
+                })
+            else:
+                factor = rng.uniform(0.5, 1.5, len(df))
+                units = np.maximum(1, (df['Units Sold'] * factor).round()).astype('int64')
+                sales = (units * df['Price per Unit']).round().astype('int64')
+                copy = df.assign(**{
+                    'Units Sold': units,
+                    'Total Sales': sales,
+                    'Operating Profit': (sales * df['Operating Margin']).round().astype('int64'),
+                })
+            copy[COLUMNS].to_csv(f, index=False, header=(i == 0))
+    return len(df) * scale
+
+
+def measure(path, mode, chunksize):
+    probe = LOAD_PROBE.format(root=PROJECT_ROOT, path=path, mode=mode, chunksize=chunksize)
+    out = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full vs streaming load as the dataset grows')
+    parser.add_argument('--data', default=DEFAULT_DATA, help='CSV to tile (default: bundled dataset)')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help='Copies of the dataset per run')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='Rows per streamed chunk')
+    parser.add_argument('--shift-years', action='store_true',
+                        help='Extend the period with each copy instead of adding transactions')
+    parser.add_argument('--skip-full', action='store_true',
+                        help='Only run the streaming loader (for sizes that do not fit in RAM)')
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'CSV MB':>8} | {'full s':>7} {'peak MB':>8} {'kept':>10} |"
+          f" {'stream s':>8} {'peak MB':>8} {'kept':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            path = os.path.join(tmp, f'sales_x{scale}.csv')
+            rows = write_scaled_csv(args.data, scale, path, args.shift_years)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+
+            full = None if args.skip_full else measure(path, 'full', args.chunksize)
+            stream = measure(path, 'stream', args.chunksize)
+            full_cols = (f"{full['seconds']:7.2f} {full['peak_mb']:8.1f} {full['rows_in_memory']:10,}"
+                         if full else f"{'-':>7} {'-':>8} {'-':>10}")
+            print(f"{rows:12,} {size_mb:8.1f} | {full_cols} |"
+                  f" {stream['seconds']:8.2f} {stream['peak_mb']:8.1f} {stream['rows_in_memory']:8,}")
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
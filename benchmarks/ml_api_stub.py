@@ -0,0 +1,125 @@
+# /benchmarks/ml_api_stub.py
+
+"""
+Offline stand-in for the ML API
+
+Serves the same endpoints as ml_api/app.py. It needs no trained model and no
+network. Predictions come from a fixed formula, and a configurable delay
+stands in for model inference. Point the dashboard at it to load-test the
+prediction pages without the real service:
+
+    python benchmarks/ml_api_stub.py --port 5002 --latency-ms 15
+    ML_API_URL=http://127.0.0.1:5002 python run.py
+
+Dropdown metadata is read from predictions/trained_models/metadata.json when
+it exists.
+"""
+
+import argparse
+import json
+import os
+import time
+import zlib
+
+from flask import Flask, jsonify, request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METADATA_PATH = os.path.join(PROJECT_ROOT, 'predictions', 'trained_models', 'metadata.json')
+
+REQUIRED_FIELDS = ['retailer', 'region', 'product', 'sales_method', 'price_per_unit', 'month', 'quarter']
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+# Fixed "model" metrics, same keys as the trained model's
+STUB_METRICS = {'units_r2': 0.9, 'units_mae': 25.0, 'revenue_r2': 0.9, 'revenue_mae': 1500.0}
+
+
+def load_metadata():
+    if os.path.exists(METADATA_PATH):
+        with open(METADATA_PATH) as f:
+            return json.load(f)
+    return {'months': MONTH_NAMES, 'quarters': [1, 2, 3, 4]}
+
+
+def stub_prediction(data):
+    """Deterministic prediction with the same keys as predictor.predict_demand"""
+    price = float(data['price_per_unit'])
+    month = data['month']
+    month_number = MONTH_NAMES.index(month) + 1 if isinstance(month, str) else int(month)
+    # Same inputs, same answer: hash the categorical fields into a base volume
+    key = '|'.join(str(data[field]) for field in ('retailer', 'region', 'product', 'sales_method'))
+    units = max(0.0, 100 + zlib.crc32(key.encode()) % 400 + 10 * month_number - 2 * price)
+    margin = STUB_METRICS['units_mae'] * 1.96
+    confidence = max(0.0, min(100.0, 100 * (1 - min(STUB_METRICS['units_mae'] / max(units, 1), 1))))
+    return {
+        'predicted_units': units,
+        'predicted_sales': units * price,
+        'price_per_unit': price,
+        'units_lower': max(0.0, units - margin),
+        'units_upper': units + margin,
+        'units_margin': margin,
+        'sales_lower': max(0.0, units - margin) * price,
+        'sales_upper': (units + margin) * price,
+        'sales_margin': STUB_METRICS['revenue_mae'] * 1.96,
+        'confidence_score': confidence,
+        'confidence_level': 'High' if confidence >= 75 else 'Medium' if confidence >= 50 else 'Low',
+        'model_type': 'stub',
+        **STUB_METRICS,
+    }
+
+
+def create_stub_app(latency_ms=0.0):
+    app = Flask(__name__)
+    metadata = load_metadata()
+
+    @app.route('/')
+    def home():
+        return jsonify({'status': 'online', 'service': 'Kicks ML Prediction API (stub)',
+                        'models_available': True, 'version': 'stub'})
+
+    @app.route('/health')
+    def health():
+        return jsonify({'status': 'healthy', 'models': 'loaded'})
+
+    @app.route('/api/metadata')
+    def get_metadata():
+        return jsonify(metadata)
+
+    @app.route('/api/metrics')
+    def get_metrics():
+        return jsonify(STUB_METRICS)
+
+    @app.route('/api/check-models')
+    def check_models():
+        return jsonify({'available': True, 'message': 'Model ready for predictions'})
+
+    # The dashboard forwards to /api/predict-demand, the ML API serves /api/predict
+    @app.route('/api/predict', methods=['POST'])
+    @app.route('/api/predict-demand', methods=['POST'])
+    def predict():
+        data = request.get_json(silent=True) or {}
+        missing = [field for field in REQUIRED_FIELDS if field not in data]
+        if missing:
+            return jsonify({'error': f'Missing required field: {missing[0]}'}), 400
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        try:
+            return jsonify(stub_prediction(data))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline stand-in for the ML API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='Delay added to every prediction, standing in for inference')
+    args = parser.parse_args()
+    create_stub_app(args.latency_ms).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
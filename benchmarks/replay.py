@@ -0,0 +1,244 @@
+# /benchmarks/replay.py
+
+"""
+Replay recorded traffic against local instances
+
+Reads the JSON-lines traces written with TRACE_LOG (observability/recorder.py,
+used by both services) and sends the requests again with their recorded spacing.
+--speed 1 replays in real time, --speed N compresses the gaps N times, and
+--speed 0 sends as fast as the workers allow. Requests are dispatched on
+schedule whether or not earlier ones have finished (open loop). When all
+--concurrency workers are busy, requests queue up, and the wait shows up as
+dispatch lag.
+
+The report covers throughput, latency percentiles and error rates overall
+and per path. Error rates count 5xx and connection errors; 4xx are reported
+separately. Requests whose body was not recorded (non-JSON) are skipped, as
+are services without a target URL.
+
+Fully offline: run the dashboard against benchmarks/ml_api_stub.py instead
+of the real ML API.
+
+    python benchmarks/ml_api_stub.py --port 5002 --latency-ms 15 &
+    ML_API_URL=http://127.0.0.1:5002 python run.py &
+    python benchmarks/replay.py traces.jsonl --speed 10 --concurrency 16
+    python benchmarks/replay.py traces.jsonl* --ml-api http://127.0.0.1:5002 --json report.json
+"""
+
+import argparse
+import http.client
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+DEFAULT_TARGETS = {'dashboard': 'http://127.0.0.1:5001', 'ml_api': None}
+
+
+def load_traces(paths):
+    """All records from the given trace files, in arrival order"""
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    records.sort(key=lambda record: record['ts'])
+    return records
+
+
+class Worker(threading.Thread):
+    """Sends queued requests over one keep-alive connection per target"""
+
+    def __init__(self, jobs, results, targets, timeout):
+        super().__init__(daemon=True)
+        self.jobs = jobs
+        self.results = results
+        self.targets = targets
+        self.timeout = timeout
+        self.connections = {}
+
+    def _connection(self, service):
+        conn = self.connections.get(service)
+        if conn is None:
+            url = urlsplit(self.targets[service])
+            cls = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+            conn = self.connections[service] = cls(url.hostname, url.port, timeout=self.timeout)
+        return conn
+
+    def _path_prefix(self, service):
+        return urlsplit(self.targets[service]).path.rstrip('/')
+
+    def _send(self, record):
+        target = self._path_prefix(record['service']) + record['path']
+        if record.get('query'):
+            target += '?' + urlencode([tuple(pair) for pair in record['query']])
+        body, headers = None, {}
+        if 'body' in record:
+            body = json.dumps(record['body']).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        conn = self._connection(record['service'])
+        try:
+            conn.request(record['method'], target, body=body, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+            return response.status, len(payload), None
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            self.connections.pop(record['service'], None)
+            return None, 0, type(e).__name__
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            record, due = job
+            sent = time.perf_counter()
+            status, size, error = self._send(record)
+            done = time.perf_counter()
+            self.results.append({
+                'service': record['service'],
+                'key': f"{record['method']} {record['path']}",
+                'status': status,
+                'error': error,
+                'recorded_status': record.get('status'),
+                'latency_ms': (done - sent) * 1000,
+                'lag_ms': (sent - due) * 1000,
+                'bytes': size,
+            })
+
+
+def replay(records, targets, speed, concurrency, timeout):
+    """Send records on their (scaled) schedule; returns (results, wall seconds)"""
+    jobs, results = queue.Queue(), []
+    workers = [Worker(jobs, results, targets, timeout) for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+
+    start = time.perf_counter()
+    first_ts = records[0]['ts'] if records else 0.0
+    for record in records:
+        due = start + ((record['ts'] - first_ts) / speed if speed > 0 else 0.0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        jobs.put((record, due))
+    for _ in workers:
+        jobs.put(None)
+    for worker in workers:
+        worker.join()
+    return results, time.perf_counter() - start
+
+
+def summarize(results):
+    latencies = np.array([r['latency_ms'] for r in results]) if results else np.zeros(1)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    server_errors = sum(1 for r in results if r['error'] or r['status'] >= 500)
+    client_errors = sum(1 for r in results if r['status'] is not None and 400 <= r['status'] < 500)
+    return {
+        'requests': len(results),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(latencies.max()), 2),
+        'error_rate': round(server_errors / len(results), 4) if results else 0.0,
+        'client_error_rate': round(client_errors / len(results), 4) if results else 0.0,
+        'status_changed': sum(1 for r in results
+                              if r['recorded_status'] is not None and r['status'] != r['recorded_status']),
+        'bytes': sum(r['bytes'] for r in results),
+    }
+
+
+def build_report(results, wall, skipped, speed, concurrency):
+    by_key = {}
+    for result in results:
+        by_key.setdefault(result['key'], []).append(result)
+    lags = np.array([r['lag_ms'] for r in results]) if results else np.zeros(1)
+    errors = {}
+    for result in results:
+        if result['error']:
+            errors[result['error']] = errors.get(result['error'], 0) + 1
+    return {
+        'speed': speed,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(results) / wall, 2) if wall else 0.0,
+        'skipped': skipped,
+        'dispatch_lag_p95_ms': round(float(np.percentile(lags, 95)), 2),
+        'connection_errors': errors,
+        'overall': summarize(results),
+        'paths': {key: summarize(items) for key, items in sorted(by_key.items())},
+    }
+
+
+def print_report(report):
+    overall = report['overall']
+    pace = f"at {report['speed']:g}x speed" if report['speed'] else 'unpaced'
+    print(f"Replayed {overall['requests']} requests in {report['wall_seconds']:.1f}s "
+          f"{pace} with {report['concurrency']} workers "
+          f"({report['throughput_rps']:.1f} req/s)")
+    if report['skipped']:
+        print(f"Skipped: {report['skipped']}")
+    print(f"Dispatch lag p95: {report['dispatch_lag_p95_ms']:.1f} ms")
+    if report['connection_errors']:
+        print(f"Connection errors: {report['connection_errors']}")
+    print()
+    header = f"{'path':<48} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'5xx':>7} {'4xx':>7}"
+    print(header)
+    print('-' * len(header))
+    rows = list(report['paths'].items()) + [('TOTAL', overall)]
+    for key, stats in rows:
+        print(f"{key[:48]:<48} {stats['requests']:>6} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+              f"{stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f} {stats['error_rate']:>7.1%} "
+              f"{stats['client_error_rate']:>7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded request traces against local instances')
+    parser.add_argument('traces', nargs='+', help='Trace files written with TRACE_LOG')
+    parser.add_argument('--dashboard', default=DEFAULT_TARGETS['dashboard'], help='Dashboard base URL')
+    parser.add_argument('--ml-api', default=DEFAULT_TARGETS['ml_api'],
+                        help='ML API (or ml_api_stub.py) base URL; ml_api traces are skipped without it')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed: 1 = as recorded, N = N times faster, 0 = no pacing')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of worker connections')
+    parser.add_argument('--limit', type=int, default=0, help='Replay only the first N requests')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--json', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    targets = {'dashboard': args.dashboard, 'ml_api': args.ml_api}
+    records, skipped = [], {}
+    for record in load_traces(args.traces):
+        service = record.get('service', 'dashboard')
+        reason = None
+        if not targets.get(service):
+            reason = f'no target for {service}'
+        elif 'body_bytes' in record:
+            reason = 'body not recorded'
+        if reason:
+            skipped[reason] = skipped.get(reason, 0) + 1
+            continue
+        record['service'] = service
+        records.append(record)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        parser.error('no replayable requests in the trace files')
+
+    results, wall = replay(records, targets, args.speed, args.concurrency, args.timeout)
+    report = build_report(results, wall, skipped, args.speed, args.concurrency)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
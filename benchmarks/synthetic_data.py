@@ -0,0 +1,127 @@
+# /benchmarks/synthetic_data.py
+
+"""
+Synthetic sales data generator
+
+Produces datasets with the schema of adidas_sales_cleaned.csv at any size, so
+O(n) costs that are invisible at 9.6k rows can be measured. Rows are
+bootstrapped from the source CSV, which keeps the joint distribution of
+Retailer / Retailer ID / Region / State / City / Product / Sales Method and
+the price per product. Then, per row:
+
+- the invoice date moves by up to +/-14 days, clamped to the source date
+  range, and the calendar columns are recomputed from it
+- units, sales and profit are scaled by one lognormal factor, so their ratios
+  (price quirks and margins included) are preserved
+
+Rows are written in chunks, so 10M rows need no more memory than one chunk.
+
+Usage:
+    python benchmarks/synthetic_data.py --rows 1M
+    python benchmarks/synthetic_data.py --rows 100k 1M 10M --output-dir data/synthetic
+
+The files work anywhere a dataset path is accepted:
+    DATA_PATH=data/synthetic/sales_1M.csv python run.py
+    python benchmarks/bench_api.py --data data/synthetic/sales_1M.csv --baseline ... --save
+    python predictions/train_models.py --data data/synthetic/sales_1M.csv --model-dir /tmp/models
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from dashboard.data_loader import COLUMNS, load_data
+
+DEFAULT_SOURCE = os.path.join(PROJECT_ROOT, 'data', 'adidas_sales_cleaned.csv')
+DEFAULT_OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'data', 'synthetic')
+
+CHUNK_ROWS = 500_000
+DATE_JITTER_DAYS = 14
+# Spread of the per-row volume factor (lognormal sigma, mean 1)
+VOLUME_SIGMA = 0.25
+
+
+def parse_size(text):
+    """'100k' -> 100000, '1M' -> 1000000, '2500' -> 2500"""
+    text = text.strip().lower().replace('_', '').replace(',', '')
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+
+def format_size(rows):
+    if rows % 1_000_000 == 0:
+        return f'{rows // 1_000_000}M'
+    if rows % 1_000 == 0:
+        return f'{rows // 1_000}k'
+    return str(rows)
+
+
+def synthesize_chunk(source, rows, rng):
+    """Bootstrap `rows` rows from source and perturb dates and volumes"""
+    sample = source.iloc[rng.integers(0, len(source), rows)].reset_index(drop=True)
+
+    first, last = source['Invoice Date'].min(), source['Invoice Date'].max()
+    offsets = pd.to_timedelta(rng.integers(-DATE_JITTER_DAYS, DATE_JITTER_DAYS + 1, rows), unit='D')
+    dates = (sample['Invoice Date'] + offsets).clip(first, last)
+
+    factor = rng.lognormal(-VOLUME_SIGMA ** 2 / 2, VOLUME_SIGMA, rows)
+    units = np.round(sample['Units Sold'].to_numpy() * factor).astype(np.int64)
+    sales = np.round(sample['Total Sales'].to_numpy() * factor).astype(np.int64)
+    profit = np.round(sales * sample['Operating Margin'].to_numpy()).astype(np.int64)
+
+    sample['Invoice Date'] = dates
+    sample['Units Sold'] = units
+    sample['Total Sales'] = sales
+    sample['Operating Profit'] = profit
+    sample['Year'] = dates.dt.year
+    sample['Month'] = dates.dt.month
+    sample['Month_Name'] = dates.dt.month_name()
+    sample['Quarter'] = dates.dt.quarter
+    sample['Day_of_Week'] = dates.dt.day_name()
+    return sample[COLUMNS]
+
+
+def generate(source, rows, path, seed=0, chunk_rows=CHUNK_ROWS):
+    """Write `rows` synthetic rows to path, one chunk at a time"""
+    rng = np.random.default_rng(seed)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        written = 0
+        while written < rows:
+            chunk = synthesize_chunk(source, min(chunk_rows, rows - written), rng)
+            chunk.to_csv(f, index=False, header=(written == 0), date_format='%Y-%m-%d')
+            written += len(chunk)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic sales datasets')
+    parser.add_argument('--rows', nargs='+', default=['100k'],
+                        help='Dataset sizes, e.g. 100k 1M 10M')
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help='CSV to model the data on')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help='Where to write sales_<size>.csv')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (same seed, same data)')
+    args = parser.parse_args()
+
+    source = load_data(args.source)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for size in args.rows:
+        rows = parse_size(size)
+        path = os.path.join(args.output_dir, f'sales_{format_size(rows)}.csv')
+        start = time.perf_counter()
+        generate(source, rows, path, seed=args.seed)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"[OK] {rows:,} rows -> {path} ({size_mb:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
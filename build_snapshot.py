@@ -0,0 +1,112 @@
+# /build_snapshot.py
+
+"""
+Build-time dataset snapshot
+
+Runs load_data and the per-load precomputation once and writes the result to
+a single memory-mappable snapshot file next to the CSV. create_app picks the
+snapshot up automatically and falls back to the CSV if it is missing or stale.
+
+Usage:
+    python build_snapshot.py               # build data/adidas_sales_cleaned.snapshot
+    python build_snapshot.py --compare     # also measure cold start both ways
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Add the project root to the Python path for better import resolution
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_ROOT)
+
+from dashboard.data_loader import load_data, snapshot_path_for
+from dashboard.dataset import Dataset
+from dashboard.snapshot import write_snapshot
+
+DEFAULT_DATA = os.path.join(PROJECT_ROOT, 'data', 'adidas_sales_cleaned.csv')
+
+# Timed in a fresh interpreter so each run is a genuine cold start.
+# Prints the full create_app() time and the dataset load alone.
+COLD_START_PROBE = """
+import os, sys, time, io, contextlib
+sys.path.insert(0, {root!r})
+with contextlib.redirect_stdout(io.StringIO()):
+    start = time.perf_counter()
+    from dashboard import create_app
+    create_app()
+    app_time = time.perf_counter() - start
+    from dashboard.data_loader import load_dataset
+    start = time.perf_counter()
+    load_dataset(os.environ['DATA_PATH'])
+    load_time = time.perf_counter() - start
+print(app_time, load_time)
+"""
+
+
+def build(data_path, snapshot_path):
+    """Load the CSV, precompute everything and write the snapshot"""
+    start = time.perf_counter()
+    dataset = Dataset(load_data(data_path), source=data_path)
+    header = write_snapshot(dataset, snapshot_path, source_path=data_path)
+    elapsed = time.perf_counter() - start
+
+    size_mb = os.path.getsize(snapshot_path) / (1024 * 1024)
+    print(f"[OK] Snapshot written to: {snapshot_path}")
+    print(f"  Rows: {header['rows']:,}")
+    print(f"  Size: {size_mb:.2f} MB")
+    print(f"  Build time: {elapsed:.2f}s")
+
+
+def cold_start(env_overrides, runs):
+    """Median (create_app, dataset load) times over fresh interpreters"""
+    env = dict(os.environ, **env_overrides)
+    probe = COLD_START_PROBE.format(root=PROJECT_ROOT)
+    app_times, load_times = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', probe], env=env,
+                             capture_output=True, text=True, check=True)
+        app_time, load_time = out.stdout.strip().splitlines()[-1].split()
+        app_times.append(float(app_time))
+        load_times.append(float(load_time))
+    app_times.sort()
+    load_times.sort()
+    return app_times[len(app_times) // 2], load_times[len(load_times) // 2]
+
+
+def compare(data_path, snapshot_path, runs):
+    """Measure cold start with the CSV and with the snapshot"""
+    base = {'DATA_PATH': data_path}
+    csv_app, csv_load = cold_start(dict(base, DATA_SNAPSHOT='off'), runs)
+    snap_app, snap_load = cold_start(dict(base, DATA_SNAPSHOT=snapshot_path), runs)
+
+    print(f"\nCold start (median of {runs} fresh interpreters):")
+    print(f"  {'':10} {'create_app':>12} {'data load':>12}")
+    print(f"  {'CSV':10} {csv_app * 1000:9.1f} ms {csv_load * 1000:9.1f} ms")
+    print(f"  {'Snapshot':10} {snap_app * 1000:9.1f} ms {snap_load * 1000:9.1f} ms")
+    print(f"  {'Speedup':10} {csv_app / snap_app:11.2f}x {csv_load / snap_load:11.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the dashboard dataset snapshot')
+    parser.add_argument('--data', default=os.environ.get('DATA_PATH', DEFAULT_DATA),
+                        help='Source CSV (default: $DATA_PATH or the bundled dataset)')
+    parser.add_argument('--output', help='Snapshot path (default: next to the CSV)')
+    parser.add_argument('--compare', action='store_true',
+                        help='Measure cold-start time with and without the snapshot')
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts per measurement')
+    args = parser.parse_args()
+
+    snapshot_path = args.output or snapshot_path_for(args.data)
+    if not snapshot_path:
+        parser.error('Snapshots are disabled (DATA_SNAPSHOT=off); pass --output')
+
+    build(args.data, snapshot_path)
+    if args.compare:
+        compare(args.data, snapshot_path, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 from flask import Flask
 import os
 import sys
+import threading
 import traceback
 
 def create_app():
@@ -23,7 +24,7 @@ def create_app():
         # Load the data and attach it to the app context
         # Use absolute path from project root for better compatibility with Vercel
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        data_path = os.path.join(project_root, 'data', 'adidas_sales_cleaned.csv')
+        data_path = os.environ.get('DATA_PATH') or os.path.join(project_root, 'data', 'adidas_sales_cleaned.csv')
 
         print(f"Looking for data file at: {data_path}")
         print(f"Project root: {project_root}")
@@ -38,9 +39,76 @@ def create_app():
                 print(f"Files in data directory: {os.listdir(os.path.join(project_root, 'data'))}")
             raise FileNotFoundError(f"Data file not found at: {data_path}")
 
-        from .data_loader import load_data
-        app.df = load_data(data_path)
-        print(f"Successfully loaded data with {len(app.df)} rows")
+        from .data_loader import load_dataset
+        from observability.memory import process_memory, format_memory
+        from .memory import MemoryRegistry
+        from .cache import ResponseCache
+        from .crossfilter import CrossfilterSessions
+        from .sampling import APPROX_BUDGET_MS, LatencyTracker
+        from .ingest import Ingestor
+        from .reloader import DatasetReloader
+
+        # Response cache keyed by dataset version, hot reload of the data file
+        # and incremental ingestion (all writers share app.dataset_lock)
+        app.dataset_lock = threading.Lock()
+        app.memory = MemoryRegistry(int(float(os.environ.get('MEMORY_BUDGET_MB', '0')) * 1024 * 1024))
+        app.response_cache = ResponseCache(int(os.environ.get('RESPONSE_CACHE_SIZE', '256')))
+        app.crossfilter = CrossfilterSessions(int(os.environ.get('CROSSFILTER_SESSIONS', '32')))
+        # Approximate answers from stratified samples (approx=1, budget_ms or APPROX_BUDGET_MS)
+        app.approx_budget_ms = APPROX_BUDGET_MS
+        app.exact_latency = LatencyTracker()
+        app.reloader = DatasetReloader(app, data_path, float(os.environ.get('DATA_RELOAD_INTERVAL', '0')))
+        app.ingestor = Ingestor(app, data_path, int(os.environ.get('INGEST_COMPACT_ROWS', '10000')))
+        app.before_request(app.reloader.ensure_watching)
+        # Rows, compactions and reloads of the other gunicorn workers
+        app.before_request(app.reloader.follow)
+
+        # Prometheus metrics on /metrics, then Server-Timing headers and
+        # per-phase latency windows (SERVER_TIMING=1), the slow-request log
+        # (SLOW_REQUEST_MS) and request traces for replay (TRACE_LOG)
+        from .metrics import init_metrics
+        from .timing import init_timing
+        from .slowlog import init_slowlog
+        from observability.recorder import init_recorder
+        init_metrics(app)
+        init_timing(app)
+        init_slowlog(app)
+        init_recorder(app, 'dashboard')
+
+        # Per-request profiling behind PROFILE_SECRET, or every PROFILE_EVERY_N requests
+        from observability.profiling import init_profiling
+        init_profiling(app, os.path.join(app.instance_path, 'profiles'))
+
+        # Read-only arrays let forked gunicorn workers share the data pages.
+        # Rows ingested since the last compaction are replayed from the append log.
+        with app.ingestor.log_lock():
+            app.dataset = app.ingestor.replay(load_dataset(data_path).freeze())
+        print(f"Successfully loaded data with {len(app.dataset)} rows")
+        # Built before any fork, so gunicorn workers share the drilldown tree,
+        # the time partitions, the period cube and the sample
+        app.dataset.geo_tree
+        app.dataset.partitions
+        app.dataset.period_cube
+        if app.dataset.sample is not None:
+            print(f"Approximate mode sample: {len(app.dataset.sample)} rows")
+        print(f"Memory after data load: {format_memory(process_memory())}")
+
+        # Large structures report their size; over MEMORY_BUDGET_MB the
+        # response cache is evicted (least recently used entries first)
+        app.memory.register('dataset', lambda: app.dataset.memory_bytes())
+        app.memory.register('aggregates', lambda: app.dataset.aggregates_memory_bytes())
+        app.memory.register('date_index', lambda: app.dataset.date_index_memory_bytes())
+        app.memory.register('group_codes', lambda: app.dataset.group_codes_memory_bytes())
+        app.memory.register('geo_tree', lambda: app.dataset.geo_tree_memory_bytes())
+        app.memory.register('sort_indexes', lambda: app.dataset.sort_indexes_memory_bytes())
+        app.memory.register('partitions', lambda: app.dataset.partitions_memory_bytes())
+        app.memory.register('period_cube', lambda: app.dataset.period_cube_memory_bytes())
+        app.memory.register('sample', lambda: app.dataset.sample_memory_bytes())
+        app.memory.register('response_cache', lambda: app.response_cache.bytes,
+                            evict=app.response_cache.evict)
+        # Sessions are dropped only after the response cache (higher priority)
+        app.memory.register('crossfilter', lambda: app.crossfilter.bytes,
+                            evict=app.crossfilter.evict, priority=1)
 
         # Define color constants and attach to app context
         app.COLORS = {
@@ -56,6 +124,10 @@ def create_app():
             from .api import bp as api_bp
             app.register_blueprint(api_bp)
 
+            # Register the admin blueprint (dataset reload)
+            from .admin import bp as admin_bp
+            app.register_blueprint(admin_bp)
+
             # Register all the page blueprints
             from .pages.sales import bp as sales_bp
             from .pages.product import bp as product_bp
@@ -69,6 +141,13 @@ def create_app():
             app.register_blueprint(ml_prediction_bp)
             app.register_blueprint(about_bp)
 
+            from .pages.ml_prediction.routes import model_memory_bytes
+            app.memory.register('ml_model', model_memory_bytes)
+
+        if app.memory.budget_bytes and app.memory.total() > app.memory.budget_bytes:
+            print(f"WARNING: tracked memory {app.memory.total() / (1024 * 1024):.1f}MB is over "
+                  f"MEMORY_BUDGET_MB before any caching")
+
         print("Flask app created successfully!")
         return app
 
@@ -0,0 +1,7 @@
+# /dashboard/admin/__init__.py
+
+from flask import Blueprint
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+from . import routes
@@ -0,0 +1,105 @@
+# /dashboard/admin/routes.py
+
+import hmac
+import os
+from functools import wraps
+
+from flask import jsonify, current_app, request
+from observability.memory import process_memory
+from . import bp
+from ..ingest import BatchError, parse_batch, validate_batch
+
+def require_admin_token(view):
+    """
+    Protect an admin endpoint with the ADMIN_TOKEN environment variable.
+    The token is sent in the X-Admin-Token header; without ADMIN_TOKEN the
+    admin endpoints are disabled.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = os.environ.get('ADMIN_TOKEN')
+        if not expected:
+            return jsonify({'error': 'Admin endpoints are disabled (ADMIN_TOKEN not set)'}), 404
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(supplied.encode(), expected.encode()):
+            return jsonify({'error': 'Invalid admin token'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@bp.route('/dataset')
+@require_admin_token
+def dataset_status():
+    """Current dataset version and the result of the last reload"""
+    dataset = current_app.dataset
+    return jsonify({
+        'version': dataset.version,
+        'rows': len(dataset),
+        'source': str(dataset.source),
+        'file_changed': current_app.reloader.changed(),
+        'last_reload': current_app.reloader.last_result,
+        'pending_log_rows': current_app.ingestor.log_rows,
+    })
+
+@bp.route('/timings')
+@require_admin_token
+def request_timings():
+    """Rolling per-route, per-phase latency percentiles and histograms"""
+    return jsonify({
+        'enabled': current_app.timing_enabled,
+        'window': current_app.timing_stats.window,
+        'routes': current_app.timing_stats.summary(),
+    })
+
+@bp.route('/memory')
+@require_admin_token
+def memory_breakdown():
+    """Tracked structure sizes against MEMORY_BUDGET_MB, plus process RSS/PSS"""
+    report = current_app.memory.report()
+    process = process_memory()
+    report['process'] = process
+    report['untracked_bytes'] = max(0, process.get('pss', process['rss']) - report['tracked_bytes'])
+    return jsonify(report)
+
+@bp.route('/reload', methods=['POST'])
+@require_admin_token
+def reload_dataset():
+    """Reload the dataset file in the background and swap it in, in every worker"""
+    # The other workers reload on their next request
+    current_app.reloader.broadcast()
+    started = current_app.reloader.reload_async()
+    return jsonify({
+        'status': 'started' if started else 'already running',
+        'version': current_app.dataset.version,
+    }), 202
+
+@bp.route('/ingest', methods=['POST'])
+@require_admin_token
+def ingest_rows():
+    """
+    Append a batch of new rows (same schema as adidas_sales_cleaned.csv).
+    Accepts a JSON list of rows, {"rows": [...]}, or a text/csv body.
+    """
+    try:
+        batch = validate_batch(parse_batch(request.get_data(), request.content_type))
+    except BatchError as e:
+        return jsonify({'error': 'Invalid batch', 'details': e.errors}), 400
+    except ValueError as e:
+        return jsonify({'error': f'Could not parse batch: {e}'}), 400
+
+    dataset = current_app.ingestor.ingest(batch)
+    return jsonify({
+        'status': 'ingested',
+        'rows': len(batch),
+        'version': dataset.version,
+        'total_rows': len(dataset),
+    })
+
+@bp.route('/compact', methods=['POST'])
+@require_admin_token
+def compact_log():
+    """Fold the ingestion append log into the CSV in the background"""
+    started = current_app.ingestor.compact_async()
+    return jsonify({
+        'status': 'started' if started else 'already running',
+        'pending_log_rows': current_app.ingestor.log_rows,
+    }), 202
@@ -0,0 +1,89 @@
+# /dashboard/aggregates.py
+
+"""
+Incrementally maintained aggregates.
+
+Everything here is additive: sums plus row counts, never means. Rolled-up
+frames (streaming mode) count each row as its 'Row Count' transactions. Aggregates for
+an appended batch can therefore be merged into the existing ones in
+O(groups) instead of rescanning every row. Means (average margin) are derived
+from sum / count when read.
+"""
+
+import pandas as pd
+
+# Transactions per row in a rolled-up frame (see streaming.py)
+ROW_COUNT = 'Row Count'
+
+MEASURES = ['Total Sales', 'Operating Profit', 'Units Sold', 'Operating Margin']
+GROUP_DIMENSIONS = ['Product', 'Retailer', 'Region', 'Sales Method', 'State']
+
+
+class Aggregates:
+    """Dataset totals and per-dimension group sums"""
+
+    def __init__(self, totals, groups):
+        # totals: Series of measure sums plus 'count'
+        # groups: {dimension: DataFrame indexed by member, measure sums plus 'count'}
+        self.totals = totals
+        self.groups = groups
+
+    @classmethod
+    def from_frame(cls, df):
+        """Aggregate a frame in one pass per dimension"""
+        weighted = ROW_COUNT in df.columns
+        totals = df[MEASURES].sum()
+        totals['count'] = df[ROW_COUNT].sum() if weighted else len(df)
+        groups = {}
+        for dim in GROUP_DIMENSIONS:
+            grouped = df.groupby(dim)
+            table = grouped[MEASURES].sum()
+            table['count'] = grouped[ROW_COUNT].sum() if weighted else grouped.size()
+            groups[dim] = table
+        return cls(totals, groups)
+
+    def merged(self, other):
+        """New Aggregates covering the rows of both"""
+        totals = self.totals.add(other.totals, fill_value=0)
+        groups = {dim: self.groups[dim].add(other.groups[dim], fill_value=0)
+                  for dim in GROUP_DIMENSIONS}
+        return Aggregates(totals, groups)
+
+    def memory_bytes(self):
+        """Bytes held by the totals and the group tables (computed once; Aggregates never change)"""
+        if getattr(self, '_memory_bytes', None) is None:
+            total = int(self.totals.memory_usage(index=True, deep=True))
+            for table in self.groups.values():
+                total += int(table.memory_usage(index=True, deep=True).sum())
+            self._memory_bytes = total
+        return self._memory_bytes
+
+    def members(self, dim):
+        """Members of a dimension that have at least one row"""
+        table = self.groups[dim]
+        return table.index[table['count'] > 0]
+
+    def kpis(self):
+        """Unfiltered KPI values, as computed by /api/kpis"""
+        count = int(self.totals['count'])
+        return {
+            'total_sales': float(self.totals['Total Sales']),
+            'total_profit': float(self.totals['Operating Profit']),
+            'total_units': int(self.totals['Units Sold']),
+            'avg_margin': float(self.totals['Operating Margin'] / count) if count else float('nan'),
+            'total_transactions': count,
+            'num_products': len(self.members('Product')),
+            'num_retailers': len(self.members('Retailer')),
+            'num_regions': len(self.members('Region')),
+        }
+
+    def summary(self, dim):
+        """Per-member sales, units, profit and mean margin for one dimension"""
+        table = self.groups[dim]
+        table = table[table['count'] > 0]
+        return pd.DataFrame({
+            'Total Sales': table['Total Sales'],
+            'Units Sold': table['Units Sold'],
+            'Operating Profit': table['Operating Profit'],
+            'Operating Margin': table['Operating Margin'] / table['count'],
+        })
@@ -1,70 +1,337 @@
 # /dashboard/api/routes.py
 
-from flask import jsonify, current_app, request
+from flask import jsonify, current_app, g, request, stream_with_context
 from . import bp
+from ..aggregates import Aggregates
+from ..dataset import current_dataset
+from ..compare import COMPARE_DIMENSIONS, COMPARISONS, CompareError, parse_period
+from ..crossfilter import CROSSFILTER_DIMENSIONS, CrossfilterError
+from ..export import EXPORT_FORMATS, PARQUET_AVAILABLE, export_rows
+from ..transactions import (SORT_COLUMNS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, CursorError,
+                            decode_cursor, encode_cursor, page, sort_values)
+from ..pivot import PivotError, parse_dimensions, parse_values, pivot
+from ..sampling import kpi_intervals
+from ..topn import DEFAULT_TOP, TopNError, parse_ranking, top_n
+from ..streaming import is_rollup, row_count, mean_margin, price_counts, price_stats
+from ..slowlog import record_filtered_rows
+from ..timing import mark
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
+import time
 import plotly
+import numpy as np
 import pandas as pd
 
-# Note: All functions now access the dataframe and color constants
-# via `current_app` instead of global variables.
+# Note: All functions access the dataframe through `current_dataset()`
+# (pinned per request, so a reload never changes it mid-request) and the
+# color constants via `current_app`. Chart routes mark the end of their
+# filter / aggregate / figure / serialize phases for Server-Timing.
+
+def _cache_key():
+    return (request.path, tuple(sorted(request.args.items(multi=True))), g.get('approximate', False))
+
+# Routes that answer row-level questions (or own their structures) are always exact
+EXACT_ONLY_ENDPOINTS = {'api.drilldown', 'api.compare', 'api.export', 'api.transactions',
+                        'api.crossfilter_create', 'api.crossfilter_update', 'api.crossfilter_delete'}
+APPROX_TRUE = ('1', 'true', 'yes', 'on')
+
+def _budget_ms():
+    value = request.args.get('budget_ms', '').strip()
+    if not value:
+        return current_app.approx_budget_ms
+    try:
+        return float(value)
+    except ValueError:
+        raise FilterError(f"Invalid budget_ms: {value}")
+
+@bp.before_request
+def choose_query_mode():
+    """
+    Answer from the dataset's stratified sample for approx=1, or when the
+    route's exact answers have been slower than budget_ms (or APPROX_BUDGET_MS).
+    approx=0 forces an exact answer. Runs before the cache lookup, which keys on the mode.
+    """
+    if request.method != 'GET' or request.endpoint in EXACT_ONLY_ENDPOINTS:
+        return None
+    g.query_started = time.perf_counter()
+    approx = request.args.get('approx', '').strip().lower()
+    if approx and approx not in APPROX_TRUE:
+        return None
+    if not approx:
+        budget = _budget_ms()
+        expected = current_app.exact_latency.expected((request.endpoint, has_filters()))
+        if not budget or expected is None or expected <= budget:
+            return None
+    sample = current_dataset().sample
+    if sample is not None:
+        g.dataset = sample
+        g.approximate = True
+    return None
+
+@bp.after_request
+def record_query_mode(response):
+    """Mark approximate responses; learn each route's exact latency for the budget"""
+    if g.get('approximate'):
+        response.headers['X-Approximate'] = g.dataset.sampling.header()
+    elif 'query_started' in g and response.status_code == 200 and not g.get('cache_hit'):
+        current_app.exact_latency.record((request.endpoint, has_filters()),
+                                         (time.perf_counter() - g.query_started) * 1000)
+    return response
+
+@bp.before_request
+def serve_cached_response():
+    """Answer repeated GETs from the response cache for the pinned dataset version"""
+    cache = current_app.response_cache
+    if request.method != 'GET' or not cache.enabled:
+        return None
+    # Cache-Control: no-cache (sent by profiled requests) forces a fresh computation
+    if 'no-cache' in request.headers.get('Cache-Control', ''):
+        return None
+    cached = cache.get(current_dataset().version, _cache_key())
+    if cached is None:
+        return None
+    mark('cache')
+    g.cache_hit = True
+    body, mimetype = cached
+    return current_app.response_class(body, mimetype=mimetype)
+
+@bp.after_request
+def store_cached_response(response):
+    """Cache successful, fully buffered GET responses"""
+    cache = current_app.response_cache
+    if (request.method == 'GET' and cache.enabled and response.status_code == 200
+            and not response.is_streamed):
+        cache.put(current_dataset().version, _cache_key(), (response.get_data(), response.mimetype))
+        current_app.memory.enforce()
+    return response
+
+# IN filters: query parameter -> column. Each takes comma-separated and/or
+# repeated values (region=West,South or region=West&region=South).
+FILTER_COLUMNS = {
+    'year': 'Year',
+    'quarter': 'Quarter',
+    'region': 'Region',
+    'product': 'Product',
+    'retailer': 'Retailer',
+    'sales_method': 'Sales Method',
+}
+NUMERIC_FILTERS = {'year', 'quarter'}
+# Inclusive Invoice Date range, YYYY-MM-DD (either end may be left open)
+DATE_PARAMS = ['from', 'to']
+
+# Query parameters understood by apply_filters
+FILTER_PARAMS = list(FILTER_COLUMNS) + DATE_PARAMS
+
+class FilterError(ValueError):
+    """A malformed filter parameter"""
+
+@bp.errorhandler(FilterError)
+@bp.errorhandler(PivotError)
+@bp.errorhandler(CursorError)
+@bp.errorhandler(CrossfilterError)
+@bp.errorhandler(TopNError)
+@bp.errorhandler(CompareError)
+def filter_error(e):
+    return jsonify({'error': str(e)}), 400
+
+def has_filters():
+    """True if the request sets any filter parameter"""
+    return any(request.args.get(param, '') for param in FILTER_PARAMS)
+
+def filter_values(param):
+    """Values of one IN filter ([] when not set)"""
+    values = [value.strip() for raw in request.args.getlist(param) for value in raw.split(',')]
+    values = [value for value in values if value]
+    if param in NUMERIC_FILTERS:
+        try:
+            return [int(value) for value in values]
+        except ValueError:
+            raise FilterError(f"Invalid {param}: {', '.join(values)}")
+    return values
+
+def date_range():
+    """(start, end) timestamps with end exclusive (the day after `to`); None for an open end"""
+    bounds = []
+    for param in DATE_PARAMS:
+        value = request.args.get(param, '').strip()
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            bounds.append(pd.to_datetime(value, format='%Y-%m-%d'))
+        except ValueError:
+            raise FilterError(f"Invalid {param} date: {value} (expected YYYY-MM-DD)")
+    start, end = bounds
+    if end is not None:
+        end += pd.Timedelta(days=1)
+    return start, end
+
+# Filters answered by selecting time partitions (see partitions.py)
+PARTITION_FILTERS = {'year', 'quarter'}
+
+def _wanted_members(dataset, filters):
+    """{column: wanted dictionary codes} of the IN filters on dictionary-encoded columns"""
+    codes = dataset.codes
+    return {FILTER_COLUMNS[param]: np.flatnonzero(np.isin(codes[FILTER_COLUMNS[param]][1], values))
+            for param, values in filters.items() if FILTER_COLUMNS[param] in codes}
+
+def _partition_selection(dataset, start, end, filters):
+    """Time partitions that can hold rows matching the filters, cut to the date range"""
+    return dataset.partitions.select(filters.get('year'), filters.get('quarter'), start, end,
+                                     _wanted_members(dataset, filters))
+
+def _row_matcher(df, codes, start, end, filters):
+    """
+    Function telling which rows of df match the date range and IN filters,
+    for given row positions or, with None, for every row. Columns in codes
+    ({column: (codes, categories)}) are compared by dictionary code.
+    None when nothing is filtered.
+    """
+    checks = []
+    if start is not None or end is not None:
+        dates = df['Invoice Date'].to_numpy()
+        if start is not None:
+            checks.append((dates, lambda values, bound=np.datetime64(start): values >= bound))
+        if end is not None:
+            checks.append((dates, lambda values, bound=np.datetime64(end): values < bound))
+    for param, values in filters.items():
+        column = FILTER_COLUMNS[param]
+        if column in codes:
+            column_values, categories = codes[column]
+            wanted = np.flatnonzero(np.isin(categories, values))
+        else:
+            column_values, wanted = df[column].to_numpy(), values
+        checks.append((column_values, lambda values, wanted=wanted: np.isin(values, wanted)))
+    if not checks:
+        return None
+
+    def matches(positions=None):
+        mask = np.ones(len(df) if positions is None else len(positions), dtype=bool)
+        for column_values, check in checks:
+            mask &= check(column_values if positions is None else column_values[positions])
+        return mask
+    return matches
+
+def _matching_positions(dataset, start, end, filters):
+    """
+    Positions of matching rows. Year, quarter and date filters select time
+    partitions (skipping the others without reading them, and cutting the
+    first and last by binary search on their dates); the other IN filters
+    are then checked on the selected rows only.
+    """
+    if start is not None or end is not None or PARTITION_FILTERS & set(filters):
+        positions = dataset.partitions.positions(_partition_selection(dataset, start, end, filters))
+        matches = _row_matcher(dataset.df, dataset.codes, None, None,
+                               {param: values for param, values in filters.items()
+                                if param not in PARTITION_FILTERS})
+        return positions if matches is None else positions[matches(positions)]
+    matches = _row_matcher(dataset.df, dataset.codes, start, end, filters)
+    return np.arange(len(dataset)) if matches is None else np.flatnonzero(matches())
+
+def _position_predicate(dataset, start, end, filters):
+    """Function telling which of some row positions match the filters (None when unfiltered)"""
+    return _row_matcher(dataset.df, dataset.codes, start, end, filters)
+
+def _matching_mask(df, start, end, filters):
+    """Boolean mask version, for frames other than the pinned dataset's"""
+    matches = _row_matcher(df, {}, start, end, filters)
+    return np.ones(len(df), dtype=bool) if matches is None else matches()
+
+def _check_month_bounds(start, end):
+    """Rolled-up rows are dated by month, so a date range must cover whole months"""
+    for param, bound in zip(DATE_PARAMS, (start, end)):
+        if bound is not None and bound.day != 1:
+            raise FilterError(f"Invalid {param} date in streaming mode: rows are rolled up by month, "
+                              f"so from must be the first day of a month and to the last day of one")
+
+def _request_filters():
+    start, end = date_range()
+    if current_dataset().rolled_up:
+        _check_month_bounds(start, end)
+    filters = {param: filter_values(param) for param in FILTER_COLUMNS}
+    return start, end, {param: values for param, values in filters.items() if values}
+
+def filter_positions(dataset):
+    """Positions of the dataset rows matching the request filters (None when unfiltered)"""
+    start, end, filters = _request_filters()
+    if start is None and end is None and not filters:
+        return None
+    return _matching_positions(dataset, start, end, filters)
 
 def apply_filters(df):
     """
     Apply filters from request parameters to the dataframe
-    Returns filtered dataframe
-    """
-    filtered_df = df.copy()
-
-    # Get filter parameters from request
-    year = request.args.get('year', '')
-    quarter = request.args.get('quarter', '')
-    region = request.args.get('region', '')
-    product = request.args.get('product', '')
-    retailer = request.args.get('retailer', '')
-    sales_method = request.args.get('sales_method', '')
-
-    # Apply filters if provided
-    if year:
-        filtered_df = filtered_df[filtered_df['Year'] == int(year)]
-
-    if quarter:
-        filtered_df = filtered_df[filtered_df['Quarter'] == int(quarter)]
-
-    if region:
-        filtered_df = filtered_df[filtered_df['Region'] == region]
-
-    if product:
-        filtered_df = filtered_df[filtered_df['Product'] == product]
-
-    if retailer:
-        filtered_df = filtered_df[filtered_df['Retailer'] == retailer]
-
-    if sales_method:
-        filtered_df = filtered_df[filtered_df['Sales Method'] == sales_method]
+    Returns filtered dataframe (rows in their original order)
 
+    On the pinned dataset, year, quarter and the date range select its time
+    partitions (see _matching_positions) and the other IN filters only look
+    at those rows. Every path goes through _row_matcher, so partition, mask
+    and position filtering agree.
+    """
+    start, end, filters = _request_filters()
+
+    dataset = current_dataset()
+    if start is None and end is None and not filters:
+        filtered_df = df.copy()
+    elif df is dataset.df:
+        filtered_df = df.take(_matching_positions(dataset, start, end, filters))
+    else:
+        filtered_df = df[_matching_mask(df, start, end, filters)]
+
+    record_filtered_rows(filtered_df)
+    mark('filter')
     return filtered_df
 
+def figure_response(fig):
+    """JSON response for a finished Plotly figure"""
+    mark('figure')
+    response = jsonify(json.loads(fig.to_json()))
+    mark('serialize')
+    return response
+
 @bp.route('/kpis')
 def get_kpis():
     """API endpoint for KPIs with filter support"""
-    df = current_app.df
-
-    # Apply filters
-    filtered_df = apply_filters(df)
-
-    # Calculate KPIs from filtered data
-    total_sales = filtered_df['Total Sales'].sum()
-    total_profit = filtered_df['Operating Profit'].sum()
-    total_units = filtered_df['Units Sold'].sum()
-    avg_margin = filtered_df['Operating Margin'].mean()
-    total_transactions = len(filtered_df)
-    num_products = filtered_df['Product'].nunique()
-    num_retailers = filtered_df['Retailer'].nunique()
-    num_regions = filtered_df['Region'].nunique()
+    dataset = current_dataset()
+    start, end, filters = _request_filters()
+
+    if has_filters() and set(filters) <= PARTITION_FILTERS:
+        # Time filters only: whole partitions answer from their summaries
+        values = dataset.partitions.kpis(_partition_selection(dataset, start, end, filters), dataset)
+        g.filtered_rows = values['total_transactions']
+        mark('filter')
+        total_sales = values['total_sales']
+        total_profit = values['total_profit']
+        total_units = values['total_units']
+        avg_margin = values['avg_margin']
+        total_transactions = values['total_transactions']
+        num_products = values['num_products']
+        num_retailers = values['num_retailers']
+        num_regions = values['num_regions']
+    elif has_filters():
+        # Calculate KPIs from filtered data
+        filtered_df = apply_filters(dataset.df)
+        total_sales = filtered_df['Total Sales'].sum()
+        total_profit = filtered_df['Operating Profit'].sum()
+        total_units = filtered_df['Units Sold'].sum()
+        avg_margin = mean_margin(filtered_df)
+        total_transactions = row_count(filtered_df)
+        num_products = filtered_df['Product'].nunique()
+        num_retailers = filtered_df['Retailer'].nunique()
+        num_regions = filtered_df['Region'].nunique()
+    else:
+        # Unfiltered KPIs come straight from the incrementally maintained aggregates
+        values = dataset.aggregates.kpis()
+        total_sales = values['total_sales']
+        total_profit = values['total_profit']
+        total_units = values['total_units']
+        avg_margin = values['avg_margin']
+        total_transactions = values['total_transactions']
+        num_products = values['num_products']
+        num_retailers = values['num_retailers']
+        num_regions = values['num_regions']
 
     # Format KPIs
     kpis = {
@@ -85,13 +352,20 @@ def get_kpis():
         'num_regions': num_regions,
         'num_regions_formatted': str(num_regions)
     }
+    if dataset.sampling is not None:
+        # Estimates from the stratified sample, with 95% confidence intervals
+        kpis['approximate'] = True
+        kpis['intervals'] = kpi_intervals(dataset, filter_positions(dataset))
 
-    return jsonify(kpis)
+    mark('aggregate')
+    response = jsonify(kpis)
+    mark('serialize')
+    return response
 
 @bp.route('/sales-trend')
 def sales_trend():
     """API endpoint for sales trend over time"""
-    df = current_app.df
+    df = current_dataset().df
     COLORS = current_app.COLORS
 
     # Apply filters
@@ -105,6 +379,7 @@ def sales_trend():
     }).reset_index()
     monthly_sales['Invoice Date'] = monthly_sales['Invoice Date'].dt.to_timestamp()
 
+    mark('aggregate')
     fig = go.Figure()
 
     # Add area fill under the line
@@ -165,13 +440,13 @@ def sales_trend():
         tickformat='$,.0f'
     )
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/sales-by-region')
 def sales_by_region():
     """API endpoint for sales by region"""
-    df = current_app.df
+    df = current_dataset().df
     COLORS = current_app.COLORS
 
     # Apply filters
@@ -186,6 +461,7 @@ def sales_by_region():
     # Unified blue gradient color scheme
     blue_colors = ['#004C8A', '#0057B8', '#1E88E5', '#42A5F5', '#64B5F6']
 
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Bar(
         x=region_sales['Region'],
@@ -225,13 +501,13 @@ def sales_by_region():
     fig.update_xaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/product-performance')
 def product_performance():
     """API endpoint for product category performance"""
-    df = current_app.df
+    df = current_dataset().df
     CHART_COLORS = current_app.CHART_COLORS
 
     # Apply filters
@@ -246,6 +522,7 @@ def product_performance():
     # Unified blue color scheme
     blue_colors = ['#0057B8', '#1E88E5', '#42A5F5', '#64B5F6', '#90CAF9', '#BBDEFB']
 
+    mark('aggregate')
     fig = go.Figure(data=[go.Pie(
         labels=product_sales['Product'],
         values=product_sales['Total Sales'],
@@ -299,13 +576,13 @@ def product_performance():
         margin=dict(l=20, r=150, t=80, b=20)
     )
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/retailer-performance')
 def retailer_performance():
     """API endpoint for retailer performance"""
-    df = current_app.df
+    df = current_dataset().df
     CHART_COLORS = current_app.CHART_COLORS
 
     # Apply filters
@@ -317,6 +594,7 @@ def retailer_performance():
         'Units Sold': 'sum'
     }).reset_index().sort_values('Total Sales', ascending=True)  # Ascending for horizontal bars
 
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Bar(
         y=retailer_sales['Retailer'],
@@ -358,13 +636,13 @@ def retailer_performance():
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
     fig.update_yaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/sales-method')
 def sales_method():
     """API endpoint for sales by method"""
-    df = current_app.df
+    df = current_dataset().df
     CHART_COLORS = current_app.CHART_COLORS
 
     # Apply filters
@@ -380,6 +658,7 @@ def sales_method():
     channel_colors = ['#0057B8', '#42A5F5', '#90CAF9']
 
     # Enhanced donut chart with modern styling
+    mark('aggregate')
     fig = go.Figure(data=[go.Pie(
         labels=method_sales['Sales Method'],
         values=method_sales['Total Sales'],
@@ -431,25 +710,31 @@ def sales_method():
         autosize=True,
         margin=dict(l=20, r=150, t=80, b=20)
     )
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/top-states')
 def top_states():
     """API endpoint for top performing states"""
-    df = current_app.df
+    dataset = current_dataset()
     COLORS = current_app.COLORS
 
-    # Apply filters
-    df = apply_filters(df)
-
-    state_sales = df.groupby('State').agg({
-        'Total Sales': 'sum',
-        'Operating Profit': 'sum',
-        'Units Sold': 'sum'
-    }).reset_index().sort_values('Total Sales', ascending=False).head(10)
+    # Rank the states by partial selection instead of sorting them all
+    positions = filter_positions(dataset)
+    g.filtered_rows = len(dataset) if positions is None else len(positions)
+    mark('filter')
+    items = top_n(dataset, ['state'], 'sales', 10, positions)['items']
+    state_sales = pd.DataFrame({
+        'State': [item['labels'][0] for item in items],
+        'Total Sales': [item['sales'] for item in items],
+        'Operating Profit': [item['profit'] for item in items],
+        'Units Sold': [item['units'] for item in items],
+    })
+    # top_n sums in float64; send the columns' own dtypes (int sums stay ints) as a groupby sum did
+    state_sales = state_sales.astype({col: dataset.df[col].dtype for col in state_sales.columns[1:]})
 
     # Enhanced bar chart with gradient colors and text labels
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Bar(
         x=state_sales['State'],
@@ -491,25 +776,27 @@ def top_states():
     fig.update_xaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/margin-analysis')
 def margin_analysis():
     """API endpoint for operating margin analysis"""
-    df = current_app.df
+    df = current_dataset().df
     COLORS = current_app.COLORS
 
     # Apply filters
     df = apply_filters(df)
 
     product_margin = df.groupby('Product').agg({
-        'Operating Margin': 'mean',
         'Total Sales': 'sum',
         'Operating Profit': 'sum'
-    }).reset_index().sort_values('Operating Margin', ascending=True)
+    })
+    product_margin['Operating Margin'] = mean_margin(df, by='Product')
+    product_margin = product_margin.reset_index().sort_values('Operating Margin', ascending=True)
 
     # Enhanced horizontal bar chart with gradient colors
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Bar(
         y=product_margin['Product'],
@@ -552,13 +839,13 @@ def margin_analysis():
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/quarterly-performance')
 def quarterly_performance():
     """API endpoint for quarterly performance"""
-    df = current_app.df
+    df = current_dataset().df
     COLORS = current_app.COLORS
 
     # Apply filters
@@ -572,6 +859,7 @@ def quarterly_performance():
     }).reset_index()
 
     # Enhanced dual-axis chart with modern styling
+    mark('aggregate')
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     # Add bars with gradient effect
@@ -648,25 +936,35 @@ def quarterly_performance():
     fig.update_yaxes(title_text='Total Sales ($)', secondary_y=False, showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
     fig.update_yaxes(title_text='Operating Profit ($)', secondary_y=True, showgrid=False, showline=True, linewidth=2, linecolor='#27ae60', tickformat='$,.0f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/price-distribution')
 def price_distribution():
     """API endpoint for price distribution analysis"""
-    df = current_app.df
+    df = current_dataset().df
     COLORS = current_app.COLORS
 
     # Apply filters
     df = apply_filters(df)
 
+    # Rolled-up data is drawn from per-price counts instead of one value per row
+    if is_rollup(df):
+        counts = price_counts(df)
+        prices = counts.index.to_numpy()
+        histogram_data = dict(x=prices, y=counts.to_numpy(), histfunc='sum')
+    else:
+        prices = df['Price per Unit']
+        histogram_data = dict(x=prices)
+
     # Enhanced histogram with gradient colors and better styling
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Histogram(
-        x=df['Price per Unit'],
+        **histogram_data,
         nbinsx=30,
         marker=dict(
-            color=df['Price per Unit'],
+            color=prices,
             colorscale='Viridis',
             showscale=True,
             colorbar=dict(
@@ -684,8 +982,12 @@ def price_distribution():
     ))
 
     # Calculate statistics for annotation
-    mean_price = df['Price per Unit'].mean()
-    median_price = df['Price per Unit'].median()
+    if is_rollup(df):
+        stats = price_stats(counts)
+        mean_price, median_price = stats['mean'], stats['median']
+    else:
+        mean_price = df['Price per Unit'].mean()
+        median_price = df['Price per Unit'].median()
 
     fig.update_layout(
         title={
@@ -720,30 +1022,303 @@ def price_distribution():
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$.2f')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 
 @bp.route('/summary-stats')
 def summary_stats():
     """API endpoint for summary statistics table"""
-    df = current_app.df
+    dataset = current_dataset()
+    if has_filters():
+        aggregates = Aggregates.from_frame(apply_filters(dataset.df))
+    else:
+        aggregates = dataset.aggregates
     stats = {
-        'By Product': df.groupby('Product').agg({
-            'Total Sales': 'sum', 'Units Sold': 'sum', 'Operating Profit': 'sum', 'Operating Margin': 'mean'
-        }).to_dict('index'),
-        'By Retailer': df.groupby('Retailer').agg({
-            'Total Sales': 'sum', 'Units Sold': 'sum', 'Operating Profit': 'sum', 'Operating Margin': 'mean'
-        }).to_dict('index'),
-        'By Region': df.groupby('Region').agg({
-            'Total Sales': 'sum', 'Units Sold': 'sum', 'Operating Profit': 'sum', 'Operating Margin': 'mean'
-        }).to_dict('index'),
+        'By Product': aggregates.summary('Product').to_dict('index'),
+        'By Retailer': aggregates.summary('Retailer').to_dict('index'),
+        'By Region': aggregates.summary('Region').to_dict('index'),
     }
-    return jsonify(stats)
+    mark('aggregate')
+    response = jsonify(stats)
+    mark('serialize')
+    return response
+
+@bp.route('/pivot')
+def pivot_table():
+    """
+    Generic pivot: rows=<dims>&columns=<dims>&values=<measure:agg,...>
+    plus the usual filters. Answered from integer group codes (see pivot.py).
+    """
+    rows = parse_dimensions(request.args.get('rows', ''))
+    columns = parse_dimensions(request.args.get('columns', ''))
+    if set(rows) & set(columns):
+        raise PivotError('A dimension cannot be both a row and a column')
+    values = parse_values(request.args.get('values', 'sales:sum'))
+
+    dataset = current_dataset()
+    positions = filter_positions(dataset)
+    g.filtered_rows = len(dataset) if positions is None else len(positions)
+    mark('filter')
+    result = pivot(dataset, rows, columns, values, positions)
+    mark('aggregate')
+    response = jsonify(result)
+    mark('serialize')
+    return response
+
+@bp.route('/top')
+def top():
+    """
+    Top-N ranking: by=<dims>&measure=<sales|profit|units|margin|count>&n=N
+    (order=asc for the bottom N) plus the usual filters. See topn.py.
+    """
+    dims, measure, n = parse_ranking(request.args.get('by', 'state'), request.args.get('measure', 'sales'),
+                                     request.args.get('n', str(DEFAULT_TOP)))
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise TopNError(f"Invalid order: {order} (expected asc or desc)")
+
+    dataset = current_dataset()
+    positions = filter_positions(dataset)
+    g.filtered_rows = len(dataset) if positions is None else len(positions)
+    mark('filter')
+    result = top_n(dataset, dims, measure, n, positions, ascending=order == 'asc')
+    mark('aggregate')
+    response = jsonify(result)
+    mark('serialize')
+    return response
+
+@bp.route('/compare')
+def compare():
+    """
+    Period comparison: period=yoy|qoq|mom&by=<dimension>&at=<2021|2021-Q2|2021-06>
+    (the latest period by default) plus IN filters other than year and quarter.
+    Answered from the dataset's PeriodCube (see compare.py).
+    """
+    kind = request.args.get('period', 'yoy')
+    if kind not in COMPARISONS:
+        raise CompareError(f"Unknown period: {kind} (expected {', '.join(COMPARISONS)})")
+    by = request.args.get('by', 'region')
+    if by not in COMPARE_DIMENSIONS:
+        raise CompareError(f"Unknown dimension: {by} (expected {', '.join(COMPARE_DIMENSIONS)})")
+    start, end, filters = _request_filters()
+    if start is not None or end is not None or PARTITION_FILTERS & set(filters):
+        raise CompareError('Choose the compared periods with at, not year, quarter, from or to')
+
+    dataset = current_dataset()
+    cube = dataset.period_cube
+    at = request.args.get('at', '').strip()
+    first_month = parse_period(kind, at, cube.span(kind)) if at else cube.latest(kind)
+    mark('filter')
+    result = cube.compare(COMPARE_DIMENSIONS[by], kind, first_month,
+                          {FILTER_COLUMNS[param]: values for param, values in filters.items()})
+    mark('aggregate')
+    response = jsonify(result)
+    mark('serialize')
+    return response
+
+@bp.route('/drilldown')
+def drilldown():
+    """
+    Region -> State -> City drilldown: path=<region>/<state> selects the node
+    (empty for the top level), top=N limits its children. Answered from the
+    dataset's GeoTree (see geo.py), filtered or not.
+    """
+    path = [part for part in request.args.get('path', '').split('/') if part]
+    top = request.args.get('top', '').strip()
+    try:
+        top = int(top) if top else None
+    except ValueError:
+        raise FilterError(f"Invalid top: {top}")
+    if top is not None and top < 0:
+        raise FilterError(f"Invalid top: {top}")
+
+    dataset = current_dataset()
+    tree = dataset.geo_tree
+    start, end, filters = _request_filters()
+    if start is None and end is None and not filters:
+        totals = None
+    elif (start is None or start.day == 1) and (end is None or end.day == 1):
+        # Whole months: the tree's slices answer without touching the rows
+        months = (None if start is None else start.year * 12 + start.month - 1,
+                  None if end is None else end.year * 12 + end.month - 1)
+        mask = tree.slice_mask({FILTER_COLUMNS[param]: values for param, values in filters.items()},
+                               months if start is not None or end is not None else None)
+        totals = tree.filtered_totals(mask)
+    else:
+        totals = tree.position_totals(dataset.df, _matching_positions(dataset, start, end, filters))
+    mark('filter')
+
+    try:
+        result = tree.drilldown(path, top, totals)
+    except KeyError:
+        return jsonify({'error': f"Unknown location: {'/'.join(path)}"}), 404
+    mark('aggregate')
+    response = jsonify(result)
+    mark('serialize')
+    return response
+
+def rollup_unsupported():
+    """400 for the row-level routes when the rows are monthly rollups rather than transactions"""
+    return jsonify({'error': 'Individual transactions are not available in streaming mode '
+                             '(rows are rolled up by month)', 'rollup': True}), 400
+
+@bp.route('/export')
+def export():
+    """
+    Download the filtered rows: format=csv|ndjson|parquet, columns=<comma-separated
+    column names> (default all), gzip=1. Streamed in chunks (see export.py).
+    """
+    fmt = request.args.get('format', 'csv').strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        raise FilterError(f"Invalid format: {fmt} (expected {', '.join(EXPORT_FORMATS)})")
+    if fmt == 'parquet' and not PARQUET_AVAILABLE:
+        return jsonify({'error': 'Parquet export needs pyarrow (pip install pyarrow)'}), 501
+    gzip = request.args.get('gzip', '').strip().lower() in ('1', 'true', 'yes')
+
+    dataset = current_dataset()
+    if dataset.rolled_up:
+        return rollup_unsupported()
+    df = dataset.df
+    columns = [col.strip() for raw in request.args.getlist('columns') for col in raw.split(',') if col.strip()]
+    unknown = [col for col in columns if col not in df.columns]
+    if unknown:
+        raise FilterError(f"Unknown column: {', '.join(unknown)}")
+    columns = columns or list(df.columns)
+
+    positions = filter_positions(dataset)
+    g.filtered_rows = len(df) if positions is None else len(positions)
+    mark('filter')
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"adidas_sales.{extension}"
+    headers = {'X-Row-Count': str(g.filtered_rows)}
+    if gzip:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    body = stream_with_context(export_rows(df, positions, columns, fmt, gzip))
+    return current_app.response_class(body, mimetype=mimetype, headers=headers)
+
+@bp.route('/transactions')
+def transactions():
+    """
+    Individual transactions, one page at a time: sort=<column>, order=asc|desc,
+    limit=N, cursor=<next_cursor of the previous page>, plus the usual filters.
+    Keyset pagination over a presorted index (see transactions.py).
+    """
+    sort = request.args.get('sort', 'date').strip()
+    if sort not in SORT_COLUMNS:
+        raise FilterError(f"Invalid sort: {sort} (expected {', '.join(SORT_COLUMNS)})")
+    order = request.args.get('order', 'desc').strip().lower()
+    if order not in ('asc', 'desc'):
+        raise FilterError(f"Invalid order: {order} (expected asc or desc)")
+    descending = order == 'desc'
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise FilterError(f"Invalid limit: {request.args.get('limit')}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise FilterError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    cursor = request.args.get('cursor', '').strip()
+    after = decode_cursor(cursor, sort, descending) if cursor else None
+
+    dataset = current_dataset()
+    if dataset.rolled_up:
+        return rollup_unsupported()
+    index = dataset.sort_index(SORT_COLUMNS[sort])
+    start, end, filters = _request_filters()
+    bounds = None
+    if sort == 'date' and (start is not None or end is not None):
+        # The date index is this sort's order: the range is a slice of it
+        bounds = dataset.date_index.bounds(start, end)
+        start = end = None
+    positions, more = page(index, descending, limit, after, _position_predicate(dataset, start, end, filters),
+                           bounds)
+    mark('filter')
+
+    rows = dataset.df.take(positions)
+    rows = rows.assign(**{'Invoice Date': rows['Invoice Date'].dt.strftime('%Y-%m-%d')})
+    next_cursor = None
+    if more:
+        last = int(positions[-1])
+        value = sort_values(dataset.df[SORT_COLUMNS[sort]].iloc[[last]])[0].item()
+        next_cursor = encode_cursor(sort, descending, value, last)
+    mark('aggregate')
+    response = jsonify({
+        'sort': sort,
+        'order': order,
+        'limit': limit,
+        'rows': rows.to_dict('records'),
+        'next_cursor': next_cursor,
+    })
+    mark('serialize')
+    return response
+
+def crossfilter_response(session_id, session, delta_rows=None):
+    state = session.state()
+    state['session'] = session_id
+    if delta_rows is not None:
+        state['delta_rows'] = delta_rows
+    mark('aggregate')
+    response = jsonify(state)
+    mark('serialize')
+    return response
+
+def _crossfilter_filters(body, key='filters'):
+    filters = body.get(key) or {}
+    if not isinstance(filters, dict):
+        raise CrossfilterError(f'{key} must be an object of dimension -> list of values')
+    return filters
+
+@bp.route('/crossfilter', methods=['POST'])
+def crossfilter_create():
+    """
+    Start a crossfilter session, optionally with {"filters": {dimension: [values]}}.
+    Every dimension's groups are filtered by all the other dimensions.
+    """
+    body = request.get_json(silent=True) or {}
+    session_id, session = current_app.crossfilter.create(current_dataset(), _crossfilter_filters(body))
+    mark('filter')
+    return crossfilter_response(session_id, session)
+
+@bp.route('/crossfilter/<session_id>', methods=['POST'])
+def crossfilter_update(session_id):
+    """
+    Change selections: {"dimension": "region", "values": ["West"]} or
+    {"filters": {...}} for several at once ([] or null selects everything).
+    "current" holds the filters of the previous response; with it, a worker
+    that does not hold the session (or holds an older copy) rebuilds it first.
+    Only the rows of the groups that changed are re-aggregated.
+    """
+    body = request.get_json(silent=True) or {}
+    changes = _crossfilter_filters(body)
+    if 'dimension' in body:
+        changes = {**changes, body['dimension']: body.get('values')}
+    sessions = current_app.crossfilter
+    session = sessions.get(session_id, current_dataset())
+    if 'current' in body:
+        current = _crossfilter_filters(body, 'current')
+        if session is None:
+            session = sessions.restore(session_id, current_dataset(), current)
+        else:
+            # The local copy may be behind updates answered by other workers
+            changes = {**{dim: current.get(dim) for dim in CROSSFILTER_DIMENSIONS}, **changes}
+    if session is None:
+        return jsonify({'error': 'Unknown or expired crossfilter session'}), 404
+    with session.lock:
+        delta_rows = sum(session.select(dim, values) for dim, values in changes.items())
+        mark('filter')
+        return crossfilter_response(session_id, session, delta_rows)
+
+@bp.route('/crossfilter/<session_id>', methods=['DELETE'])
+def crossfilter_delete(session_id):
+    """Drop a session; other workers' copies, if any, age out of their LRU"""
+    current_app.crossfilter.delete(session_id)
+    return '', 204
 
 @bp.route('/sales-by-retailer')
 def sales_by_retailer():
     """API endpoint for sales by retailer - Customer Patterns"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -755,6 +1330,7 @@ def sales_by_retailer():
     }).reset_index().sort_values('Total Sales', ascending=True)
 
     # Green theme for customer patterns
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Bar(
         y=retailer_sales['Retailer'],
@@ -798,12 +1374,12 @@ def sales_by_retailer():
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
     fig.update_yaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/sales-by-sales-method')
 def sales_by_sales_method():
     """API endpoint for sales by sales method - Customer Patterns"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -817,6 +1393,7 @@ def sales_by_sales_method():
     # Green theme donut chart for customer patterns
     green_colors = ['#1B5E20', '#388E3C', '#66BB6A']
 
+    mark('aggregate')
     fig = go.Figure(data=[go.Pie(
         labels=method_sales['Sales Method'],
         values=method_sales['Total Sales'],
@@ -870,11 +1447,11 @@ def sales_by_sales_method():
         margin=dict(l=20, r=150, t=80, b=20)
     )
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/sales-by-state')
 def sales_by_state():
-    df = current_app.df
+    df = current_dataset().df
     COLORS = current_app.COLORS
 
     # Apply filters
@@ -904,6 +1481,7 @@ def sales_by_state():
     state_sales['State_Code'] = state_sales['State'].map(state_abbrev)
 
     # Create choropleth map using Graph Objects for better control
+    mark('aggregate')
     fig = go.Figure(data=go.Choropleth(
         locations=state_sales['State_Code'],
         z=state_sales['Total Sales'],
@@ -953,12 +1531,12 @@ def sales_by_state():
         margin=dict(l=10, r=10, t=80, b=10)
     )
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/sales-by-day-of-week')
 def sales_by_day_of_week():
     """API endpoint for sales by day of week - Customer Patterns"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -979,6 +1557,7 @@ def sales_by_day_of_week():
     # Green gradient colors for customer patterns
     green_gradient = ['#1B5E20', '#2E7D32', '#388E3C', '#43A047', '#4CAF50', '#66BB6A', '#81C784']
 
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Bar(
         x=day_of_week_sales['Day_of_Week'],
@@ -1019,7 +1598,7 @@ def sales_by_day_of_week():
     fig.update_xaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 # ============================================================================
 # PRODUCT ANALYSIS ENDPOINTS
@@ -1028,7 +1607,7 @@ def sales_by_day_of_week():
 @bp.route('/product-revenue-profit')
 def product_revenue_profit():
     """Product revenue and profit comparison - Product Analysis"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -1040,6 +1619,7 @@ def product_revenue_profit():
     }).reset_index().sort_values('Total Sales', ascending=False)
 
     # Purple/Orange theme for product analysis
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Bar(
         x=product_data['Product'],
@@ -1094,26 +1674,28 @@ def product_revenue_profit():
     fig.update_xaxes(showgrid=False, tickangle=-45, showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/product-profitability-matrix')
 def product_profitability_matrix():
     """Product profitability matrix: Margin vs Volume - Product Analysis"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
 
     product_data = df.groupby('Product').agg({
         'Units Sold': 'sum',
-        'Operating Margin': 'mean',
         'Total Sales': 'sum'
-    }).reset_index()
+    })
+    product_data['Operating Margin'] = mean_margin(df, by='Product')
+    product_data = product_data.reset_index()
 
     # Create color scale based on sales
     color_scale = product_data['Total Sales'].values
 
     # Purple colorscale for product analysis
+    mark('aggregate')
     fig = go.Figure()
     fig.add_trace(go.Scatter(
         x=product_data['Units Sold'],
@@ -1165,12 +1747,12 @@ def product_profitability_matrix():
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat=',')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', ticksuffix='%')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/product-by-sales-channel')
 def product_by_sales_channel():
     """Product performance by sales channel - Product Analysis"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -1183,6 +1765,7 @@ def product_by_sales_channel():
     # Purple/Orange gradient for products
     purple_orange_colors = ['#7B1FA2', '#9C27B0', '#BA68C8', '#FF6F00', '#FF8F00', '#FFA726']
 
+    mark('aggregate')
     fig = go.Figure()
 
     for i, product in enumerate(sorted(channel_product['Product'].unique())):
@@ -1233,12 +1816,12 @@ def product_by_sales_channel():
     fig.update_xaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/product-price-distribution')
 def product_price_distribution():
     """Product price distribution by category - Product Analysis"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -1246,13 +1829,21 @@ def product_price_distribution():
     # Purple/Orange theme for box plots
     purple_orange_colors = ['#7B1FA2', '#9C27B0', '#BA68C8', '#FF6F00', '#FF8F00', '#FFA726']
 
+    mark('aggregate')
     fig = go.Figure()
 
     products = df['Product'].unique()
     for i, product in enumerate(sorted(products)):
         product_df = df[df['Product'] == product]
+        if is_rollup(product_df):
+            # Precomputed box statistics from per-price counts
+            stats = price_stats(price_counts(product_df))
+            box_data = {key: [value] for key, value in stats.items()}
+            box_data['x'] = [product]
+        else:
+            box_data = dict(y=product_df['Price per Unit'])
         fig.add_trace(go.Box(
-            y=product_df['Price per Unit'],
+            **box_data,
             name=product,
             marker=dict(
                 color=purple_orange_colors[i % len(purple_orange_colors)],
@@ -1292,12 +1883,12 @@ def product_price_distribution():
     fig.update_xaxes(showgrid=False, showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$.2f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/product-sales-trend')
 def product_sales_trend():
     """Product sales trend over time - Product Analysis"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -1311,6 +1902,7 @@ def product_sales_trend():
     # Purple/Orange theme for lines
     purple_orange_colors = ['#7B1FA2', '#9C27B0', '#BA68C8', '#FF6F00', '#FF8F00', '#FFA726']
 
+    mark('aggregate')
     fig = go.Figure()
 
     # Add a line for each product
@@ -1358,12 +1950,12 @@ def product_sales_trend():
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#E5E5E5', showline=True, linewidth=2, linecolor='#2c3e50', tickformat='$,.0f')
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
 
 @bp.route('/product-regional-mix')
 def product_regional_mix():
     """Product category mix by region"""
-    df = current_app.df
+    df = current_dataset().df
 
     # Apply filters
     df = apply_filters(df)
@@ -1378,6 +1970,7 @@ def product_regional_mix():
     # Get unique products to assign colors
     products = region_product['Product'].unique()
 
+    mark('aggregate')
     fig = go.Figure()
 
     for i, product in enumerate(products):
@@ -1444,4 +2037,4 @@ def product_regional_mix():
         hovermode='closest'
     )
 
-    return jsonify(json.loads(fig.to_json()))
+    return figure_response(fig)
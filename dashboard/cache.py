@@ -0,0 +1,84 @@
+# /dashboard/cache.py
+
+"""
+Dataset-versioned response cache.
+
+Entries are keyed on (dataset version, key). A request only ever looks up the
+version it pinned, so a reload can never serve stale data. Entries for older
+versions are dropped when the new dataset is swapped in.
+
+The cache keeps a running byte count of its entries. The memory registry
+uses it to evict least recently used entries when the process is over its
+memory budget.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+
+def _approx_bytes(value):
+    """Payload bytes of a key or value (bytes and str by length, tuples summed)"""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_approx_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResponseCache:
+    """Small thread-safe LRU cache keyed by dataset version"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, version, key):
+        """Cached value or None"""
+        with self._lock:
+            value = self._entries.get((version, key))
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version, key))
+            self.hits += 1
+            return value
+
+    def put(self, version, key, value):
+        entry_key = (version, key)
+        with self._lock:
+            self._remove(entry_key)
+            self._entries[entry_key] = value
+            self.bytes += _approx_bytes(entry_key) + _approx_bytes(value)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_key):
+        value = self._entries.pop(entry_key, None)
+        if value is not None:
+            self.bytes -= _approx_bytes(entry_key) + _approx_bytes(value)
+
+    def evict(self, nbytes):
+        """Drop least recently used entries until at least nbytes are freed; returns bytes freed"""
+        with self._lock:
+            before = self.bytes
+            while self._entries and before - self.bytes < nbytes:
+                self._remove(next(iter(self._entries)))
+            return before - self.bytes
+
+    def invalidate_before(self, version):
+        """Drop every entry computed from a dataset older than version"""
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] < version]:
+                self._remove(entry_key)
+
+    def __len__(self):
+        return len(self._entries)
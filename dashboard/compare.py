@@ -0,0 +1,230 @@
+# /dashboard/compare.py
+
+"""
+Period comparisons (YoY, QoQ, MoM) behind /api/compare.
+
+A PeriodCube is built once per dataset and merged with the cube of every
+appended batch. It holds the measure sums of every (month, region, state,
+city, product, retailer, sales method) combination that has rows. A comparison never goes back to the rows. It
+masks the cube's cells of the current period and of the prior one (the
+same cells shifted by 12, 3 or 1 months), sums both per member of the
+requested dimension with np.bincount, and lines the two results up by member
+code. IN filters on the cube's columns are one more mask over the cells.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import ROW_COUNT
+
+# Query name -> column
+COMPARE_DIMENSIONS = {
+    'region': 'Region',
+    'state': 'State',
+    'city': 'City',
+    'product': 'Product',
+    'retailer': 'Retailer',
+    'sales_method': 'Sales Method',
+}
+# Comparison -> months per period
+COMPARISONS = {'yoy': 12, 'qoq': 3, 'mom': 1}
+CUBE_MEASURES = {'sales': 'Total Sales', 'profit': 'Operating Profit',
+                 'units': 'Units Sold', 'margin': 'Operating Margin'}
+
+
+class CompareError(ValueError):
+    """A malformed comparison request"""
+
+
+def _period_label(kind, month):
+    year, index = divmod(month, 12)
+    if kind == 'yoy':
+        return str(year)
+    if kind == 'qoq':
+        return f'{year}-Q{index // 3 + 1}'
+    return f'{year}-{index + 1:02d}'
+
+
+def parse_period(kind, at, span=None):
+    """
+    Month ordinal (year * 12 + month - 1) where the period named by at starts: 2021, 2021-Q2 or 2021-06.
+    span is the (first, last) period start with data, as given by PeriodCube.span; periods outside it are errors.
+    """
+    try:
+        if kind == 'yoy':
+            start = int(at) * 12
+        else:
+            year, _, part = at.partition('-')
+            if kind == 'qoq':
+                quarter = int(part.upper().lstrip('Q'))
+                if not 1 <= quarter <= 4:
+                    raise ValueError(at)
+                start = int(year) * 12 + (quarter - 1) * 3
+            else:
+                month = int(part)
+                if not 1 <= month <= 12:
+                    raise ValueError(at)
+                start = int(year) * 12 + month - 1
+    except ValueError:
+        example = {'yoy': '2021', 'qoq': '2021-Q2', 'mom': '2021-06'}[kind]
+        raise CompareError(f'Invalid at for {kind}: {at} (expected e.g. {example})')
+    if span is not None and not span[0] <= start <= span[1]:
+        raise CompareError(f'No data for {at}: periods with data run from '
+                           f'{_period_label(kind, span[0])} to {_period_label(kind, span[1])}')
+    return start
+
+
+class PeriodCube:
+    """Measure sums per month and dimension-member combination"""
+
+    def __init__(self, dataset):
+        df = dataset.df
+        month = df['Year'].to_numpy(dtype=np.int64) * 12 + df['Month'].to_numpy(dtype=np.int64) - 1
+        self.labels = {}
+        codes = {}
+        for col in COMPARE_DIMENSIONS.values():
+            codes[col], self.labels[col] = dataset.group_codes(col)
+        values = {name: df[col].to_numpy(dtype=np.float64) for name, col in CUBE_MEASURES.items()}
+        values['count'] = df[ROW_COUNT].to_numpy(dtype=np.float64) if ROW_COUNT in df.columns \
+            else np.ones(len(df))
+        self._fill(month, codes, values)
+
+    def _fill(self, month, codes, values):
+        """Sum values into one cell per distinct (month, member codes against self.labels)"""
+        first_month = int(month.min()) if len(month) else 0
+        key = month.astype(np.int64) - first_month
+        radices = []
+        for col in COMPARE_DIMENSIONS.values():
+            radices.append(len(self.labels[col]) + 1)
+            key = key * radices[-1] + codes[col].astype(np.int64) + 1  # code -1 (missing) becomes 0
+        cell_keys, row_cell = np.unique(key, return_inverse=True)
+
+        self.codes = {}
+        for col, radix in zip(reversed(list(COMPARE_DIMENSIONS.values())), reversed(radices)):
+            self.codes[col] = (cell_keys % radix - 1).astype(np.int32)
+            cell_keys = cell_keys // radix
+        self.month = (cell_keys + first_month).astype(np.int32)
+        self.sums = {name: np.bincount(row_cell, weights=column, minlength=len(self.month))
+                     for name, column in values.items()}
+
+    def merged(self, other, labels):
+        """
+        New cube holding the cells of both, with member codes against labels
+        ({column: sorted labels} covering the members of both cubes)
+        """
+        cube = PeriodCube.__new__(PeriodCube)
+        cube.labels = labels
+        codes = {}
+        for col in COMPARE_DIMENSIONS.values():
+            index = pd.Index(labels[col])
+            # Old code -> new code, with -1 (missing) kept as the last entry
+            codes[col] = np.concatenate([np.append(index.get_indexer(part.labels[col]), -1)[part.codes[col]]
+                                         for part in (self, other)])
+        cube._fill(np.concatenate([self.month, other.month]), codes,
+                   {name: np.concatenate([self.sums[name], other.sums[name]]) for name in self.sums})
+        return cube
+
+    def snapshot_state(self):
+        """(metadata, {name: array}) to store the cube in a dataset snapshot"""
+        arrays = {'month': self.month}
+        arrays.update({f'codes.{col}': codes for col, codes in self.codes.items()})
+        arrays.update({f'sums.{name}': sums for name, sums in self.sums.items()})
+        return None, arrays
+
+    @classmethod
+    def from_snapshot(cls, dataset, meta, arrays):
+        """Cube stored by snapshot_state; member labels are the dataset's group labels"""
+        cube = cls.__new__(cls)
+        cube.month = arrays['month']
+        cube.labels = {col: dataset.group_codes(col)[1] for col in COMPARE_DIMENSIONS.values()}
+        cube.codes = {col: arrays[f'codes.{col}'] for col in COMPARE_DIMENSIONS.values()}
+        cube.sums = {name: arrays[f'sums.{name}'] for name in list(CUBE_MEASURES) + ['count']}
+        return cube
+
+    def __len__(self):
+        return len(self.month)
+
+    def latest(self, kind):
+        """Start month of the latest period of this kind that has data"""
+        last = int(self.month.max())
+        return last - last % COMPARISONS[kind]
+
+    def span(self, kind):
+        """Start months of the earliest and the latest period of this kind that have data"""
+        first = int(self.month.min())
+        return first - first % COMPARISONS[kind], self.latest(kind)
+
+    def filter_mask(self, filters):
+        """Mask over the cells for {column: label values} IN filters"""
+        mask = np.ones(len(self.month), dtype=bool)
+        for col, values in filters.items():
+            wanted = np.flatnonzero(np.isin(self.labels[col], values))
+            mask &= np.isin(self.codes[col], wanted)
+        return mask
+
+    def _member_sums(self, codes, num_members, cells):
+        return {name: np.bincount(codes[cells], weights=values[cells], minlength=num_members)
+                for name, values in self.sums.items()}
+
+    def compare(self, by, kind, start, filters=None):
+        """
+        Per member of the `by` column: current and prior period values with
+        absolute and percent deltas, largest current sales first
+        """
+        months = COMPARISONS[kind]
+        mask = self.filter_mask(filters or {})
+        current = mask & (self.month >= start) & (self.month < start + months)
+        prior = mask & (self.month >= start - months) & (self.month < start)
+
+        labels = list(self.labels[by].tolist()) + [None]
+        codes = np.where(self.codes[by] < 0, len(labels) - 1, self.codes[by])
+        now = self._member_sums(codes, len(labels), current)
+        before = self._member_sums(codes, len(labels), prior)
+        members = np.flatnonzero((now['count'] > 0) | (before['count'] > 0))
+        members = members[np.lexsort((-before['sales'][members], -now['sales'][members]))]
+
+        return {
+            'comparison': kind,
+            'by': by,
+            'current': self._period(kind, start),
+            'prior': self._period(kind, start - months),
+            'totals': self._values({name: values.sum() for name, values in now.items()},
+                                   {name: values.sum() for name, values in before.items()}),
+            'members': [dict(label=labels[member],
+                             **self._values({name: values[member] for name, values in now.items()},
+                                            {name: values[member] for name, values in before.items()}))
+                        for member in members.tolist()],
+        }
+
+    @staticmethod
+    def _period(kind, start):
+        first = pd.Timestamp(year=start // 12, month=start % 12 + 1, day=1)
+        last = first + pd.DateOffset(months=COMPARISONS[kind]) - pd.Timedelta(days=1)
+        return {'period': _period_label(kind, start), 'from': first.strftime('%Y-%m-%d'),
+                'to': last.strftime('%Y-%m-%d')}
+
+    @staticmethod
+    def _values(now, before):
+        """{measure: current, prior, delta, pct} for one member (or the totals)"""
+        def margin(sums):
+            return float(sums['margin'] / sums['count']) if sums['count'] else None
+
+        values = {}
+        for name, current, prior in (
+                ('sales', float(now['sales']), float(before['sales'])),
+                ('profit', float(now['profit']), float(before['profit'])),
+                ('units', float(now['units']), float(before['units'])),
+                ('transactions', int(round(now['count'])), int(round(before['count']))),
+                ('avg_margin', margin(now), margin(before))):
+            delta = current - prior if current is not None and prior is not None else None
+            values[name] = {
+                'current': current,
+                'prior': prior,
+                'delta': delta,
+                'pct': delta / abs(prior) if delta is not None and prior else None,
+            }
+        return values
+
+    def memory_bytes(self):
+        arrays = [self.month] + list(self.codes.values()) + list(self.sums.values())
+        return sum(array.nbytes for array in arrays)
@@ -0,0 +1,286 @@
+# /dashboard/crossfilter.py
+
+"""
+Crossfilter sessions behind /api/crossfilter.
+
+A session holds the dropdown selections of one dashboard view. For every
+dimension it keeps group sums over the rows that pass all the *other*
+dimensions' filters. That is what a chart grouped by that dimension shows
+(a chart never filters itself away). It also keeps totals over the rows
+that pass every filter.
+
+Each row carries a count of the filters it fails. When one dimension's
+selection changes, only the rows of the groups that were added to or
+removed from the selection (the delta) can change status. Their old and new
+contributions are computed from the fail counts, and the other dimensions'
+group sums are adjusted with one np.bincount per measure. A change costs
+O(delta rows), not O(rows).
+
+Sessions live in the worker process, in a small LRU (CROSSFILTER_SESSIONS).
+A session created on a previous dataset version is rebuilt from its
+selections when it is next used.
+
+Every response carries the session's full selection (`filters`), and the
+client sends it back with each update (`current`). The state therefore
+travels with the client. With several workers (gunicorn WEB_CONCURRENCY),
+an update routed to a worker that does not hold the session rebuilds it
+there from `current`. An update routed to a worker whose copy is behind is
+first brought to `current`, which only re-aggregates the groups that differ.
+Only updates that carry no `current` need the session to live in the
+receiving worker (404 otherwise).
+"""
+
+import secrets
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .aggregates import ROW_COUNT
+
+# Query name -> column; the same dropdowns as the API's IN filters
+CROSSFILTER_DIMENSIONS = {
+    'year': 'Year',
+    'quarter': 'Quarter',
+    'region': 'Region',
+    'product': 'Product',
+    'retailer': 'Retailer',
+    'sales_method': 'Sales Method',
+}
+MEASURES = ['Total Sales', 'Operating Profit', 'Units Sold', 'Operating Margin']
+# Group sums are (groups, len(MEASURES) + 1): the measures, then the transaction count
+COUNT = len(MEASURES)
+
+
+class CrossfilterError(ValueError):
+    """A malformed selection"""
+
+
+class CrossfilterIndex:
+    """Per-dataset structures shared by all sessions: codes and rows by group for each dimension"""
+
+    def __init__(self, dataset):
+        df = dataset.df
+        self.dataset = dataset
+        self.size = len(df)
+        self.codes, self.labels, self.rows_by_group, self.offsets = {}, {}, {}, {}
+        for dim, col in CROSSFILTER_DIMENSIONS.items():
+            codes, labels = dataset.group_codes(col)
+            labels = list(labels.tolist())
+            if len(codes) and codes.min() < 0:
+                codes = np.where(codes < 0, len(labels), codes)
+                labels.append(None)
+            # Rows of each group, contiguous: rows_by_group[offsets[g]:offsets[g + 1]]
+            order = np.argsort(codes, kind='stable').astype(np.int32)
+            self.codes[dim] = codes
+            self.labels[dim] = labels
+            self.rows_by_group[dim] = order
+            self.offsets[dim] = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+        self.measures = [df[col].to_numpy() for col in MEASURES]
+        self.weights = df[ROW_COUNT].to_numpy() if ROW_COUNT in df.columns else None
+
+    def values(self, rows):
+        """(measures + count, len(rows)) matrix for some rows, one contiguous line per measure"""
+        matrix = np.empty((COUNT + 1, len(rows)))
+        for i, column in enumerate(self.measures):
+            matrix[i] = column[rows]
+        matrix[COUNT] = 1 if self.weights is None else self.weights[rows]
+        return matrix
+
+    def group_sums(self, dim, rows, values, signs=None):
+        """(groups, measures + count) sums of values per group of dim, optionally signed"""
+        codes = self.codes[dim][rows].astype(np.intp)
+        sums = np.empty((len(self.labels[dim]), COUNT + 1))
+        for i in range(COUNT + 1):
+            weights = values[i] if signs is None else values[i] * signs
+            sums[:, i] = np.bincount(codes, weights=weights, minlength=len(self.labels[dim]))
+        return sums
+
+    def memory_bytes(self):
+        return sum(rows.nbytes + offsets.nbytes for rows, offsets
+                   in zip(self.rows_by_group.values(), self.offsets.values()))
+
+
+class Crossfilter:
+    """One view's selections, fail counts and per-dimension group sums"""
+
+    def __init__(self, index, filters=None):
+        self.index = index
+        self.lock = threading.Lock()
+        self.selected = {dim: np.ones(len(labels), dtype=bool) for dim, labels in index.labels.items()}
+        self.filters = {}
+        for dim, values in (filters or {}).items():
+            self.selected[dim] = self._selection(dim, values)
+            if values:
+                self.filters[dim] = values
+        self._rebuild()
+
+    def _selection(self, dim, values):
+        """Boolean mask over the groups of dim (all groups for None or [])"""
+        if dim not in CROSSFILTER_DIMENSIONS:
+            raise CrossfilterError(f"Unknown dimension: {dim} (expected {', '.join(CROSSFILTER_DIMENSIONS)})")
+        labels = self.index.labels[dim]
+        if not values:
+            return np.ones(len(labels), dtype=bool)
+        if not isinstance(values, list):
+            raise CrossfilterError(f"Values for {dim} must be a list")
+        wanted = {str(value) for value in values}
+        return np.array([str(label) in wanted for label in labels], dtype=bool)
+
+    def _fails(self, dim, rows):
+        return ~self.selected[dim][self.index.codes[dim][rows]]
+
+    def _rebuild(self):
+        """Full computation, O(rows x dimensions)"""
+        index = self.index
+        rows = np.arange(index.size)
+        fails = {dim: self._fails(dim, rows) for dim in CROSSFILTER_DIMENSIONS}
+        self.fail_count = np.sum(list(fails.values()), axis=0, dtype=np.uint8)
+        values = index.values(rows)
+        self.groups = {}
+        for dim in CROSSFILTER_DIMENSIONS:
+            keep = self.fail_count == fails[dim]
+            self.groups[dim] = index.group_sums(dim, rows[keep], values[:, keep])
+        self.totals = values[:, self.fail_count == 0].sum(axis=1)
+
+    def select(self, dim, values):
+        """Change one dimension's selection (None selects everything); returns the delta row count"""
+        new = self._selection(dim, values)
+        old = self.selected[dim]
+        index = self.index
+        flipped = np.flatnonzero(old != new)
+        rows_by_group, offsets = index.rows_by_group[dim], index.offsets[dim]
+        rows = np.concatenate([rows_by_group[offsets[g]:offsets[g + 1]] for g in flipped]) if len(flipped) else \
+            np.array([], dtype=np.int32)
+        if len(flipped) > 1:
+            # Row order makes the gathers below sequential instead of random
+            rows.sort()
+
+        before = self.fail_count[rows].astype(np.int16)
+        # Every delta row flips for dim: it now passes if it failed, or fails if it passed
+        after = before + np.where(new[index.codes[dim][rows]], -1, 1)
+        delta = index.values(rows)
+        for other in CROSSFILTER_DIMENSIONS:
+            if other == dim:
+                continue
+            fails_other = self._fails(other, rows)
+            change = (after == fails_other).astype(np.int8) - (before == fails_other).astype(np.int8)
+            moved = np.flatnonzero(change)
+            if len(moved):
+                self.groups[other] += index.group_sums(other, rows[moved], delta[:, moved], change[moved])
+        change = (after == 0).astype(np.int8) - (before == 0).astype(np.int8)
+        self.totals += delta @ change
+
+        self.fail_count[rows] = after
+        self.selected[dim] = new
+        if not values:
+            self.filters.pop(dim, None)
+        else:
+            self.filters[dim] = values
+        return len(rows)
+
+    def state(self):
+        """Totals plus, per dimension, the groups the other filters leave non-empty"""
+        totals = self.totals
+        count = totals[COUNT]
+        groups = {}
+        for dim, sums in self.groups.items():
+            present = np.flatnonzero(sums[:, COUNT] > 0)
+            labels = self.index.labels[dim]
+            counts = sums[present, COUNT]
+            groups[dim] = {
+                'labels': [labels[g] for g in present.tolist()],
+                'selected': self.selected[dim][present].tolist(),
+                'sales': sums[present, 0].tolist(),
+                'profit': sums[present, 1].tolist(),
+                'units': sums[present, 2].tolist(),
+                'avg_margin': (sums[present, 3] / counts).tolist(),
+                'transactions': np.rint(counts).astype(np.int64).tolist(),
+            }
+        return {
+            'filters': self.filters,
+            'totals': {
+                'total_sales': float(totals[0]),
+                'total_profit': float(totals[1]),
+                'total_units': float(totals[2]),
+                'avg_margin': float(totals[3] / count) if count else None,
+                'total_transactions': int(round(count)),
+            },
+            'groups': groups,
+        }
+
+    def memory_bytes(self):
+        return self.fail_count.nbytes + sum(sums.nbytes for sums in self.groups.values())
+
+
+class CrossfilterSessions:
+    """Thread-safe LRU of crossfilter sessions, sharing one index per dataset"""
+
+    def __init__(self, max_sessions=32):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _index_for(self, dataset):
+        index = self._index
+        if index is None or index.dataset is not dataset:
+            index = self._index = CrossfilterIndex(dataset)
+        return index
+
+    def create(self, dataset, filters=None):
+        """New session id and its Crossfilter"""
+        session_id = secrets.token_urlsafe(12)
+        return session_id, self.restore(session_id, dataset, filters)
+
+    def restore(self, session_id, dataset, filters=None):
+        """
+        Crossfilter for session_id built from its filters, for a session this
+        process does not hold (created by another worker, or evicted)
+        """
+        with self._lock:
+            index = self._index_for(dataset)
+        session = Crossfilter(index, filters)
+        with self._lock:
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id, dataset):
+        """The session (rebuilt if it was made on another dataset), or None"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            if session.index.dataset is dataset:
+                return session
+            index = self._index_for(dataset)
+        session = Crossfilter(index, session.filters)
+        with self._lock:
+            self._sessions[session_id] = session
+        return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    @property
+    def bytes(self):
+        with self._lock:
+            index = self._index
+            sessions = list(self._sessions.values())
+        return (index.memory_bytes() if index is not None else 0) + sum(s.memory_bytes() for s in sessions)
+
+    def evict(self, nbytes):
+        """Drop least recently used sessions until nbytes are freed; returns bytes freed"""
+        freed = 0
+        with self._lock:
+            while self._sessions and freed < nbytes:
+                _, session = self._sessions.popitem(last=False)
+                freed += session.memory_bytes()
+        return freed
+
+    def __len__(self):
+        return len(self._sessions)
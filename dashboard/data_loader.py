@@ -1,9 +1,83 @@
 # /dashboard/data_loader.py
 
+import os
+
 import pandas as pd
 
+from .dataset import Dataset
+from .snapshot import SnapshotError, load_snapshot
+from .streaming import DEFAULT_CHUNKSIZE, load_rollup
+
+# Schema of adidas_sales_cleaned.csv
+COLUMNS = ['Retailer', 'Retailer ID', 'Invoice Date', 'Region', 'State', 'City',
+           'Product', 'Price per Unit', 'Units Sold', 'Total Sales',
+           'Operating Profit', 'Operating Margin', 'Sales Method', 'Year',
+           'Month', 'Month_Name', 'Quarter', 'Day_of_Week']
+NUMERIC_COLUMNS = ['Retailer ID', 'Price per Unit', 'Units Sold', 'Total Sales',
+                   'Operating Profit', 'Operating Margin', 'Year', 'Month', 'Quarter']
+
 def load_data(path):
     """Loads and prepares the dataset."""
     df = pd.read_csv(path)
     df['Invoice Date'] = pd.to_datetime(df['Invoice Date'])
-    return df
\ No newline at end of file
+    return df
+
+def validate_data(df):
+    """
+    Check a loaded frame against the dataset schema
+    Raises ValueError describing the first problem found
+    """
+    missing = [col for col in COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    if len(df) == 0:
+        raise ValueError('Dataset is empty')
+
+    non_numeric = [col for col in NUMERIC_COLUMNS if not pd.api.types.is_numeric_dtype(df[col])]
+    if non_numeric:
+        raise ValueError(f"Non-numeric values in: {', '.join(non_numeric)}")
+
+    null_counts = df[COLUMNS].isna().sum()
+    if null_counts.any():
+        bad = null_counts[null_counts > 0]
+        raise ValueError('Missing values in: ' + ', '.join(f'{col} ({n})' for col, n in bad.items()))
+
+def snapshot_path_for(data_path):
+    """
+    Snapshot location for a CSV: $DATA_SNAPSHOT if set, else next to the CSV.
+    DATA_SNAPSHOT=off disables snapshots entirely.
+    """
+    override = os.environ.get('DATA_SNAPSHOT')
+    if override:
+        return None if override.lower() == 'off' else override
+    return os.path.splitext(data_path)[0] + '.snapshot'
+
+def streaming_mode():
+    """
+    True when DATA_MODE=streaming: the CSV is read in chunks and only the
+    rollup is kept in memory (for datasets larger than RAM)
+    """
+    return os.environ.get('DATA_MODE', '').lower() == 'streaming'
+
+def load_dataset(data_path):
+    """
+    Load the Dataset, preferring an up-to-date build-time snapshot.
+    Falls back to parsing the CSV when there is no usable snapshot.
+    In streaming mode the CSV is rolled up chunk by chunk instead.
+    """
+    if streaming_mode():
+        chunksize = int(os.environ.get('DATA_CHUNK_ROWS', DEFAULT_CHUNKSIZE))
+        dataset = Dataset(load_rollup(data_path, chunksize), source=data_path)
+        dataset.rolled_up = True
+        return dataset
+
+    snapshot_path = snapshot_path_for(data_path)
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            dataset = load_snapshot(snapshot_path, source_path=data_path)
+            print(f"Loaded dataset snapshot: {snapshot_path}")
+            return dataset
+        except SnapshotError as e:
+            print(f"Ignoring snapshot, falling back to CSV: {e}")
+
+    return Dataset(load_data(data_path), source=data_path)
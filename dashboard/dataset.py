@@ -0,0 +1,462 @@
+# /dashboard/dataset.py
+
+"""
+In-memory dataset for the dashboard.
+
+A Dataset bundles the sales DataFrame with everything derived from it at
+load time. Both the CSV path and the build-time snapshot produce one, so the
+routes never need to know where the data came from.
+
+Datasets are never modified in place. Appending rows returns a new Dataset
+that shares the existing chunks, and the chunks are concatenated on first
+access to `df`.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+from flask import current_app, g
+
+from .aggregates import Aggregates
+from .compare import PeriodCube
+from .geo import GeoTree
+from .partitions import PartitionIndex
+from .sampling import APPROX_SAMPLE_ROWS, build_sample
+from .transactions import SortIndex, merge_sorted, sort_values
+
+# Text columns that are dictionary-encoded once at load time
+DIMENSION_COLUMNS = ['Retailer', 'Region', 'State', 'City', 'Product',
+                     'Sales Method', 'Month_Name', 'Day_of_Week']
+
+
+def encode_dimensions(df):
+    """
+    Dictionary-encode the dimension columns
+    Returns {column: (codes, categories)} with sorted categories
+    """
+    encoded = {}
+    for col in DIMENSION_COLUMNS:
+        if col not in df.columns:
+            continue
+        categorical = pd.Categorical(df[col])
+        categories = np.asarray(categorical.categories, dtype=object)
+        encoded[col] = (np.asarray(categorical.codes), categories)
+    return encoded
+
+
+def decode_dimension(codes, categories):
+    """Expand dictionary codes back into an object array (NaN for code -1)"""
+    values = categories.take(codes)
+    if len(codes) and codes.min() < 0:
+        values[codes < 0] = np.nan
+    return values
+
+
+def _code_dtype(num_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if num_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _extend_categories(categories, values):
+    """
+    (categories, remap) with the new values among values slotted into the
+    sorted categories. remap holds the new code of each old code, plus -1 at
+    the end so that code -1 (missing) maps to itself; None when nothing is new.
+    """
+    new_values = pd.Index(values).unique().dropna().difference(categories)
+    if not len(new_values):
+        return categories, None
+    merged = pd.Index(categories).append(new_values).sort_values()
+    remap = np.append(merged.get_indexer(categories), -1).astype(_code_dtype(len(merged)))
+    return merged.to_numpy(), remap
+
+
+class DateIndex:
+    """
+    Row positions ordered by Invoice Date.
+    A date range resolves to slice bounds by binary search, O(log n), and
+    costs O(k log k) more to return the k matching positions in row order.
+    """
+
+    def __init__(self, dates):
+        values = np.asarray(dates.to_numpy(), dtype='datetime64[ns]')
+        self.order = np.argsort(values, kind='stable')
+        self.sorted_dates = values[self.order]
+        # Date-sorted data needs no reordering at all
+        self.presorted = bool(np.array_equal(self.order, np.arange(len(values))))
+
+    def appended(self, dates, offset):
+        """New DateIndex with the dates of rows offset and on merged in, without re-sorting the others"""
+        values = np.asarray(dates.to_numpy(), dtype='datetime64[ns]')
+        index = DateIndex.__new__(DateIndex)
+        index.order, index.sorted_dates = merge_sorted(self.order, self.sorted_dates, values, offset)
+        index.presorted = self.presorted and bool(np.array_equal(index.order[len(self.order):],
+                                                                 np.arange(len(self.order), len(index.order))))
+        return index
+
+    def bounds(self, start=None, end=None):
+        """Slice [lo, hi) of the sorted dates with start <= date < end"""
+        lo = 0 if start is None else int(np.searchsorted(self.sorted_dates, np.datetime64(start, 'ns'), 'left'))
+        hi = len(self.sorted_dates) if end is None else int(
+            np.searchsorted(self.sorted_dates, np.datetime64(end, 'ns'), 'left'))
+        return lo, max(lo, hi)
+
+    def positions(self, start=None, end=None):
+        """Positions of the rows with start <= date < end, in row order"""
+        lo, hi = self.bounds(start, end)
+        if self.presorted:
+            return np.arange(lo, hi)
+        return np.sort(self.order[lo:hi])
+
+    def memory_bytes(self):
+        return self.order.nbytes + self.sorted_dates.nbytes
+
+
+class Dataset:
+    """The sales DataFrame plus its load-time derived structures"""
+
+    # StratifiedSample on the sample datasets built by `sample`
+    sampling = None
+    # True for streaming rollups: each row sums the transactions of one month and key
+    rolled_up = False
+
+    def __init__(self, df, codes=None, source=None, frozen=False, version=1, aggregates=None):
+        codes = codes if codes is not None else encode_dimensions(df)
+        self.source = source
+        # Bumped on every reload or append; caches key their entries on it
+        self.version = version
+        self.frozen = frozen
+        self.categories = {col: categories for col, (_, categories) in codes.items()}
+        self._chunks = [df]
+        self._code_chunks = {col: [col_codes] for col, (col_codes, _) in codes.items()}
+        self._aggregates = aggregates
+        self._date_index = None
+        self._group_codes = {}
+        self._geo_tree = None
+        self._sort_indexes = {}
+        self._sample = None
+        self._partitions = None
+        self._period_cube = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def memory_bytes(self):
+        """
+        Bytes held by the row chunks, dimension codes and categories.
+        Text cells count as one pointer each under pandas 2 (one string per
+        category), and as their own bytes under pandas 3 (Arrow strings).
+        Memoized until the chunks change.
+        """
+        row_chunks = self._chunks
+        cached = getattr(self, '_memory_bytes', None)
+        if cached is not None and cached[0] is row_chunks:
+            return cached[1]
+        total = sum(int(chunk.memory_usage(index=True, deep=False).sum()) for chunk in row_chunks)
+        for col, chunks in self._code_chunks.items():
+            total += sum(codes.nbytes for codes in chunks)
+            total += int(pd.Series(self.categories[col]).memory_usage(index=False, deep=True))
+        self._memory_bytes = (row_chunks, total)
+        return total
+
+    def aggregates_memory_bytes(self):
+        """Bytes held by the aggregates (0 until they are first built)"""
+        aggregates = self._aggregates
+        return aggregates.memory_bytes() if aggregates is not None else 0
+
+    def date_index_memory_bytes(self):
+        """Bytes held by the date index (0 until it is first built)"""
+        date_index = self._date_index
+        return date_index.memory_bytes() if date_index is not None else 0
+
+    def geo_tree_memory_bytes(self):
+        """Bytes held by the geography rollup tree (0 until it is first built)"""
+        geo_tree = self._geo_tree
+        return geo_tree.memory_bytes() if geo_tree is not None else 0
+
+    def sort_indexes_memory_bytes(self):
+        """Bytes held by the sort indexes (the Invoice Date one shares the date index)"""
+        return sum(index.memory_bytes() for col, index in list(self._sort_indexes.items())
+                   if col != 'Invoice Date')
+
+    def period_cube_memory_bytes(self):
+        """Bytes held by the period comparison cube (0 until it is first built)"""
+        period_cube = self._period_cube
+        return period_cube.memory_bytes() if period_cube is not None else 0
+
+    def partitions_memory_bytes(self):
+        """Bytes held by the time partitions (0 until they are first built)"""
+        partitions = self._partitions
+        return partitions.memory_bytes() if partitions is not None else 0
+
+    def sample_memory_bytes(self):
+        """Bytes held by the stratified sample (0 until it is first built)"""
+        sample = self._sample
+        return sample.memory_bytes() if sample is not None else 0
+
+    def group_codes_memory_bytes(self):
+        """Bytes held by the codes factorized by group_codes"""
+        return sum(codes.nbytes + labels.nbytes for codes, labels in list(self._group_codes.values()))
+
+    @property
+    def columns(self):
+        """Column labels, without materializing appended chunks"""
+        return self._chunks[0].columns
+
+    @property
+    def df(self):
+        """All rows as one DataFrame (appended chunks are concatenated on first access)"""
+        if len(self._chunks) > 1:
+            self._materialize()
+        return self._chunks[0]
+
+    @property
+    def codes(self):
+        """{column: (codes, categories)} for the dimension columns"""
+        if len(self._chunks) > 1:
+            self._materialize()
+        return {col: (chunks[0], self.categories[col]) for col, chunks in self._code_chunks.items()}
+
+    @property
+    def aggregates(self):
+        """Additive totals and group sums, built on first use and merged on append"""
+        if self._aggregates is None:
+            with self._lock:
+                if self._aggregates is None:
+                    self._aggregates = Aggregates.from_frame(self.df)
+        return self._aggregates
+
+    @property
+    def date_index(self):
+        """DateIndex over 'Invoice Date', built on first use"""
+        if self._date_index is None:
+            df = self.df
+            with self._lock:
+                if self._date_index is None:
+                    self._date_index = DateIndex(df['Invoice Date'])
+        return self._date_index
+
+    @property
+    def geo_tree(self):
+        """Region -> State -> City GeoTree, built on first use"""
+        if self._geo_tree is None:
+            # Materialize appended chunks first: _materialize takes the lock too
+            self.df
+            with self._lock:
+                if self._geo_tree is None:
+                    self._geo_tree = GeoTree(self)
+        return self._geo_tree
+
+    @property
+    def period_cube(self):
+        """PeriodCube of monthly sums per member combination, built on first use"""
+        if self._period_cube is None:
+            self.df
+            with self._lock:
+                if self._period_cube is None:
+                    self._period_cube = PeriodCube(self)
+        return self._period_cube
+
+    @property
+    def partitions(self):
+        """Year / Quarter PartitionIndex, built per chunk on first use and extended on append"""
+        if self._partitions is None:
+            with self._lock:
+                if self._partitions is None:
+                    self._partitions = PartitionIndex.from_chunks(self._chunks, self._code_chunks)
+        return self._partitions
+
+    @property
+    def sample(self):
+        """
+        Stratified sample Dataset for approximate answers, built on first use.
+        None when the dataset is small enough to answer exactly (or sampling is off).
+        """
+        if not APPROX_SAMPLE_ROWS or len(self) <= 2 * APPROX_SAMPLE_ROWS:
+            return None
+        if self._sample is None:
+            self.df
+            with self._lock:
+                if self._sample is None:
+                    self._sample = build_sample(self)
+        # Responses from the sample are cached under this dataset's version
+        self._sample.version = self.version
+        return self._sample
+
+    def adopt(self, **structures):
+        """Use prebuilt derived structures (partitions=..., geo_tree=...) instead of building them on first use"""
+        for name, structure in structures.items():
+            if not hasattr(self, f'_{name}'):
+                raise AttributeError(f'Dataset has no derived structure {name}')
+            setattr(self, f'_{name}', structure)
+
+    def sort_index(self, col):
+        """SortIndex over col, built on first use (Invoice Date reuses the date index)"""
+        index = self._sort_indexes.get(col)
+        if index is None:
+            if col == 'Invoice Date':
+                date_index = self.date_index
+                index = SortIndex(date_index.order, date_index.sorted_dates.view(np.int64))
+            else:
+                index = SortIndex.from_values(sort_values(self.df[col]))
+            self._sort_indexes[col] = index
+        return index
+
+    def group_codes(self, col):
+        """
+        (codes, labels) for grouping on col: the dictionary codes of dimension
+        columns, or sorted integer codes factorized on first use for the others
+        (Year, Quarter, Month...). Code -1 marks a missing value.
+        """
+        codes = self.codes
+        if col in codes:
+            return codes[col]
+        cached = self._group_codes.get(col)
+        if cached is None:
+            values, labels = pd.factorize(self.df[col], sort=True)
+            labels = np.asarray(labels)
+            cached = (values.astype(_code_dtype(len(labels))), labels)
+            self._group_codes[col] = cached
+        return cached
+
+    def _materialize(self):
+        with self._lock:
+            if len(self._chunks) == 1:
+                return
+            codes = {col: np.concatenate(chunks) for col, chunks in self._code_chunks.items()}
+            data = {}
+            for col in self._chunks[0].columns:
+                if col in codes:
+                    # Only the appended chunks are decoded; the first one already holds the category strings
+                    values = np.concatenate([self._chunks[0][col].to_numpy()] + [
+                        decode_dimension(chunk_codes, self.categories[col])
+                        for chunk_codes in self._code_chunks[col][1:]])
+                else:
+                    values = np.concatenate([chunk[col].to_numpy() for chunk in self._chunks])
+                if self.frozen:
+                    values.flags.writeable = False
+                data[col] = values
+            for col_codes in codes.values():
+                col_codes.flags.writeable = not self.frozen
+            self._code_chunks = {col: [col_codes] for col, col_codes in codes.items()}
+            self._chunks = [pd.DataFrame(data, copy=False)]
+
+    def append(self, batch):
+        """
+        New Dataset with the rows of batch appended.
+
+        Dimension codes are extended against the existing categories. A new
+        value is slotted in sorted order, which renumbers the codes of that
+        column (the only step over the existing rows besides copies). Built
+        structures are extended with the batch rather than dropped: the
+        aggregates and the period cube are merged with the batch's, the batch
+        becomes new partitions, group codes are extended, and the date and sort
+        indexes merge its rows in without re-sorting the others. The geography
+        tree and the sample are rebuilt on first use. Row frames are only
+        concatenated when `df` is first read.
+        """
+        batch = batch[list(self._chunks[0].columns)].reset_index(drop=True)
+        offset = len(self)
+        categories = dict(self.categories)
+        code_chunks = {}
+        remaps = {}
+        for col, chunks in self._code_chunks.items():
+            col_categories, remap = _extend_categories(categories[col], batch[col])
+            if remap is not None:
+                categories[col] = col_categories
+                chunks = [remap[codes] for codes in chunks]
+                remaps[col] = remap
+            batch_codes = pd.Index(col_categories).get_indexer(batch[col])
+            code_chunks[col] = chunks + [batch_codes.astype(_code_dtype(len(col_categories)))]
+
+        group_codes = {}
+        for col, (codes, labels) in list(self._group_codes.items()):
+            labels, remap = _extend_categories(labels, batch[col])
+            if remap is not None:
+                codes = remap[codes]
+            batch_codes = pd.Index(labels).get_indexer(batch[col]).astype(_code_dtype(len(labels)))
+            group_codes[col] = (np.concatenate([codes, batch_codes]), labels)
+
+        dataset = Dataset.__new__(Dataset)
+        dataset.source = self.source
+        dataset.version = self.version
+        dataset.frozen = self.frozen
+        dataset.rolled_up = self.rolled_up
+        dataset.categories = categories
+        dataset._chunks = self._chunks + [batch]
+        dataset._code_chunks = code_chunks
+        dataset._aggregates = self.aggregates.merged(Aggregates.from_frame(batch))
+        dataset._date_index = None if self._date_index is None else \
+            self._date_index.appended(batch['Invoice Date'], offset)
+        dataset._group_codes = group_codes
+        dataset._geo_tree = None
+        # The Invoice Date one is a view of the date index
+        dataset._sort_indexes = {col: index.appended(sort_values(batch[col]), offset)
+                                 for col, index in list(self._sort_indexes.items()) if col != 'Invoice Date'}
+        dataset._sample = None
+        dataset._period_cube = None if self._period_cube is None else self._period_cube.merged(
+            PeriodCube(Dataset(batch)), {col: categories[col] for col in self._period_cube.labels})
+        # The batch lands in new partitions; the existing ones are kept as they are
+        dataset._partitions = None if self._partitions is None else self._partitions.appended(
+            batch, {col: chunks[-1] for col, chunks in code_chunks.items()}, offset, remaps)
+        dataset._lock = threading.Lock()
+        return dataset
+
+    def freeze(self):
+        """
+        Rebuild the frame from read-only arrays so it can be shared by forked workers.
+
+        With pandas 2 (requirements.txt), text columns stay object arrays whose
+        cells point at one string object per category. pandas 3 converts them
+        to Arrow string arrays instead: a copy holding every cell's text, but
+        in immutable buffers with no per-cell objects. Either way no data page
+        is written after the fork, so copy-on-write never duplicates it.
+        Snapshot datasets are built this way already.
+        """
+        if self.frozen:
+            return self
+
+        df, codes = self.df, self.codes
+        data = {}
+        for col in df.columns:
+            if col in codes:
+                values = decode_dimension(*codes[col])
+            else:
+                values = df[col].to_numpy(copy=True)
+            values.flags.writeable = False
+            data[col] = values
+
+        for col_codes, categories in codes.values():
+            col_codes.flags.writeable = False
+            categories.flags.writeable = False
+
+        self._chunks = [pd.DataFrame(data, copy=False)]
+        self.frozen = True
+        return self
+
+
+def current_dataset():
+    """
+    The dataset for the current request.
+    Pinned on first use, so a request keeps seeing one consistent dataset even
+    if a reload swaps app.dataset while it is running.
+    """
+    if 'dataset' not in g:
+        g.dataset = current_app.dataset
+    return g.dataset
+
+
+def publish_dataset(app, dataset):
+    """
+    Make dataset the current one under the next version number.
+    Callers must hold app.dataset_lock; readers never take it.
+    """
+    dataset.version = app.dataset.version + 1
+    # A single attribute assignment, so readers see the old or the new dataset
+    app.dataset = dataset
+    app.response_cache.invalidate_before(dataset.version)
+    app.memory.enforce()
@@ -0,0 +1,248 @@
+# /dashboard/geo.py
+
+"""
+Region -> State -> City rollup tree behind /api/drilldown.
+
+Built once per dataset version. Every node holds the totals of its subtree,
+and the children of every node are pre-sorted by sales, so an unfiltered
+drilldown is a slice of a sorted list.
+
+Filtered drilldowns read the tree's slices instead of the rows. A slice is
+one city crossed with one (year, quarter, month, product, retailer, sales
+method) combination, holding the sums of those rows. Filters on those
+columns, and date ranges made of whole months, become a mask over the
+slices. The masked slices are summed per city with np.bincount and rolled
+up the tree. Date ranges that cut into a month need the rows, so they
+aggregate the matching row positions per city instead.
+"""
+
+import numpy as np
+
+from .aggregates import ROW_COUNT
+
+GEO_LEVELS = ['Region', 'State', 'City']
+LEVEL_NAMES = ['region', 'state', 'city']
+# Filter columns kept in the slices (Quarter adds no slices; it follows Month)
+SLICE_COLUMNS = ['Year', 'Quarter', 'Month', 'Product', 'Retailer', 'Sales Method']
+TREE_MEASURES = {'sales': 'Total Sales', 'profit': 'Operating Profit',
+                 'units': 'Units Sold', 'margin': 'Operating Margin'}
+
+
+def _combine(code_arrays, radices):
+    key = np.zeros(len(code_arrays[0]), dtype=np.int64)
+    for codes, radix in zip(code_arrays, radices):
+        key *= radix
+        key += codes.astype(np.int64) + 1  # code -1 (missing) becomes 0
+    return key
+
+
+def _sorted_children(parent_of, sales, num_parents):
+    """Child ids of each parent, largest sales first"""
+    order = np.lexsort((-sales, parent_of))
+    bounds = np.searchsorted(parent_of[order], np.arange(num_parents + 1))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(num_parents)]
+
+
+class GeoTree:
+    """Region, State and City nodes with subtree totals and per-slice sums"""
+
+    def __init__(self, dataset):
+        df = dataset.df
+        geo = [dataset.group_codes(col) for col in GEO_LEVELS]
+        row_key = _combine([codes for codes, _ in geo], [len(labels) + 1 for _, labels in geo])
+        city_keys, self.row_city = np.unique(row_key, return_inverse=True)
+        self.row_city = self.row_city.astype(np.min_scalar_type(len(city_keys)))
+
+        # Decode each city's (region, state, city) codes, then number the states and regions.
+        # Codes here are shifted by one so that 0 stands for a missing value.
+        radices = [len(labels) + 1 for _, labels in geo]
+        shifted = []
+        keys = city_keys
+        for radix in reversed(radices):
+            shifted.append(keys % radix)
+            keys = keys // radix
+        region_code, state_code, city_code = reversed(shifted)
+        state_keys, self.city_state = np.unique(region_code * radices[1] + state_code, return_inverse=True)
+        region_keys, self.state_region = np.unique(state_keys // radices[1], return_inverse=True)
+
+        def names(codes, labels):
+            return [labels[code - 1] if code > 0 else None for code in codes.tolist()]
+
+        self.names = [names(region_keys, geo[0][1]),
+                      names(state_keys % radices[1], geo[1][1]),
+                      names(city_code, geo[2][1])]
+
+        # Slices: per-city sums for every combination of the filter columns
+        self.slice_labels = {}
+        slice_codes = [self.row_city]
+        radices = [len(city_keys)]
+        for col in SLICE_COLUMNS:
+            codes, labels = dataset.group_codes(col)
+            self.slice_labels[col] = labels
+            slice_codes.append(codes)
+            radices.append(len(labels) + 1)
+        slice_keys, row_slice = np.unique(_combine(slice_codes, radices), return_inverse=True)
+        self.slice_codes = {}
+        keys = slice_keys
+        for col, radix in zip(reversed(SLICE_COLUMNS), reversed(radices[1:])):
+            self.slice_codes[col] = (keys % radix - 1).astype(np.int16)
+            keys = keys // radix
+        self.slice_city = (keys - 1).astype(np.int32)
+
+        weights = df[ROW_COUNT].to_numpy(dtype=np.float64) if ROW_COUNT in df.columns else None
+        self.slice_sums = {name: np.bincount(row_slice, weights=df[col].to_numpy(dtype=np.float64),
+                                             minlength=len(slice_keys))
+                           for name, col in TREE_MEASURES.items()}
+        self.slice_sums['count'] = np.bincount(row_slice, weights=weights, minlength=len(slice_keys))
+        self._finish()
+
+    def _finish(self):
+        """Name lookup, whole-tree totals and sorted children, from the nodes and slices"""
+        self.parents = [None, self.state_region, self.city_state]
+        self.lookup = [{} for _ in GEO_LEVELS]
+        for level, level_names in enumerate(self.names):
+            parents = self.parents[level]
+            for node, name in enumerate(level_names):
+                self.lookup[level][(int(parents[node]) if parents is not None else None, name)] = node
+        self.totals = self.rollup(self.slice_city, self.slice_sums)
+        self.children = self.sorted_children(self.totals)
+
+    def snapshot_state(self):
+        """(metadata, {name: array}) to store the tree in a dataset snapshot"""
+        arrays = {'row_city': self.row_city, 'city_state': self.city_state,
+                  'state_region': self.state_region, 'slice_city': self.slice_city}
+        arrays.update({f'slice_codes.{col}': codes for col, codes in self.slice_codes.items()})
+        arrays.update({f'slice_sums.{name}': sums for name, sums in self.slice_sums.items()})
+        return {'names': self.names}, arrays
+
+    @classmethod
+    def from_snapshot(cls, dataset, meta, arrays):
+        """Tree stored by snapshot_state; slice labels are the dataset's group labels"""
+        tree = cls.__new__(cls)
+        tree.names = meta['names']
+        tree.row_city, tree.city_state = arrays['row_city'], arrays['city_state']
+        tree.state_region, tree.slice_city = arrays['state_region'], arrays['slice_city']
+        tree.slice_labels = {col: dataset.group_codes(col)[1] for col in SLICE_COLUMNS}
+        tree.slice_codes = {col: arrays[f'slice_codes.{col}'] for col in SLICE_COLUMNS}
+        tree.slice_sums = {name: arrays[f'slice_sums.{name}'] for name in list(TREE_MEASURES) + ['count']}
+        tree._finish()
+        return tree
+
+    def rollup(self, city_of, sums):
+        """Per-level totals [regions, states, cities] of measure sums grouped by city"""
+        num_cities = len(self.city_state)
+        cities = {name: np.bincount(city_of, weights=values, minlength=num_cities)
+                  for name, values in sums.items()}
+        states = {name: np.bincount(self.city_state, weights=values, minlength=len(self.state_region))
+                  for name, values in cities.items()}
+        regions = {name: np.bincount(self.state_region, weights=values, minlength=len(self.names[0]))
+                   for name, values in states.items()}
+        return [regions, states, cities]
+
+    def sorted_children(self, totals):
+        """[root's regions, children of each region, children of each state], largest sales first"""
+        root = np.argsort(-totals[0]['sales'], kind='stable')
+        return [[root],
+                _sorted_children(self.state_region, totals[1]['sales'], len(self.names[0])),
+                _sorted_children(self.city_state, totals[2]['sales'], len(self.names[1]))]
+
+    def resolve(self, path):
+        """(level, node) for a path of names from the root; level 0 / node None is the root"""
+        node = None
+        for level, name in enumerate(path):
+            if level >= len(GEO_LEVELS):
+                raise KeyError('/'.join(path))
+            node = self.lookup[level].get((node, name))
+            if node is None:
+                raise KeyError('/'.join(path))
+        return len(path), node
+
+    def slice_mask(self, filters, months=None):
+        """
+        Mask over the slices for {column: label values} IN filters, and an
+        optional [start, end) range of month ordinals (year * 12 + month - 1)
+        """
+        mask = np.ones(len(self.slice_city), dtype=bool)
+        for col, values in filters.items():
+            if col == 'Region':
+                regions = np.flatnonzero(np.isin(np.array(self.names[0], dtype=object), values))
+                city_region = self.state_region[self.city_state]
+                mask &= np.isin(city_region[self.slice_city], regions)
+                continue
+            wanted = np.flatnonzero(np.isin(self.slice_labels[col], values))
+            mask &= np.isin(self.slice_codes[col], wanted)
+        if months is not None:
+            year = self.slice_labels['Year'].take(self.slice_codes['Year']).astype(np.int64)
+            month = self.slice_labels['Month'].take(self.slice_codes['Month']).astype(np.int64)
+            ordinal = year * 12 + month - 1
+            start, end = months
+            if start is not None:
+                mask &= ordinal >= start
+            if end is not None:
+                mask &= ordinal < end
+        return mask
+
+    def filtered_totals(self, mask):
+        return self.rollup(self.slice_city[mask], {name: values[mask] for name, values in self.slice_sums.items()})
+
+    def position_totals(self, df, positions):
+        """Totals for the rows at positions (used when a date bound falls inside a month)"""
+        weights = df[ROW_COUNT].to_numpy(dtype=np.float64)[positions] if ROW_COUNT in df.columns else None
+        sums = {name: df[col].to_numpy(dtype=np.float64)[positions] for name, col in TREE_MEASURES.items()}
+        sums['count'] = weights if weights is not None else np.ones(len(positions))
+        return self.rollup(self.row_city[positions], sums)
+
+    def drilldown(self, path, top=None, totals=None):
+        """
+        The node at path with its children, largest sales first (the first
+        `top` of them if given). totals defaults to the whole tree; filtered
+        totals only return children that have sales.
+        """
+        level, node = self.resolve(path)
+        filtered = totals is not None
+        totals = totals if filtered else self.totals
+        if level == len(GEO_LEVELS):
+            children = np.array([], dtype=np.int64)
+        elif filtered:
+            candidates = np.arange(len(self.names[0])) if level == 0 else self.children[level][node]
+            candidates = candidates[totals[level]['count'][candidates] > 0]
+            children = candidates[np.argsort(-totals[level]['sales'][candidates], kind='stable')]
+        else:
+            children = self.children[level][0 if level == 0 else node]
+        num_children = len(children)
+        if top is not None:
+            children = children[:top]
+
+        if level == 0:
+            node_totals = {name: float(values.sum()) for name, values in totals[0].items()}
+        else:
+            node_totals = {name: float(values[node]) for name, values in totals[level - 1].items()}
+        return {
+            'path': list(path),
+            'level': LEVEL_NAMES[level - 1] if level else 'all',
+            'child_level': LEVEL_NAMES[level] if level < len(GEO_LEVELS) else None,
+            'node': self._node(path[-1] if path else 'All', node_totals, node_totals['sales']),
+            'children': [self._node(self.names[level][child],
+                                    {name: float(values[child]) for name, values in totals[level].items()},
+                                    node_totals['sales'])
+                         for child in children.tolist()],
+            'total_children': num_children,
+        }
+
+    @staticmethod
+    def _node(name, sums, parent_sales):
+        count = sums['count']
+        return {
+            'name': name,
+            'sales': sums['sales'],
+            'profit': sums['profit'],
+            'units': sums['units'],
+            'transactions': int(count),
+            'avg_margin': sums['margin'] / count if count else None,
+            'share': sums['sales'] / parent_sales if parent_sales else None,
+        }
+
+    def memory_bytes(self):
+        arrays = [self.row_city, self.city_state, self.state_region, self.slice_city]
+        arrays += list(self.slice_codes.values()) + list(self.slice_sums.values())
+        return sum(array.nbytes for array in arrays)
@@ -0,0 +1,328 @@
+# /dashboard/ingest.py
+
+"""
+Incremental ingestion of new sales rows.
+
+Batches are validated with vectorized checks and written to an append log
+(NDJSON next to the CSV). They are then appended to the current dataset as a
+new version, which extends its indexes rather than rebuilding them (see
+Dataset.append). The log is replayed on startup and after every reload. Once it holds INGEST_COMPACT_ROWS rows it is
+compacted: the logged rows are appended to the CSV, the snapshot is refreshed
+and the log is truncated.
+
+The log is shared by every process serving the same CSV (gunicorn workers).
+Each process remembers how many bytes of it its dataset holds, and appends
+the rows other processes logged after that offset (see
+DatasetReloader.follow). Writes to the log, the CSV and the snapshot take an
+exclusive lock on a file next to the log and reads take a shared one, so a
+process never reads a half-written batch or a log that is being compacted.
+
+In streaming mode the live dataset is a rollup, so batches are rolled up
+before they are appended.
+"""
+
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import COLUMNS, NUMERIC_COLUMNS, snapshot_path_for
+from .dataset import publish_dataset
+from .snapshot import write_snapshot
+from .streaming import ROW_COUNT, finish_rollup, rollup_frame
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows, where the dev server is a single process
+    fcntl = None
+
+# Most row errors reported back for a rejected batch
+MAX_REPORTED_ERRORS = 20
+
+
+class BatchError(ValueError):
+    """A batch failed validation; errors is a list of {'row', 'error'} dicts"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid row(s)')
+        self.errors = errors
+
+
+def parse_batch(body, content_type):
+    """Build a frame from a JSON (list of rows or {'rows': [...]}) or CSV body"""
+    if content_type and 'csv' in content_type:
+        return pd.read_csv(io.StringIO(body.decode('utf-8')), dtype=str)
+
+    payload = json.loads(body or b'null')
+    rows = payload.get('rows') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list) or not rows:
+        raise BatchError([{'row': None, 'error': 'Expected a non-empty list of rows'}])
+    return pd.DataFrame.from_records(rows)
+
+
+def validate_batch(raw):
+    """
+    Coerce and check a batch against the dataset schema, column-wise.
+    Returns a frame with the same columns and dtypes as the loaded CSV, or
+    raises BatchError listing the offending rows.
+    """
+    columns = [str(col) for col in raw.columns]
+    missing = [col for col in COLUMNS if col not in columns]
+    unknown = [col for col in columns if col not in COLUMNS]
+    if missing or unknown:
+        detail = []
+        if missing:
+            detail.append(f"missing columns: {', '.join(missing)}")
+        if unknown:
+            detail.append(f"unknown columns: {', '.join(unknown)}")
+        raise BatchError([{'row': None, 'error': '; '.join(detail)}])
+
+    batch = pd.DataFrame(index=raw.index)
+    failures = []
+
+    def check(mask, message):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            failures.append((mask, message))
+
+    for col in COLUMNS:
+        if col == 'Invoice Date':
+            batch[col] = pd.to_datetime(raw[col], errors='coerce', format='mixed')
+            check(batch[col].isna(), 'Invoice Date is not a valid date')
+        elif col in NUMERIC_COLUMNS:
+            batch[col] = pd.to_numeric(raw[col], errors='coerce')
+            check(batch[col].isna(), f'{col} is not a number')
+        else:
+            values = raw[col].astype(object)
+            blank = values.isna() | (values.astype(str).str.strip() == '')
+            check(blank, f'{col} is empty')
+            batch[col] = values.where(~blank, '').astype(str).str.strip()
+
+    dates = batch['Invoice Date']
+    check(batch['Price per Unit'] <= 0, 'Price per Unit must be positive')
+    for col in ['Units Sold', 'Total Sales']:
+        check(batch[col] < 0, f'{col} must not be negative')
+    check(batch['Operating Margin'].abs() > 1, 'Operating Margin must be between -1 and 1')
+    has_sales = batch['Total Sales'] > 0
+    margin = batch['Operating Profit'] / batch['Total Sales'].where(has_sales)
+    check(has_sales & ((margin - batch['Operating Margin']).abs() > 0.01),
+          'Operating Margin does not match Operating Profit / Total Sales')
+
+    # Calendar columns must agree with the invoice date
+    valid_dates = dates.notna()
+    check(valid_dates & (batch['Year'] != dates.dt.year), 'Year does not match Invoice Date')
+    check(valid_dates & (batch['Month'] != dates.dt.month), 'Month does not match Invoice Date')
+    check(valid_dates & (batch['Quarter'] != dates.dt.quarter), 'Quarter does not match Invoice Date')
+    check(valid_dates & (batch['Month_Name'] != dates.dt.month_name()), 'Month_Name does not match Invoice Date')
+    check(valid_dates & (batch['Day_of_Week'] != dates.dt.day_name()), 'Day_of_Week does not match Invoice Date')
+
+    if failures:
+        errors = []
+        for mask, message in failures:
+            for row in np.flatnonzero(mask)[:MAX_REPORTED_ERRORS]:
+                errors.append({'row': int(row), 'error': message})
+        errors.sort(key=lambda e: e['row'])
+        raise BatchError(errors[:MAX_REPORTED_ERRORS])
+
+    # Match the dtypes pandas infers for the CSV
+    for col in ['Retailer ID', 'Units Sold', 'Total Sales', 'Operating Profit', 'Year', 'Month', 'Quarter']:
+        if (batch[col] % 1 != 0).any():
+            raise BatchError([{'row': int(np.flatnonzero(batch[col] % 1 != 0)[0]),
+                               'error': f'{col} must be a whole number'}])
+        batch[col] = batch[col].astype('int64')
+    for col in ['Price per Unit', 'Operating Margin']:
+        batch[col] = batch[col].astype('float64')
+    return batch.reset_index(drop=True)
+
+
+def _write_csv(df, path, append=False):
+    """Write rows in the layout of adidas_sales_cleaned.csv"""
+    df[COLUMNS].to_csv(path, index=False, date_format='%Y-%m-%d',
+                       mode='a' if append else 'w', header=not append)
+
+
+def _append_rows(dataset, batch):
+    """Append a validated batch, rolling it up first if the dataset is a rollup"""
+    if ROW_COUNT in dataset.columns:
+        batch = finish_rollup(rollup_frame(batch))
+    return dataset.append(batch)
+
+
+class Ingestor:
+    """Appends validated batches to the live dataset and the append log"""
+
+    def __init__(self, app, data_path, compact_rows=10000):
+        self.app = app
+        self.data_path = data_path
+        self.log_path = os.path.splitext(data_path)[0] + '.append.ndjson'
+        self.lock_path = self.log_path + '.lock'
+        self.compact_rows = compact_rows
+        # Bytes and rows of the log that the live dataset holds
+        self.log_offset = 0
+        self.log_rows = 0
+        self._compacting = None
+
+    @contextmanager
+    def log_lock(self, exclusive=False):
+        """Lock the log (and the CSV while it is compacted) against the other processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def log_size(self):
+        try:
+            return os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+
+    def _read_log(self, start=0):
+        """(validated batch or None, end offset) of the complete lines logged from byte start on"""
+        try:
+            with open(self.log_path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+        except OSError:
+            return None, start
+        # A line only counts once its newline is written
+        data = data[:data.rfind(b'\n') + 1]
+        rows = [json.loads(line) for line in data.splitlines() if line.strip()]
+        batch = validate_batch(pd.DataFrame.from_records(rows)) if rows else None
+        return batch, start + len(data)
+
+    def _take_new_rows(self):
+        """Batch of the rows logged after log_offset, or None; callers hold the log lock"""
+        batch, self.log_offset = self._read_log(self.log_offset)
+        if batch is not None:
+            self.log_rows += len(batch)
+        return batch
+
+    def replay(self, dataset):
+        """
+        Append every logged batch (the rows not yet in the CSV).
+        Callers hold the log lock, so the CSV and the log match.
+        """
+        self.log_offset = self.log_rows = 0
+        batch = self._take_new_rows()
+        if batch is None:
+            return dataset
+        print(f"Replayed {len(batch)} rows from {self.log_path}")
+        return _append_rows(dataset, batch)
+
+    def behind(self):
+        """True if the log changed since this process last read it"""
+        return self.log_size() != self.log_offset
+
+    def truncated(self):
+        """True if another process compacted the log after this one last read it"""
+        return self.log_size() < self.log_offset
+
+    def catch_up(self):
+        """
+        Append the rows other processes logged since this one last read the
+        log. Returns False if the log was compacted meanwhile: the dataset
+        then needs a full reload.
+        """
+        # Another thread is already publishing; the next request catches up
+        if not self.app.dataset_lock.acquire(blocking=False):
+            return True
+        try:
+            with self.log_lock():
+                if self.app.reloader.outdated():
+                    return False
+                batch = self._take_new_rows()
+                if batch is not None:
+                    publish_dataset(self.app, _append_rows(self.app.dataset, batch))
+        finally:
+            self.app.dataset_lock.release()
+        return True
+
+    def ingest(self, batch):
+        """Log, append and publish a validated batch; returns the new dataset"""
+        records = batch.assign(**{'Invoice Date': batch['Invoice Date'].dt.strftime('%Y-%m-%d')})
+        lines = records[COLUMNS].to_json(orient='records', lines=True)
+
+        with self.app.dataset_lock:
+            with self.log_lock(exclusive=True):
+                outdated = self.app.reloader.outdated()
+                # Rows the other processes logged go in first, as in the log
+                logged = None if outdated else self._take_new_rows()
+                with open(self.log_path, 'a') as f:
+                    f.write(lines if lines.endswith('\n') else lines + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.log_offset = self.log_size()
+                self.log_rows += len(batch)
+            rows = batch if logged is None else pd.concat([logged, batch], ignore_index=True)
+            dataset = _append_rows(self.app.dataset, rows)
+            publish_dataset(self.app, dataset)
+
+        if outdated:
+            # The log was compacted under this process: reload CSV and log together
+            self.app.reloader.reload_async()
+        elif self.compact_rows and self.log_rows >= self.compact_rows:
+            self.compact_async()
+        return dataset
+
+    def compact(self):
+        """Fold the append log into the CSV (and snapshot), then truncate the log"""
+        with self.app.dataset_lock:
+            with self.log_lock(exclusive=True):
+                if self.app.reloader.outdated():
+                    # Another process compacted first
+                    outdated = True
+                else:
+                    outdated = False
+                    logged = self._take_new_rows()
+                    if logged is not None:
+                        publish_dataset(self.app, _append_rows(self.app.dataset, logged))
+                    if not self.log_rows:
+                        return False
+                    self._fold_log()
+        if outdated:
+            self.app.reloader.reload_async()
+            return False
+        return True
+
+    def _fold_log(self):
+        """Compaction proper; callers hold the dataset lock and the exclusive log lock"""
+        dataset = self.app.dataset
+        # The CSV already holds every row but the logged ones, so appending
+        # them costs O(log) and works when only a rollup is in memory
+        batch, _ = self._read_log()
+        with open(self.data_path, 'a') as f:
+            _write_csv(batch, f, append=True)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Refresh an existing snapshot so it doesn't go stale
+        snapshot_path = snapshot_path_for(self.data_path)
+        if (snapshot_path and os.path.exists(snapshot_path)
+                and ROW_COUNT not in dataset.columns):
+            write_snapshot(dataset, snapshot_path, source_path=self.data_path)
+
+        open(self.log_path, 'w').close()
+        self.log_offset = self.log_rows = 0
+        # The CSV now matches the live dataset; don't let the watcher reload it,
+        # and have the other processes reload it in place of their log rows
+        self.app.reloader.mark_loaded()
+        self.app.reloader.broadcast()
+        print(f"Compacted {len(batch)} logged rows into {self.data_path}")
+
+    def compact_async(self):
+        """Compact in the background unless a compaction is already running"""
+        if self._compacting is not None and self._compacting.is_alive():
+            return False
+        self._compacting = threading.Thread(target=self.compact, name='ingest-compact', daemon=True)
+        self._compacting.start()
+        return True
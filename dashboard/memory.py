@@ -0,0 +1,77 @@
+# /dashboard/memory.py
+
+"""
+Memory accounting (process RSS/PSS is read by observability/memory.py).
+
+MemoryRegistry tracks what the large in-process structures (dataset,
+aggregates, caches, model) report about their own size. With a budget
+(MEMORY_BUDGET_MB) it evicts cache entries, lowest priority cache first,
+whenever the tracked total goes over.
+"""
+
+import threading
+
+
+class MemoryRegistry:
+    """Self-reported sizes of the large in-process structures, with an optional budget"""
+
+    def __init__(self, budget_bytes=0):
+        self.budget_bytes = budget_bytes
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, size, evict=None, priority=0):
+        """
+        Track a structure: size() returns its bytes.
+        Caches also pass evict(nbytes), which frees at least nbytes if it can
+        and returns the bytes freed. Under pressure, caches with the lowest
+        priority are evicted first.
+        """
+        self._sources[name] = (size, evict, priority)
+
+    def breakdown(self):
+        """{name: bytes} for every registered structure"""
+        return {name: int(size()) for name, (size, _, _) in self._sources.items()}
+
+    def total(self):
+        return sum(self.breakdown().values())
+
+    def enforce(self):
+        """Evict cache entries until the tracked total fits the budget; returns bytes freed"""
+        if not self.budget_bytes:
+            return 0
+        # One thread enforcing is enough; the others carry on
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            over = self.total() - self.budget_bytes
+            freed = 0
+            evictable = sorted((priority, name, evict) for name, (_, evict, priority) in self._sources.items()
+                               if evict is not None)
+            for _, _, evict in evictable:
+                if over - freed <= 0:
+                    break
+                freed += evict(over - freed)
+            if freed:
+                self.evictions += 1
+                self.evicted_bytes += freed
+            return freed
+        finally:
+            self._lock.release()
+
+    def report(self):
+        """Breakdown, budget and eviction counters for diagnostics"""
+        breakdown = self.breakdown()
+        tracked = sum(breakdown.values())
+        return {
+            'budget_bytes': self.budget_bytes,
+            'tracked_bytes': tracked,
+            'over_budget': bool(self.budget_bytes) and tracked > self.budget_bytes,
+            # Largest first (a list, so JSON encoding keeps the order)
+            'structures': [{'name': name, 'bytes': size, 'evictable': self._sources[name][1] is not None}
+                           for name, size in sorted(breakdown.items(), key=lambda item: -item[1])],
+            'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes,
+        }
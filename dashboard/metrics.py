@@ -0,0 +1,60 @@
+# /dashboard/metrics.py
+
+"""
+Prometheus metrics for the dashboard (GET /metrics, text format 0.0.4).
+
+Requests are counted and timed by the thread-sharded collector shared with
+the ML API (see observability/metrics.py). Gauges (dataset size, memory,
+cache stats) are read at scrape time.
+
+Set METRICS=off to disable collection and the endpoint.
+"""
+
+import os
+
+from observability.memory import process_memory
+from observability.metrics import Metrics, instrument_app
+
+
+def init_metrics(app):
+    """Attach app.metrics and expose GET /metrics unless METRICS=off"""
+    app.metrics = metrics = Metrics()
+    if os.environ.get('METRICS', '').lower() in ('0', 'off', 'false', 'no'):
+        return
+
+    metrics.describe('dashboard_dataset_rows', 'gauge', 'Rows in the current dataset')
+    metrics.describe('dashboard_dataset_version', 'gauge', 'Version of the current dataset')
+    metrics.describe('dashboard_dataset_memory_bytes', 'gauge', 'Memory held by the current dataset')
+    metrics.describe('dashboard_response_cache_hits_total', 'counter', 'Response cache hits')
+    metrics.describe('dashboard_response_cache_misses_total', 'counter', 'Response cache misses')
+    metrics.describe('dashboard_response_cache_entries', 'gauge', 'Responses held in the cache')
+    metrics.describe('dashboard_memory_tracked_bytes', 'gauge', 'Self-reported size of each large structure')
+    metrics.describe('dashboard_memory_budget_bytes', 'gauge', 'MEMORY_BUDGET_MB in bytes (0 = no budget)')
+    metrics.describe('dashboard_memory_evicted_bytes_total', 'counter', 'Bytes evicted to stay within the budget')
+    metrics.describe('process_resident_memory_bytes', 'gauge', 'Resident set size')
+    metrics.describe('process_proportional_memory_bytes', 'gauge',
+                     'Proportional set size (shared pages split between processes)')
+
+    @metrics.collector
+    def collect_app():
+        dataset = app.dataset
+        cache = app.response_cache
+        memory = process_memory()
+        samples = [
+            ('dashboard_dataset_rows', (), len(dataset)),
+            ('dashboard_dataset_version', (), dataset.version),
+            ('dashboard_dataset_memory_bytes', (), dataset.memory_bytes()),
+            ('dashboard_response_cache_hits_total', (('cache', 'response'),), cache.hits),
+            ('dashboard_response_cache_misses_total', (('cache', 'response'),), cache.misses),
+            ('dashboard_response_cache_entries', (('cache', 'response'),), len(cache)),
+            ('process_resident_memory_bytes', (), memory['rss']),
+        ]
+        if 'pss' in memory:
+            samples.append(('process_proportional_memory_bytes', (), memory['pss']))
+        for name, size in app.memory.breakdown().items():
+            samples.append(('dashboard_memory_tracked_bytes', (('structure', name),), size))
+        samples.append(('dashboard_memory_budget_bytes', (), app.memory.budget_bytes))
+        samples.append(('dashboard_memory_evicted_bytes_total', (), app.memory.evicted_bytes))
+        return samples
+
+    instrument_app(app, metrics, 'dashboard')
@@ -7,6 +7,7 @@ Supports both local predictor and external ML API
 
 from flask import render_template, jsonify, request, current_app
 from . import ml_prediction_bp
+from ...timing import mark
 import sys
 import os
 from pathlib import Path
@@ -59,6 +60,19 @@ else:
         print(f"Failed to connect to ML API: {e}")
         MODELS_AVAILABLE = False
 
+_model_bytes = None
+
+def model_memory_bytes():
+    """Approximate memory held by the local model (its pickled size, measured once)"""
+    global _model_bytes
+    if _model_bytes is None:
+        if predictor is not None and predictor.units_model is not None:
+            import pickle
+            _model_bytes = len(pickle.dumps(predictor.units_model, protocol=pickle.HIGHEST_PROTOCOL))
+        else:
+            _model_bytes = 0
+    return _model_bytes
+
 @ml_prediction_bp.route('/')
 def index():
     """Main prediction page"""
@@ -106,6 +120,7 @@ def predict_demand():
                 json=data,
                 timeout=30
             )
+            mark('predict')
             return jsonify(response.json()), response.status_code
         else:
             # Use local predictor
@@ -118,6 +133,7 @@ def predict_demand():
                 month=data['month'],  # Can be month name or number
                 quarter=int(data['quarter'])
             )
+            mark('predict')
             return jsonify(result)
 
     except Exception as e:
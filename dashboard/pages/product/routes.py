@@ -1,19 +1,21 @@
-from flask import render_template, current_app
+from flask import render_template
 
 # Import the blueprint object from this package's __init__.py
 from . import bp
+from ...dataset import current_dataset
+from ...streaming import mean_margin, row_count
 
 @bp.route('/product')
 def index():
     """Product Analysis page"""
-    df = current_app.df
+    df = current_dataset().df
     
     # Calculate KPIs
     total_sales = df['Total Sales'].sum()
     total_profit = df['Operating Profit'].sum()
     total_units = df['Units Sold'].sum()
-    avg_margin = df['Operating Margin'].mean()
-    total_transactions = len(df)
+    avg_margin = mean_margin(df)
+    total_transactions = row_count(df)
 
     start_date = df['Invoice Date'].min().strftime('%B %d, %Y')
     end_date = df['Invoice Date'].max().strftime('%B %d, %Y')
@@ -0,0 +1,230 @@
+# /dashboard/partitions.py
+
+"""
+Year / Quarter time partitions of a dataset.
+
+The rows of every (Year, Quarter) are one partition: their positions in date
+order, plus a summary holding the measure sums, the transaction count, the
+first and last date, and the codes of the members present in each dimension
+column. Filters on year, quarter and date range select partitions, so rows
+of other quarters are never read. Other IN filters skip partitions that hold
+none of the wanted members. A date range cuts at most the first and last
+selected partition, and does so by binary search on its dates.
+
+Partitions are built per row chunk. An appended batch becomes new
+partitions next to the existing ones (a quarter can then have several),
+and the existing partitions are never modified (a new category value
+renumbers their member codes in copies). Positions are global row
+positions, so they stay valid when the chunks are concatenated.
+"""
+
+import numpy as np
+
+from .aggregates import MEASURES, ROW_COUNT
+
+PARTITION_COLUMNS = ['Year', 'Quarter']
+# Dimension columns whose members each partition records (pruning, distinct counts)
+MEMBER_COLUMNS = ['Region', 'Product', 'Retailer', 'Sales Method']
+
+
+class Partition:
+    """The rows of one (year, quarter) from one chunk, in date order, with their summary"""
+
+    def __init__(self, year, quarter, positions, dates, sums, members):
+        self.year = year
+        self.quarter = quarter
+        self.positions = positions
+        self.dates = dates
+        # {measure: sum} plus 'count' (transactions)
+        self.sums = sums
+        # {column: sorted codes of the members present}
+        self.members = members
+
+    def remapped(self, remaps):
+        """Copy sharing the rows, with member codes renumbered by remaps ({column: new code of each old code})"""
+        # Remaps keep the code order, so the member codes stay sorted
+        members = {col: remaps[col][codes] if col in remaps else codes for col, codes in self.members.items()}
+        return Partition(self.year, self.quarter, self.positions, self.dates, self.sums, members)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def memory_bytes(self):
+        return (self.positions.nbytes + self.dates.nbytes
+                + sum(codes.nbytes for codes in self.members.values()))
+
+
+def build_partitions(df, codes, offset=0):
+    """Partitions of one chunk; codes is {column: codes} for its rows, offset its first global position"""
+    years = df['Year'].to_numpy()
+    quarters = df['Quarter'].to_numpy()
+    dates = np.asarray(df['Invoice Date'].to_numpy(), dtype='datetime64[ns]')
+    order = np.lexsort((dates, quarters, years))
+    keys = np.stack([years[order], quarters[order]])
+    starts = np.flatnonzero(np.concatenate([[True], (keys[:, 1:] != keys[:, :-1]).any(axis=0)])) if len(order) \
+        else np.array([], dtype=np.int64)
+    bounds = np.append(starts, len(order))
+
+    weights = df[ROW_COUNT].to_numpy(dtype=np.float64) if ROW_COUNT in df.columns else np.ones(len(df))
+    sorted_values = {col: df[col].to_numpy(dtype=np.float64)[order] for col in MEASURES}
+    sorted_values['count'] = weights[order]
+    sorted_codes = {col: codes[col][order] for col in MEMBER_COLUMNS if col in codes}
+
+    partitions = []
+    for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        partitions.append(Partition(
+            int(keys[0, lo]), int(keys[1, lo]),
+            order[lo:hi] + offset,
+            dates[order[lo:hi]],
+            {name: float(values[lo:hi].sum()) for name, values in sorted_values.items()},
+            {col: np.unique(col_codes[lo:hi]) for col, col_codes in sorted_codes.items()},
+        ))
+    return partitions
+
+
+class PartitionIndex:
+    """All the partitions of a dataset, oldest chunk first"""
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+
+    @classmethod
+    def from_chunks(cls, chunks, code_chunks):
+        """Partitions of every chunk ({column: [codes per chunk]} for code_chunks)"""
+        partitions = []
+        offset = 0
+        for i, chunk in enumerate(chunks):
+            codes = {col: col_chunks[i] for col, col_chunks in code_chunks.items()}
+            partitions += build_partitions(chunk, codes, offset)
+            offset += len(chunk)
+        return cls(partitions)
+
+    def appended(self, batch, codes, offset, remaps=None):
+        """
+        New index with the batch's partitions added. The existing ones are
+        shared as they are, or copied with their member codes renumbered when
+        the batch brought new category values (remaps, see Partition.remapped).
+        """
+        partitions = self.partitions
+        if remaps:
+            partitions = [partition.remapped(remaps) for partition in partitions]
+        return PartitionIndex(partitions + build_partitions(batch, codes, offset))
+
+    def select(self, years=None, quarters=None, start=None, end=None, members=None):
+        """
+        (partition, lo, hi) for every partition that can hold matching rows:
+        [lo, hi) is the part of its date-ordered rows with start <= date < end.
+        members is {column: wanted codes}; partitions without any are skipped.
+        """
+        start = None if start is None else np.datetime64(start, 'ns')
+        end = None if end is None else np.datetime64(end, 'ns')
+        selection = []
+        for partition in self.partitions:
+            if years and partition.year not in years:
+                continue
+            if quarters and partition.quarter not in quarters:
+                continue
+            dates = partition.dates
+            if (start is not None and dates[-1] < start) or (end is not None and dates[0] >= end):
+                continue
+            if members and any(col in partition.members
+                               and not np.isin(wanted, partition.members[col], assume_unique=True).any()
+                               for col, wanted in members.items()):
+                continue
+            lo = 0 if start is None or dates[0] >= start else int(np.searchsorted(dates, start, 'left'))
+            hi = len(dates) if end is None or dates[-1] < end else int(np.searchsorted(dates, end, 'left'))
+            if hi > lo:
+                selection.append((partition, lo, hi))
+        return selection
+
+    @staticmethod
+    def positions(selection):
+        """Row positions of a selection, in row order"""
+        if not selection:
+            return np.array([], dtype=np.int64)
+        positions = np.concatenate([partition.positions[lo:hi] for partition, lo, hi in selection])
+        # Date-ordered data gives sorted runs, which a stable sort merges in linear time
+        return np.sort(positions, kind='stable')
+
+    @staticmethod
+    def kpis(selection, dataset):
+        """
+        KPI values (as Aggregates.kpis) of a selection: whole partitions from
+        their summaries, cut ones from their rows
+        """
+        sums = dict.fromkeys(MEASURES + ['count'], 0.0)
+        members = {col: [] for col in ('Product', 'Retailer', 'Region')}
+        cut = []
+        for partition, lo, hi in selection:
+            if lo == 0 and hi == len(partition):
+                for name, value in partition.sums.items():
+                    sums[name] += value
+                for col, codes in members.items():
+                    codes.append(partition.members[col])
+            else:
+                cut.append(partition.positions[lo:hi])
+        if cut:
+            positions = np.concatenate(cut)
+            df = dataset.df
+            for col in MEASURES:
+                sums[col] += float(df[col].to_numpy(dtype=np.float64)[positions].sum())
+            sums['count'] += float(df[ROW_COUNT].to_numpy(dtype=np.float64)[positions].sum()) \
+                if ROW_COUNT in df.columns else len(positions)
+            codes = dataset.codes
+            for col, col_codes in members.items():
+                col_codes.append(np.unique(codes[col][0][positions]))
+        count = int(round(sums['count']))
+        # Code -1 (a missing value) is not a member
+        distinct = {col: int((np.unique(np.concatenate(codes)) >= 0).sum()) if codes else 0
+                    for col, codes in members.items()}
+        return {
+            'total_sales': sums['Total Sales'],
+            'total_profit': sums['Operating Profit'],
+            'total_units': int(round(sums['Units Sold'])),
+            'avg_margin': sums['Operating Margin'] / count if count else float('nan'),
+            'total_transactions': count,
+            'num_products': distinct['Product'],
+            'num_retailers': distinct['Retailer'],
+            'num_regions': distinct['Region'],
+        }
+
+    def snapshot_state(self):
+        """(metadata, {name: array}) to store the index in a dataset snapshot"""
+        partitions = self.partitions
+        meta = [{'year': partition.year, 'quarter': partition.quarter, 'rows': len(partition),
+                 'sums': partition.sums, 'members': {col: len(codes) for col, codes in partition.members.items()}}
+                for partition in partitions]
+
+        def joined(arrays, dtype):
+            return np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+
+        state = {'positions': joined([partition.positions for partition in partitions], np.int64),
+                 'dates': joined([partition.dates for partition in partitions], 'datetime64[ns]')}
+        for col in MEMBER_COLUMNS:
+            state[f'members.{col}'] = joined([partition.members[col] for partition in partitions
+                                              if col in partition.members], np.int32)
+        return meta, state
+
+    @classmethod
+    def from_snapshot(cls, dataset, meta, arrays):
+        """Index stored by snapshot_state; the partitions are views of the stored arrays"""
+        partitions = []
+        offset = 0
+        member_offsets = dict.fromkeys(MEMBER_COLUMNS, 0)
+        for item in meta:
+            members = {}
+            for col, count in item['members'].items():
+                start = member_offsets[col]
+                members[col] = arrays[f'members.{col}'][start:start + count]
+                member_offsets[col] = start + count
+            rows = slice(offset, offset + item['rows'])
+            partitions.append(Partition(item['year'], item['quarter'], arrays['positions'][rows],
+                                        arrays['dates'][rows], item['sums'], members))
+            offset += item['rows']
+        return cls(partitions)
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def memory_bytes(self):
+        return sum(partition.memory_bytes() for partition in self.partitions)
@@ -0,0 +1,252 @@
+# /dashboard/pivot.py
+
+"""
+Pivot engine behind /api/pivot.
+
+Every grouping column already has small integer codes (the dictionary codes
+of the dimension columns, or Dataset.group_codes for Year, Quarter, Month...).
+The codes of the requested dimensions are combined into one mixed-radix cell
+key per row, and every aggregate is a single np.bincount over that key: no
+hashing, no per-group Python work. When the key space is too large for dense
+bincount arrays, the keys are compacted with np.unique first.
+
+Rollups (streaming mode) are handled like everywhere else: counts are
+weighted by 'Row Count', and measures are already sums. Stratified samples
+(approximate mode) are shaped like rollups; for them every value also gets
+an `error` matrix of 95% interval half-widths.
+"""
+
+import numpy as np
+
+from .aggregates import ROW_COUNT
+
+# Query name -> column
+PIVOT_DIMENSIONS = {
+    'region': 'Region',
+    'state': 'State',
+    'city': 'City',
+    'product': 'Product',
+    'retailer': 'Retailer',
+    'sales_method': 'Sales Method',
+    'year': 'Year',
+    'quarter': 'Quarter',
+    'month': 'Month',
+    'day_of_week': 'Day_of_Week',
+}
+PIVOT_MEASURES = {
+    'sales': 'Total Sales',
+    'profit': 'Operating Profit',
+    'units': 'Units Sold',
+    'margin': 'Operating Margin',
+    'price': 'Price per Unit',
+}
+# weighted = sum(Operating Profit) / sum(Total Sales), margin only
+AGGREGATIONS = ['sum', 'mean', 'weighted']
+DEFAULT_AGGREGATION = {'margin': 'weighted'}
+
+# Dense bincount arrays up to this many cells (and a few per filtered row),
+# np.unique compaction above
+DENSE_CELLS = 1 << 22
+# Largest rows x columns table a request may ask for
+MAX_RESULT_CELLS = 200_000
+
+
+class PivotError(ValueError):
+    """A malformed or oversized pivot request"""
+
+
+def parse_dimensions(raw):
+    """Comma-separated dimension names -> list (order kept, no repeats)"""
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in PIVOT_DIMENSIONS]
+    if unknown:
+        raise PivotError(f"Unknown dimension: {', '.join(unknown)} "
+                         f"(expected {', '.join(PIVOT_DIMENSIONS)})")
+    if len(set(names)) != len(names):
+        raise PivotError(f"Repeated dimension in {raw}")
+    return names
+
+
+def parse_values(raw):
+    """
+    'sales:sum,margin:weighted,count' -> [('sales', 'sum'), ('margin', 'weighted'), (None, 'count')]
+    A measure without an aggregation gets its default (sum; weighted for margin).
+    """
+    values = []
+    for item in (item.strip() for item in raw.split(',')):
+        if not item:
+            continue
+        if item == 'count':
+            values.append((None, 'count'))
+            continue
+        measure, _, agg = item.partition(':')
+        agg = agg or DEFAULT_AGGREGATION.get(measure, 'sum')
+        if measure not in PIVOT_MEASURES:
+            raise PivotError(f"Unknown measure: {measure} (expected {', '.join(PIVOT_MEASURES)} or count)")
+        if agg not in AGGREGATIONS:
+            raise PivotError(f"Unknown aggregation: {agg} (expected {', '.join(AGGREGATIONS)})")
+        if agg == 'weighted' and measure != 'margin':
+            raise PivotError('Only margin has a weighted aggregation')
+        values.append((measure, agg))
+    if not values:
+        raise PivotError('No values requested')
+    return values
+
+
+def value_name(measure, agg):
+    return agg if measure is None else f'{measure}_{agg}'
+
+
+def _dimension_codes(dataset, dim, positions):
+    """(codes with missing values moved to the last code, labels with a trailing None, radix)"""
+    codes, labels = dataset.group_codes(PIVOT_DIMENSIONS[dim])
+    if positions is not None:
+        codes = codes[positions]
+    labels = list(labels.tolist()) + [None]
+    codes = codes.astype(np.int64)
+    if len(codes) and codes.min() < 0:
+        codes[codes < 0] = len(labels) - 1
+    return codes, labels, len(labels)
+
+
+def _cell_keys(code_arrays, radices, length):
+    """Mixed-radix key of each row over the given dimensions (0 when there are none)"""
+    key = np.zeros(length, dtype=np.int64)
+    for codes, radix in zip(code_arrays, radices):
+        key *= radix
+        key += codes
+    return key
+
+
+def _decode(keys, labels, radices):
+    """Label tuples of mixed-radix keys"""
+    columns = []
+    for dim_labels, radix in zip(reversed(labels), reversed(radices)):
+        columns.append([dim_labels[code] for code in (keys % radix).tolist()])
+        keys = keys // radix
+    return [list(cell) for cell in zip(*reversed(columns))] if columns else [[] for _ in range(len(keys))]
+
+
+def pivot(dataset, rows, columns, values, positions=None):
+    """
+    Aggregate the dataset's rows (all, or those at `positions`) by the row and
+    column dimensions. Returns a columnar table: row and column labels, and
+    one rows x columns matrix per value with None for empty cells. Only rows
+    and columns that contain data are returned.
+    """
+    dims = rows + columns
+    length = len(dataset) if positions is None else len(positions)
+    code_arrays, labels, radices = [], [], []
+    for dim in dims:
+        codes, dim_labels, radix = _dimension_codes(dataset, dim, positions)
+        code_arrays.append(codes)
+        labels.append(dim_labels)
+        radices.append(radix)
+
+    cells = int(np.prod(radices, dtype=object)) if radices else 1
+    if cells >= 1 << 62:
+        raise PivotError('Too many dimension combinations')
+    key = _cell_keys(code_arrays, radices, length)
+    dense = cells <= min(DENSE_CELLS, max(4 * length, 1 << 16))
+    if dense:
+        group = key
+        ngroups = cells
+    else:
+        cell_keys, group = np.unique(key, return_inverse=True)
+        ngroups = len(cell_keys)
+
+    df = dataset.df
+    weights = None
+    if ROW_COUNT in df.columns:
+        weights = df[ROW_COUNT].to_numpy(dtype=np.float64)
+        if positions is not None:
+            weights = weights[positions]
+
+    counts = np.bincount(group, weights=weights, minlength=ngroups)
+    occupied = np.flatnonzero(np.bincount(group, minlength=ngroups))
+    occupied_keys = occupied if dense else cell_keys[occupied]
+
+    column_cells = int(np.prod(radices[len(rows):])) if columns else 1
+    row_keys, row_index = np.unique(occupied_keys // column_cells, return_inverse=True)
+    column_keys, column_index = np.unique(occupied_keys % column_cells, return_inverse=True)
+    if len(row_keys) * len(column_keys) > MAX_RESULT_CELLS:
+        raise PivotError(f"Result would have {len(row_keys)} x {len(column_keys)} cells "
+                         f"(limit {MAX_RESULT_CELLS}); add filters or use fewer dimensions")
+
+    sums = {}
+    measure_columns = {}
+
+    def measure_data(measure):
+        if measure not in measure_columns:
+            data = df[PIVOT_MEASURES[measure]].to_numpy(dtype=np.float64)
+            if positions is not None:
+                data = data[positions]
+            # A rollup row holds one price for Row Count transactions; the other measures are sums already
+            if measure == 'price' and weights is not None:
+                data = data * weights
+            measure_columns[measure] = data
+        return measure_columns[measure]
+
+    def measure_sums(measure):
+        if measure not in sums:
+            sums[measure] = np.bincount(group, weights=measure_data(measure), minlength=ngroups)
+        return sums[measure]
+
+    sampling = dataset.sampling
+    if sampling is not None:
+        # Sample rows by occupied cell, for the per-cell interval sums
+        compact = np.zeros(ngroups, dtype=np.int64)
+        compact[occupied] = np.arange(len(occupied))
+        sample_cells = compact[group]
+
+    def cell_errors(measure, agg):
+        row_weights = weights if weights is not None else np.ones(length)
+        if agg == 'count':
+            return sampling.total_error(row_weights, positions, sample_cells, len(occupied))
+        if agg == 'sum':
+            return sampling.total_error(measure_data(measure), positions, sample_cells, len(occupied))
+        if agg == 'mean':
+            return sampling.ratio_error(measure_data(measure), row_weights, positions, sample_cells, len(occupied))
+        return sampling.ratio_error(measure_data('profit'), measure_data('sales'), positions,
+                                    sample_cells, len(occupied))
+
+    def to_matrix(cells, integer=False):
+        matrix = np.full((len(row_keys), len(column_keys)), np.nan)
+        matrix[row_index, column_index] = cells
+        data = matrix.tolist()
+        # Cells without rows (and zero-sales margins) become null
+        for row in data:
+            for i, value in enumerate(row):
+                if value != value:
+                    row[i] = None
+                elif integer:
+                    row[i] = int(round(value))
+        return data
+
+    results = []
+    for measure, agg in values:
+        if agg == 'count':
+            cell_values = counts
+        elif agg == 'sum':
+            cell_values = measure_sums(measure)
+        elif agg == 'mean':
+            cell_values = measure_sums(measure) / np.maximum(counts, 1)
+        else:
+            sales = measure_sums('sales')
+            cell_values = np.divide(measure_sums('profit'), sales, out=np.full(ngroups, np.nan), where=sales != 0)
+        result = {'name': value_name(measure, agg), 'measure': measure, 'agg': agg,
+                  'data': to_matrix(cell_values[occupied], integer=agg == 'count')}
+        if sampling is not None:
+            result['error'] = to_matrix(cell_errors(measure, agg))
+        results.append(result)
+
+    table = {
+        'rows': {'dimensions': rows, 'labels': _decode(row_keys, labels[:len(rows)], radices[:len(rows)])},
+        'columns': {'dimensions': columns,
+                    'labels': _decode(column_keys, labels[len(rows):], radices[len(rows):])},
+        'values': results,
+        'filtered_rows': int(round(counts.sum())),
+    }
+    if sampling is not None:
+        table['approximate'] = True
+    return table
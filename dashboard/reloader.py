@@ -0,0 +1,152 @@
+# /dashboard/reloader.py
+
+"""
+Hot reload of the sales dataset.
+
+The new file is loaded, validated and frozen off the request path. It is then
+published with a single assignment to app.dataset, so readers never block
+and never see a half-built dataset. Requests already running keep the
+dataset they pinned (see current_dataset).
+
+Reloads are triggered by the file watcher (DATA_RELOAD_INTERVAL seconds,
+disabled by default) or by POST /admin/reload.
+
+Every process serving the CSV (gunicorn workers) follows the others on each
+request, at the cost of two os.stat calls. Rows another process ingested
+are appended from the shared append log. A compaction or POST /admin/reload
+rewrites a generation file next to the CSV, and a process that sees it
+change reloads in the background.
+"""
+
+import os
+import threading
+import time
+
+from .data_loader import load_dataset, validate_data
+from .dataset import publish_dataset
+
+
+class DatasetReloader:
+    """Watches the dataset file and swaps in new versions"""
+
+    def __init__(self, app, data_path, interval=0):
+        self.app = app
+        self.data_path = data_path
+        self.interval = interval
+        self.generation_path = os.path.splitext(data_path)[0] + '.generation'
+        self.last_result = None
+        self._signature = self._file_signature()
+        self._generation = self._generation_signature()
+        self._worker = None
+        self._watcher_pid = None
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.data_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _generation_signature(self):
+        try:
+            stat = os.stat(self.generation_path)
+        except OSError:
+            return None
+        # Rewritten by rename, so the inode changes even within one mtime tick
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def reload(self):
+        """Load, validate and publish the dataset file; returns a status dict"""
+        # Reloads, ingestion and compaction publish under the same lock
+        with self.app.dataset_lock:
+            started = time.perf_counter()
+            generation = self._generation_signature()
+            try:
+                # Shared lock: no process compacts the log into the CSV while it is read
+                with self.app.ingestor.log_lock():
+                    signature = self._file_signature()
+                    dataset = load_dataset(self.data_path)
+                    validate_data(dataset.df)
+                    dataset = self.app.ingestor.replay(dataset.freeze())
+            except Exception as e:
+                print(f"Dataset reload failed, keeping version {self.app.dataset.version}: {e}")
+                # Don't retry the same broken file on every watcher tick or request
+                self._signature = self._file_signature()
+                self._generation = generation
+                self.last_result = {'status': 'failed', 'error': f'{type(e).__name__}: {e}',
+                                    'version': self.app.dataset.version}
+                return self.last_result
+
+            publish_dataset(self.app, dataset)
+            self._signature = signature
+            self._generation = generation
+
+            self.last_result = {
+                'status': 'reloaded',
+                'version': dataset.version,
+                'rows': len(dataset),
+                'seconds': round(time.perf_counter() - started, 3),
+            }
+            print(f"Dataset reloaded: version {dataset.version}, {len(dataset)} rows")
+            return self.last_result
+
+    def reload_async(self):
+        """Start a reload in the background unless one is already running"""
+        if self._worker is not None and self._worker.is_alive():
+            return False
+        self._worker = threading.Thread(target=self.reload, name='dataset-reload', daemon=True)
+        self._worker.start()
+        return True
+
+    def mark_loaded(self):
+        """Treat the file as it is now as already loaded (after a compaction rewrote it)"""
+        self._signature = self._file_signature()
+
+    def broadcast(self):
+        """Have every other process serving this CSV reload it on its next request"""
+        temp_path = f'{self.generation_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(f'{time.time_ns()}\n')
+        os.replace(temp_path, self.generation_path)
+        self._generation = self._generation_signature()
+
+    def outdated(self):
+        """True if another process compacted the log or asked for a reload since this one loaded"""
+        return self._generation_signature() != self._generation or self.app.ingestor.truncated()
+
+    def _file_changed(self):
+        signature = self._file_signature()
+        return signature is not None and signature != self._signature
+
+    def changed(self):
+        """True if the dataset file or its append log differ from what this process loaded"""
+        return self._file_changed() or self.outdated() or self.app.ingestor.behind()
+
+    def follow(self):
+        """
+        Pick up what the other processes did (called per request): reload in
+        the background after a compaction or a broadcast reload, else append
+        the rows they ingested
+        """
+        if self.outdated():
+            self.reload_async()
+        elif self.app.ingestor.behind() and not self.app.ingestor.catch_up():
+            self.reload_async()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            if self._file_changed() or self.outdated():
+                self.reload()
+            elif self.app.ingestor.behind() and not self.app.ingestor.catch_up():
+                self.reload()
+
+    def ensure_watching(self):
+        """
+        Start the watcher thread in this process if enabled.
+        Called per request: threads don't survive a fork, so each worker starts its own.
+        """
+        if not self.interval or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name='dataset-watcher', daemon=True).start()
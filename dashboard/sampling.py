@@ -0,0 +1,187 @@
+# /dashboard/sampling.py
+
+"""
+Stratified samples for approximate answers (approx=1 or a latency budget).
+
+The sample is drawn once per dataset version, stratified by Region x
+Product x Sales Method. Each stratum gets a share of APPROX_SAMPLE_ROWS
+proportional to its size, with at least MIN_STRATUM_ROWS rows (or all its rows).
+Every sampled row then stands for N_h / n_h rows of its stratum.
+
+The sample is stored like a streaming rollup: the measures are multiplied
+by the row's weight and 'Row Count' holds the weight. Every route that
+handles rollups therefore answers from it unchanged, with scaled
+(Horvitz-Thompson) sums, weighted counts and ratio estimates for means.
+
+Confidence intervals use the stratified variance of a total,
+sum_h N_h^2 (1 - n_h / N_h) s_h^2 / n_h, where s_h^2 is the sample variance
+of the rows' values in stratum h, counting rows outside the filter as zero.
+Ratios (means, margins) are linearized first. Each stratum's sums come from
+one np.bincount, also per group of a pivot.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from .aggregates import ROW_COUNT
+from .streaming import ROLLUP_SUMS
+
+APPROX_SAMPLE_ROWS = int(os.environ.get('APPROX_SAMPLE_ROWS', '100000'))
+# Chosen automatically when a route's exact answers take longer than this (0: only approx=1)
+APPROX_BUDGET_MS = float(os.environ.get('APPROX_BUDGET_MS', '0'))
+MIN_STRATUM_ROWS = 30
+STRATA_COLUMNS = ['Region', 'Product', 'Sales Method']
+# Two-sided 95% normal quantile
+Z = 1.96
+CONFIDENCE = 0.95
+
+
+class StratifiedSample:
+    """Stratum of every sampled row, and the population and sample size of each stratum"""
+
+    def __init__(self, positions, stratum, population, sampled):
+        # Rows of the full dataset that were drawn, and the stratum of each
+        self.positions = positions
+        self.stratum = stratum
+        self.population = population.astype(np.float64)
+        self.sampled = sampled.astype(np.float64)
+        self.weight = self.population / self.sampled
+
+    @property
+    def rows(self):
+        return int(self.sampled.sum())
+
+    @property
+    def population_rows(self):
+        return int(self.population.sum())
+
+    def total_error(self, scaled, positions=None, cells=None, num_cells=1):
+        """
+        Half-widths of the 95% intervals of the estimated totals of a scaled
+        measure (per cell of `cells`, the group of each sample row at positions)
+        """
+        strata = self.stratum if positions is None else self.stratum[positions]
+        num_strata = len(self.population)
+        key = strata if cells is None else cells.astype(np.int64) * num_strata + strata
+        values = scaled / self.weight[strata]
+        shape = (num_cells, num_strata)
+        s1 = np.bincount(key, weights=values, minlength=num_cells * num_strata).reshape(shape)
+        s2 = np.bincount(key, weights=values * values, minlength=num_cells * num_strata).reshape(shape)
+        n, population = self.sampled, self.population
+        variance = (s2 - s1 * s1 / n) / np.maximum(n - 1, 1)
+        variance = (population * population * (1 - n / population) * variance / n).sum(axis=1)
+        return Z * np.sqrt(np.maximum(variance, 0))
+
+    def ratio_error(self, numerator, denominator, positions=None, cells=None, num_cells=1):
+        """Half-widths of the 95% intervals of sum(numerator) / sum(denominator), per cell"""
+        group = np.zeros(len(numerator), dtype=np.int64) if cells is None else cells
+        num = np.bincount(group, weights=numerator, minlength=num_cells)
+        den = np.bincount(group, weights=denominator, minlength=num_cells)
+        ratio = np.divide(num, den, out=np.zeros(num_cells), where=den != 0)
+        residual = numerator - ratio[group] * denominator
+        error = self.total_error(residual, positions, cells, num_cells)
+        return np.divide(error, np.abs(den), out=np.full(num_cells, np.nan), where=den != 0)
+
+    def header(self):
+        """X-Approximate header value"""
+        return f'sample={self.rows}/{self.population_rows}; confidence={CONFIDENCE}'
+
+    def snapshot_state(self):
+        """(metadata, {name: array}) to store the draw in a dataset snapshot"""
+        return {'target_rows': APPROX_SAMPLE_ROWS}, {'positions': self.positions, 'stratum': self.stratum,
+                      'population': self.population, 'sampled': self.sampled}
+
+
+def build_sample(dataset, target_rows=APPROX_SAMPLE_ROWS, seed=0):
+    """
+    Stratified sample of dataset as a rollup-shaped Dataset (see the module
+    docstring), with its StratifiedSample in `sampling`
+    """
+    df = dataset.df
+    key = np.zeros(len(df), dtype=np.int64)
+    for col in STRATA_COLUMNS:
+        codes, labels = dataset.group_codes(col)
+        key = key * (len(labels) + 1) + codes.astype(np.int64) + 1  # code -1 (missing) becomes 0
+    _, stratum = np.unique(key, return_inverse=True)
+    population = np.bincount(stratum)
+    sampled = np.minimum(population, np.maximum(
+        MIN_STRATUM_ROWS, np.rint(population * (target_rows / len(df))).astype(np.int64)))
+
+    # Random order within each stratum; its first n_h rows are the sample
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(df)), stratum))
+    starts = np.concatenate([[0], np.cumsum(population)[:-1]])
+    rank = np.arange(len(df)) - starts[stratum[order]]
+    positions = np.sort(order[rank < sampled[stratum[order]]])
+
+    return sample_dataset(dataset, StratifiedSample(positions, stratum[positions].astype(np.int32),
+                                                    population, sampled))
+
+
+def sample_dataset(dataset, sampling):
+    """The rollup-shaped Dataset of the rows drawn by sampling"""
+    from .dataset import Dataset
+
+    weights = sampling.weight[sampling.stratum]
+    frame = dataset.df.take(sampling.positions).reset_index(drop=True)
+    scaled = {col: frame[col].to_numpy(dtype=np.float64) * weights for col in ROLLUP_SUMS}
+    counts = frame[ROW_COUNT].to_numpy(dtype=np.float64) if ROW_COUNT in frame.columns else 1.0
+    frame = frame.assign(**scaled, **{ROW_COUNT: counts * weights})
+
+    sample = Dataset(frame, source=dataset.source, version=dataset.version).freeze()
+    sample.sampling = sampling
+    sample.rolled_up = dataset.rolled_up
+    return sample
+
+
+def sample_from_snapshot(dataset, meta, arrays):
+    """Sample Dataset of the draw stored by StratifiedSample.snapshot_state (None if drawn for another size)"""
+    if meta['target_rows'] != APPROX_SAMPLE_ROWS:
+        return None
+    return sample_dataset(dataset, StratifiedSample(arrays['positions'], arrays['stratum'],
+                                                    arrays['population'], arrays['sampled']))
+
+
+def kpi_intervals(dataset, positions):
+    """95% intervals of the approximate KPIs over the sample rows at positions (None: all)"""
+    sampling = dataset.sampling
+    df = dataset.df
+
+    def column(col):
+        values = df[col].to_numpy(dtype=np.float64)
+        return values if positions is None else values[positions]
+
+    sales, profit, units = column('Total Sales'), column('Operating Profit'), column('Units Sold')
+    margin, count = column('Operating Margin'), column(ROW_COUNT)
+    intervals = {}
+    for name, values in (('total_sales', sales), ('total_profit', profit), ('total_units', units),
+                         ('total_transactions', count)):
+        estimate = float(values.sum())
+        error = float(sampling.total_error(values, positions)[0])
+        intervals[name] = [estimate - error, estimate + error]
+    total = count.sum()
+    if total:
+        estimate = float(margin.sum() / total)
+        error = float(sampling.ratio_error(margin, count, positions)[0])
+        intervals['avg_margin'] = [estimate - error, estimate + error]
+    return intervals
+
+
+class LatencyTracker:
+    """Moving average of each route's exact-mode latency (ms), for the latency budget"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._averages = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, ms):
+        with self._lock:
+            average = self._averages.get(route)
+            self._averages[route] = ms if average is None else average + self.alpha * (ms - average)
+
+    def expected(self, route):
+        """Average exact latency of route, or None before its first exact answer"""
+        return self._averages.get(route)
@@ -0,0 +1,89 @@
+# /dashboard/slowlog.py
+
+"""
+Slow-request log.
+
+With SLOW_REQUEST_MS set, /api/* and prediction requests that take longer
+than that many milliseconds are appended to a JSON-lines file, one object
+per request. Each object holds the route, the query parameters (and the JSON
+body of prediction POSTs), the filtered row count, the per-phase timings
+(see timing.py), the status and the response size. Grouping the file by
+route and params shows which filter combinations are worth caching or
+precomputing. Params and bodies are sanitized and the file is rotated by
+the JSON-lines log shared with the ML API (see observability/logs.py).
+
+Disk use is bounded: once the file reaches SLOW_REQUEST_LOG_MB (default 10)
+it is rotated to .1, .2, ... and only SLOW_REQUEST_LOG_BACKUPS (default 3)
+old files are kept.
+"""
+
+import os
+import time
+
+from flask import current_app, g, request
+
+from observability.logs import JsonLinesLog, sanitize
+
+from .dataset import current_dataset
+from .timing import RequestTimer
+
+# Only these paths are logged
+LOGGED_PREFIXES = ('/api/', '/ml-prediction/api/')
+
+
+def record_filtered_rows(df):
+    """Remember the filtered row count of the current request for the slow log"""
+    g.filtered_rows = len(df)
+
+
+def _start_request():
+    if request.path.startswith(LOGGED_PREFIXES) and 'request_timer' not in g:
+        g.request_timer = RequestTimer()
+
+
+def _log_if_slow(response):
+    timer = g.get('request_timer')
+    if timer is None or not request.path.startswith(LOGGED_PREFIXES):
+        return response
+    total_ms = timer.total_ms()
+    if total_ms < current_app.slow_request_ms:
+        return response
+
+    record = {
+        'ts': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'method': request.method,
+        'path': request.path,
+        'route': request.url_rule.rule if request.url_rule is not None else None,
+        'params': sanitize({key: values[0] if len(values) == 1 else values
+                            for key, values in request.args.lists()}),
+        'status': response.status_code,
+        'duration_ms': round(total_ms, 2),
+        'phases_ms': {name: round(ms, 2) for name, ms in timer.phases.items()},
+        'filtered_rows': g.get('filtered_rows'),
+        'dataset_rows': len(current_dataset()),
+        'response_bytes': None if response.is_streamed else response.calculate_content_length(),
+        'pid': os.getpid(),
+    }
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            record['body'] = sanitize(body)
+    try:
+        current_app.slow_request_log.write(record)
+    except OSError as e:
+        print(f"Could not write slow request log: {e}")
+    return response
+
+
+def init_slowlog(app):
+    """Log slow /api and prediction requests if SLOW_REQUEST_MS is set"""
+    app.slow_request_ms = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+    if app.slow_request_ms <= 0:
+        return
+    app.slow_request_log = JsonLinesLog(
+        os.environ.get('SLOW_REQUEST_LOG') or os.path.join(app.instance_path, 'slow_requests.jsonl'),
+        max_bytes=int(float(os.environ.get('SLOW_REQUEST_LOG_MB', '10')) * 1024 * 1024),
+        backups=int(os.environ.get('SLOW_REQUEST_LOG_BACKUPS', '3')),
+    )
+    app.before_request(_start_request)
+    app.after_request(_log_if_slow)
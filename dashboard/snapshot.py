@@ -0,0 +1,219 @@
+# /dashboard/snapshot.py
+
+"""
+Build-time dataset snapshot.
+
+A snapshot is a single file holding the fully prepared dataset: every numeric
+column as a raw array and every dimension column as dictionary codes. It is
+read with mmap, so numeric columns are used straight from the page cache
+instead of being parsed from CSV on every cold start.
+
+The structures create_app would otherwise build at startup (time partitions,
+period cube, geography tree and the approximate-mode sample) are stored too,
+as arrays plus a little JSON metadata each. A cold start then only wraps
+them around the mapped arrays.
+
+A snapshot is current when the CSV's size and modification time match those
+recorded at build time, which needs no read of the CSV. The SHA-256 recorded
+with them is only computed when the size matches but the mtime does not (a
+copied or touched file).
+
+File layout:
+    MAGIC | format version (u32) | header length (u64) | JSON header | arrays
+Each array starts on a 64-byte boundary; the header records its dtype, length
+and offset.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from .compare import PeriodCube
+from .dataset import Dataset, decode_dimension
+from .geo import GeoTree
+from .partitions import PartitionIndex
+from .sampling import sample_from_snapshot
+
+MAGIC = b'KICKSNAP'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sIQ')
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt, stale or of another format version."""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(path):
+    """Size, modification time and SHA-256 of the source CSV, recorded at build time"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _sha256(path)}
+
+
+def is_current(fingerprint, path):
+    """Whether the file at path is the one fingerprinted (hashed only if its mtime changed)"""
+    if not fingerprint:
+        return False
+    stat = os.stat(path)
+    if stat.st_size != fingerprint.get('size'):
+        return False
+    return stat.st_mtime_ns == fingerprint.get('mtime_ns') or _sha256(path) == fingerprint.get('sha256')
+
+
+# Structures stored with the rows: Dataset attribute -> loader(dataset, metadata, arrays)
+DERIVED = {
+    'partitions': PartitionIndex.from_snapshot,
+    'period_cube': PeriodCube.from_snapshot,
+    'geo_tree': GeoTree.from_snapshot,
+    'sample': sample_from_snapshot,
+}
+
+
+def _derived_state(dataset, name):
+    """(metadata, {name: array}) of one derived structure, or None when the dataset has none"""
+    structure = getattr(dataset, name)
+    if structure is None:
+        return None
+    # The sample is a Dataset of its own; its StratifiedSample records the draw
+    return (structure.sampling if name == 'sample' else structure).snapshot_state()
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_snapshot(dataset, path, source_path=None):
+    """Serialize a Dataset to a single snapshot file (written atomically)"""
+    df = dataset.df
+    columns = []
+    arrays = []
+
+    for col in df.columns:
+        if col in dataset.codes:
+            codes, categories = dataset.codes[col]
+            columns.append({'name': col, 'kind': 'dimension', 'categories': categories.tolist()})
+            arrays.append(np.ascontiguousarray(codes))
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            columns.append({'name': col, 'kind': 'datetime'})
+            arrays.append(np.ascontiguousarray(df[col].to_numpy()))
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            columns.append({'name': col, 'kind': 'numeric'})
+            arrays.append(np.ascontiguousarray(df[col].to_numpy()))
+        else:
+            raise SnapshotError(f"Column '{col}' is not numeric, datetime or an encoded dimension")
+
+    derived = {}
+    entries = list(columns)
+    for name in DERIVED:
+        state = _derived_state(dataset, name)
+        if state is None:
+            continue
+        meta, named_arrays = state
+        derived[name] = {'meta': meta, 'arrays': []}
+        for array_name, array in named_arrays.items():
+            entry = {'name': array_name}
+            derived[name]['arrays'].append(entry)
+            entries.append(entry)
+            arrays.append(np.ascontiguousarray(array))
+
+    # Lay the arrays out after the header; the header size depends on the
+    # offsets, so compute them against a generous fixed header allowance
+    header = {
+        'format_version': FORMAT_VERSION,
+        'rows': len(df),
+        'source': source_fingerprint(source_path) if source_path else None,
+        'columns': columns,
+        'derived': derived,
+    }
+    draft = json.dumps(header).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(draft) + 4096)
+
+    offset = data_start
+    for entry, array in zip(entries, arrays):
+        entry['dtype'] = array.dtype.str
+        entry['offset'] = offset
+        entry['length'] = len(array)
+        offset = _align(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    if _PREAMBLE.size + len(header_bytes) > data_start:
+        raise SnapshotError('Snapshot header does not fit in the reserved space')
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for entry, array in zip(entries, arrays):
+            f.seek(entry['offset'])
+            f.write(array.tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(path):
+    """Read and validate only the JSON header of a snapshot"""
+    with open(path, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            raise SnapshotError(f'Snapshot truncated: {path}')
+        magic, version, header_len = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise SnapshotError(f'Not a snapshot file: {path}')
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f'Snapshot format {version} != supported format {FORMAT_VERSION}')
+        return json.loads(f.read(header_len).decode('utf-8'))
+
+
+def load_snapshot(path, source_path=None):
+    """
+    Memory-map a snapshot and rebuild the Dataset from it, with its stored
+    derived structures.
+    Numeric and date columns are zero-copy, read-only views of the mapping;
+    dimension columns are expanded from their codes. The result is already
+    frozen (see Dataset.freeze).
+    If source_path is given, the snapshot must have been built from that exact file.
+    """
+    header = read_header(path)
+    if source_path is not None and not is_current(header.get('source'), source_path):
+        raise SnapshotError(f'Snapshot {path} is stale for {source_path}')
+
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def view(entry):
+        return np.frombuffer(buffer, dtype=np.dtype(entry['dtype']), count=entry['length'], offset=entry['offset'])
+
+    data = {}
+    codes = {}
+    for column in header['columns']:
+        array = view(column)
+        name = column['name']
+        if column['kind'] == 'dimension':
+            categories = np.asarray(column['categories'], dtype=object)
+            codes[name] = (array, categories)
+            values = decode_dimension(array, categories)
+            values.flags.writeable = False
+            data[name] = values
+        else:
+            data[name] = array
+
+    df = pd.DataFrame(data, copy=False)
+    dataset = Dataset(df, codes=codes, source=path, frozen=True)
+    dataset.adopt(**{name: DERIVED[name](dataset, stored['meta'],
+                                         {entry['name']: view(entry) for entry in stored['arrays']})
+                     for name, stored in header.get('derived', {}).items()})
+    return dataset
@@ -0,0 +1,149 @@
+# /dashboard/streaming.py
+
+"""
+Out-of-core loading for datasets larger than RAM.
+
+Instead of materialising every transaction, the CSV is read in chunks
+through a generator pipeline:
+
+    iter_chunks -> rollup_frame (per chunk) -> combine_rollups
+
+Each chunk is rolled up to the grain the dashboard charts need: month,
+geography, product, retailer, channel, weekday and price. Sums are kept plus
+a 'Row Count' column, and partial rollups are periodically merged, so peak
+memory follows the number of distinct keys rather than the number of rows.
+
+The result is a frame with the same columns as the CSV, where each row stands
+for 'Row Count' transactions. Measures are additive and 'Operating Margin'
+holds the sum of margins. Routes read it through row_count, mean_margin and
+price_counts; histograms and box plots are drawn from per-price counts, so no
+route needs the raw rows back.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import ROW_COUNT
+
+# Grain of the rollup; every filter and grouping used by /api/* is derivable from it
+ROLLUP_KEYS = ['Year', 'Quarter', 'Month', 'Month_Name', 'Region', 'State', 'City',
+               'Product', 'Retailer', 'Retailer ID', 'Sales Method', 'Day_of_Week',
+               'Price per Unit']
+ROLLUP_SUMS = ['Units Sold', 'Total Sales', 'Operating Profit', 'Operating Margin']
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def is_rollup(df):
+    """True for frames produced by the streaming loader"""
+    return ROW_COUNT in df.columns
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield prepared DataFrame chunks of the CSV without reading it whole"""
+    reader = pd.read_csv(path, chunksize=chunksize,
+                         usecols=ROLLUP_KEYS + ROLLUP_SUMS + ['Invoice Date'])
+    for chunk in reader:
+        chunk['Invoice Date'] = pd.to_datetime(chunk['Invoice Date'])
+        yield chunk
+
+
+def rollup_frame(df):
+    """Roll transactions (or an existing rollup) up to ROLLUP_KEYS"""
+    weights = df[ROW_COUNT] if is_rollup(df) else pd.Series(1, index=df.index)
+    frame = df[ROLLUP_KEYS + ROLLUP_SUMS].assign(**{ROW_COUNT: weights})
+    return frame.groupby(ROLLUP_KEYS, sort=False, observed=True).sum().reset_index()
+
+
+def combine_rollups(partials, max_pending_rows=2 * DEFAULT_CHUNKSIZE):
+    """
+    Merge a stream of partial rollups into one.
+    Pending partials are re-rolled whenever they exceed max_pending_rows, so
+    memory stays bounded by the key count plus one merge buffer.
+    """
+    merged = None
+    pending = []
+    pending_rows = 0
+    for partial in partials:
+        pending.append(partial)
+        pending_rows += len(partial)
+        if pending_rows >= max_pending_rows:
+            merged = rollup_frame(pd.concat(([merged] if merged is not None else []) + pending,
+                                            ignore_index=True))
+            pending, pending_rows = [], 0
+    if pending or merged is None:
+        frames = ([merged] if merged is not None else []) + pending
+        merged = rollup_frame(pd.concat(frames, ignore_index=True)) if frames else None
+    return merged
+
+
+def finish_rollup(rollup):
+    """Add the columns the routes expect ('Invoice Date' becomes the month start)"""
+    rollup = rollup.copy()
+    rollup['Invoice Date'] = pd.to_datetime(dict(year=rollup['Year'], month=rollup['Month'], day=1))
+    rollup[ROW_COUNT] = rollup[ROW_COUNT].astype(np.int64)
+    columns = ['Retailer', 'Retailer ID', 'Invoice Date', 'Region', 'State', 'City',
+               'Product', 'Price per Unit', 'Units Sold', 'Total Sales',
+               'Operating Profit', 'Operating Margin', 'Sales Method', 'Year',
+               'Month', 'Month_Name', 'Quarter', 'Day_of_Week', ROW_COUNT]
+    return rollup[columns].sort_values(['Year', 'Month'], kind='stable').reset_index(drop=True)
+
+
+def load_rollup(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Single pass over the CSV producing the dashboard rollup"""
+    partials = (rollup_frame(chunk) for chunk in iter_chunks(path, chunksize))
+    return finish_rollup(combine_rollups(partials, max_pending_rows=2 * chunksize))
+
+
+def row_count(df):
+    """Number of transactions a (possibly rolled-up) frame represents"""
+    return int(df[ROW_COUNT].sum()) if is_rollup(df) else len(df)
+
+
+def mean_margin(df, by=None):
+    """
+    Mean Operating Margin per transaction, overall or per group of `by`.
+    Rollups hold margin sums, so the mean is sum / Row Count.
+    """
+    if by is None:
+        if not is_rollup(df):
+            return df['Operating Margin'].mean()
+        count = df[ROW_COUNT].sum()
+        return df['Operating Margin'].sum() / count if count else float('nan')
+    if not is_rollup(df):
+        return df.groupby(by)['Operating Margin'].mean()
+    sums = df.groupby(by)[['Operating Margin', ROW_COUNT]].sum()
+    return sums['Operating Margin'] / sums[ROW_COUNT]
+
+
+def price_counts(df):
+    """Transactions per distinct Price per Unit, sorted by price"""
+    if is_rollup(df):
+        return df.groupby('Price per Unit')[ROW_COUNT].sum()
+    return df['Price per Unit'].value_counts().sort_index()
+
+
+def price_stats(counts):
+    """
+    Mean, sd and quartiles/fences of the prices described by price_counts.
+    All NaN when there are no transactions, like the pandas stats of an empty frame.
+    """
+    prices = counts.index.to_numpy(dtype=float)
+    weights = counts.to_numpy(dtype=float)
+    if not len(weights) or weights.sum() <= 0:
+        return dict.fromkeys(['mean', 'sd', 'q1', 'median', 'q3', 'lowerfence', 'upperfence'], float('nan'))
+    cumulative = np.cumsum(weights) / weights.sum()
+
+    def quantile(q):
+        return float(prices[np.searchsorted(cumulative, q)])
+
+    mean = float(np.average(prices, weights=weights))
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+    return {
+        'mean': mean,
+        'sd': float(np.sqrt(np.average((prices - mean) ** 2, weights=weights))),
+        'q1': q1, 'median': median, 'q3': q3,
+        'lowerfence': float(prices[prices >= q1 - 1.5 * iqr].min()),
+        'upperfence': float(prices[prices <= q3 + 1.5 * iqr].max()),
+    }
@@ -0,0 +1,502 @@
+"""
+Regression tests for the dashboard API
+
+Runs offline against data/adidas_sales_cleaned.csv, in-process through
+Flask's test client. Apps are built per mode (full rows, or the streaming
+rollup with DATA_MODE=streaming).
+
+    python -m pytest dashboard/test_api.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def build_client(**env):
+    """Test client of an app created with the given environment variables set"""
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        from dashboard import create_app
+        app = create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return app.test_client()
+
+
+@pytest.fixture(scope='module')
+def client():
+    return build_client(DATA_SNAPSHOT='off')
+
+
+@pytest.fixture(scope='module')
+def rollup_client():
+    return build_client(DATA_MODE='streaming')
+
+
+@pytest.fixture(scope='module')
+def frame():
+    """The CSV as loaded, for pandas reference answers"""
+    from dashboard.data_loader import load_data
+    return load_data(str(PROJECT_ROOT / 'data' / 'adidas_sales_cleaned.csv'))
+
+
+def trace_values(values):
+    """Plotly trace data as a list (Plotly 6 sends numeric arrays as base64)"""
+    if isinstance(values, dict):
+        import base64
+
+        import numpy as np
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype']).tolist()
+    return values
+
+
+@pytest.mark.parametrize('query', ['year=2019', 'region=Nowhere'])
+def test_rollup_price_distribution_with_no_rows(rollup_client, client, query):
+    rollup = rollup_client.get(f'/api/price-distribution?{query}')
+    full = client.get(f'/api/price-distribution?{query}')
+    assert rollup.status_code == full.status_code == 200
+    annotation = rollup.get_json()['layout']['annotations'][0]['text']
+    assert annotation == full.get_json()['layout']['annotations'][0]['text']
+
+
+@pytest.mark.parametrize('query', ['from=2021-03-15&to=2021-03-20', 'from=2021-03-01&to=2021-03-20',
+                                   'from=2021-03-15'])
+def test_rollup_rejects_intra_month_range(rollup_client, query):
+    response = rollup_client.get(f'/api/kpis?{query}')
+    assert response.status_code == 400
+    assert 'month' in response.get_json()['error']
+
+
+def test_rollup_accepts_whole_months(rollup_client, client):
+    query = 'from=2021-03-01&to=2021-04-30'
+    rollup = rollup_client.get(f'/api/kpis?{query}')
+    assert rollup.status_code == 200
+    assert rollup.get_json()['total_transactions'] == client.get(f'/api/kpis?{query}').get_json()['total_transactions']
+
+
+@pytest.mark.parametrize('path', ['/api/transactions', '/api/export'])
+def test_rollup_rejects_row_level_routes(rollup_client, path):
+    response = rollup_client.get(path)
+    assert response.status_code == 400
+    assert response.get_json()['rollup'] is True
+
+
+def test_rollup_pivot_counts_transactions(rollup_client, client):
+    query = 'rows=region&values=sales:sum&year=2021'
+    rollup = rollup_client.get(f'/api/pivot?{query}').get_json()
+    full = client.get(f'/api/pivot?{query}').get_json()
+    assert rollup['filtered_rows'] == full['filtered_rows']
+
+
+def test_append_keeps_categories_sorted():
+    from dashboard.data_loader import load_data
+    from dashboard.dataset import Dataset
+    from dashboard.pivot import parse_values, pivot
+
+    df = load_data(str(PROJECT_ROOT / 'data' / 'adidas_sales_cleaned.csv'))
+    dataset = Dataset(df.iloc[:5000].reset_index(drop=True))
+    # Built before the append, so that it extends them
+    dataset.partitions, dataset.period_cube, dataset.date_index
+    batch = df.iloc[5000:].reset_index(drop=True)
+    batch.loc[:99, 'Region'] = 'Central'
+    appended = dataset.append(batch)
+    rebuilt = Dataset(appended.df.copy())
+
+    regions = sorted(set(df['Region']) | {'Central'})
+    assert list(appended.categories['Region']) == regions
+    table = pivot(appended, ['region'], [], parse_values('sales:sum'))
+    assert [labels[0] for labels in table['rows']['labels']] == regions
+    assert (appended.date_index.order == rebuilt.date_index.order).all()
+    central = list(appended.period_cube.labels['Region']).index('Central')
+    assert appended.period_cube.sums['count'][appended.period_cube.codes['Region'] == central].sum() == 100
+
+
+def test_crossfilter_update_on_another_worker(client):
+    # Two apps stand for two gunicorn workers, each with its own sessions
+    other = build_client(DATA_SNAPSHOT='off')
+    created = client.post('/api/crossfilter', json={'filters': {'region': ['West']}}).get_json()
+    session = created['session']
+    update = {'dimension': 'product', 'values': ["Men's Apparel"]}
+
+    assert other.post(f'/api/crossfilter/{session}', json=update).status_code == 404
+    moved = other.post(f'/api/crossfilter/{session}', json={**update, 'current': created['filters']}).get_json()
+    expected = client.post('/api/crossfilter', json={'filters': moved['filters']}).get_json()
+    assert moved['filters'] == {'region': ['West'], 'product': ["Men's Apparel"]}
+    # Incremental updates add in another order than a fresh session
+    assert moved['totals'] == pytest.approx(expected['totals'])
+    assert moved['groups']['retailer']['sales'] == pytest.approx(expected['groups']['retailer']['sales'])
+
+    # The first worker's copy missed that update: current brings it up to date first
+    update = {'dimension': 'retailer', 'values': ['Foot Locker'], 'current': moved['filters']}
+    behind = client.post(f'/api/crossfilter/{session}', json=update).get_json()
+    expected = client.post('/api/crossfilter', json={'filters': behind['filters']}).get_json()
+    assert behind['filters'] == {'region': ['West'], 'product': ["Men's Apparel"], 'retailer': ['Foot Locker']}
+    assert behind['totals'] == pytest.approx(expected['totals'])
+
+
+@pytest.mark.parametrize('query', ['period=yoy&at=-5', 'period=yoy&at=10000', 'period=qoq&at=10000-Q1',
+                                   'period=mom&at=1999-12', 'period=yoy&at=abc'])
+def test_compare_rejects_periods_without_data(client, query):
+    response = client.get(f'/api/compare?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def test_compare_accepts_periods_with_data(client):
+    assert client.get('/api/compare?period=yoy&at=2020').status_code == 200
+    assert client.get('/api/compare?period=mom&at=2021-12').status_code == 200
+
+
+def test_snapshot_keeps_derived_structures(tmp_path):
+    import shutil
+
+    from dashboard.data_loader import load_data
+    from dashboard.dataset import Dataset
+    from dashboard.snapshot import SnapshotError, load_snapshot, write_snapshot
+
+    source = tmp_path / 'sales.csv'
+    shutil.copy(PROJECT_ROOT / 'data' / 'adidas_sales_cleaned.csv', source)
+    built = Dataset(load_data(str(source))).freeze()
+    write_snapshot(built, str(tmp_path / 'sales.snapshot'), source_path=str(source))
+
+    loaded = load_snapshot(str(tmp_path / 'sales.snapshot'), source_path=str(source))
+    assert loaded._partitions is not None and loaded._geo_tree is not None and loaded._period_cube is not None
+    assert len(loaded.partitions) == len(built.partitions)
+    assert loaded.geo_tree.drilldown([]) == built.geo_tree.drilldown([])
+    assert loaded.period_cube.compare('Region', 'yoy', loaded.period_cube.latest('yoy')) == \
+        built.period_cube.compare('Region', 'yoy', built.period_cube.latest('yoy'))
+
+    with open(source, 'a') as f:
+        f.write('\n')
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(tmp_path / 'sales.snapshot'), source_path=str(source))
+
+
+def test_slow_log_redacts_credentials(tmp_path):
+    import json
+
+    log_path = tmp_path / 'slow.jsonl'
+    slow_client = build_client(DATA_SNAPSHOT='off', SLOW_REQUEST_MS='0.000001', SLOW_REQUEST_LOG=str(log_path))
+    slow_client.post('/api/crossfilter?access_token=abc', json={'filters': {}, 'password': 'secret'})
+
+    record = json.loads(log_path.read_text().splitlines()[-1])
+    assert record['params'] == {'access_token': '[redacted]'}
+    assert record['body'] == {'filters': {}, 'password': '[redacted]'}
+
+
+def test_periodic_profile_streams_export(tmp_path, client):
+    profiled = build_client(DATA_SNAPSHOT='off', PROFILE_EVERY_N='1', PROFILE_DIR=str(tmp_path))
+    response = profiled.get('/api/export?year=2021')
+    # Nothing is buffered: the profile is written once the server closes the body
+    assert not list(tmp_path.glob('*.collapsed'))
+    body = response.get_data()
+    response.close()
+
+    assert body == client.get('/api/export?year=2021').get_data()
+    assert len(list(tmp_path.glob('*.collapsed'))) == 1
+    metrics = profiled.get('/metrics')
+    assert metrics.status_code == 200
+    assert b'dashboard_http_requests_total{route="/api/export"' in metrics.get_data()
+
+
+def test_ingested_rows_reach_every_worker(tmp_path, monkeypatch):
+    import shutil
+
+    import pandas as pd
+
+    source = tmp_path / 'sales.csv'
+    shutil.copy(PROJECT_ROOT / 'data' / 'adidas_sales_cleaned.csv', source)
+    monkeypatch.setenv('ADMIN_TOKEN', 'test')
+    headers = {'X-Admin-Token': 'test'}
+    # Two apps on one CSV stand for two gunicorn workers
+    first, second = (build_client(DATA_PATH=str(source), DATA_SNAPSHOT='off', INGEST_COMPACT_ROWS='0')
+                     for _ in range(2))
+    rows = pd.read_csv(source, dtype=str).iloc[:3].to_dict('records')
+    base = first.get('/api/kpis').get_json()['total_transactions']
+
+    assert first.post('/admin/ingest', json=rows, headers=headers).status_code == 200
+    assert second.get('/api/kpis').get_json()['total_transactions'] == base + 3
+    assert second.post('/admin/ingest', json=rows[:2], headers=headers).status_code == 200
+    assert first.get('/api/kpis').get_json()['total_transactions'] == base + 5
+    assert first.application.ingestor.log_rows == second.application.ingestor.log_rows == 5
+
+    # Compacting in one worker makes the other reload the CSV instead of its log rows
+    first.post('/admin/compact', headers=headers)
+    first.application.ingestor._compacting.join()
+    second.get('/api/kpis')
+    second.application.reloader._worker.join()
+    assert second.get('/api/kpis').get_json()['total_transactions'] == base + 5
+    assert second.application.ingestor.log_offset == 0
+    assert len(pd.read_csv(source)) == base + 5
+
+    # A reload requested from one worker reaches the other
+    version = second.application.dataset.version
+    first.post('/admin/reload', headers=headers)
+    second.get('/api/kpis')
+    second.application.reloader._worker.join()
+    assert second.application.dataset.version > version
+
+
+def test_metrics_fold_shards_of_ended_threads():
+    import threading
+
+    from observability.metrics import Metrics
+
+    metrics = Metrics()
+    metrics.describe('requests_total', 'counter', 'Requests')
+    for _ in range(50):
+        # One thread per request, as under the Flask dev server
+        thread = threading.Thread(target=lambda: (metrics.inc('requests_total'),
+                                                  metrics.observe('latency_seconds', (), 0.02)))
+        thread.start()
+        thread.join()
+
+    assert len(metrics._shards) <= 1
+    rendered = metrics.render()
+    assert 'requests_total 50' in rendered
+    assert 'latency_seconds_count 50' in rendered
+
+
+FILTER_CASES = [
+    ('region=West,South', lambda df: df['Region'].isin(['West', 'South'])),
+    ('region=West&region=South&year=2021', lambda df: df['Region'].isin(['West', 'South']) & (df['Year'] == 2021)),
+    # Cuts through the first and the last selected quarter
+    ('from=2021-03-15&to=2021-08-10',
+     lambda df: (df['Invoice Date'] >= '2021-03-15') & (df['Invoice Date'] <= '2021-08-10')),
+    ("from=2020-02-10&quarter=1,2&product=Men's Apparel,Women's Apparel",
+     lambda df: (df['Invoice Date'] >= '2020-02-10') & df['Quarter'].isin([1, 2])
+     & df['Product'].isin(["Men's Apparel", "Women's Apparel"])),
+    ('to=2020-12-31&sales_method=Online&retailer=Walmart,Amazon',
+     lambda df: (df['Invoice Date'] <= '2020-12-31') & (df['Sales Method'] == 'Online')
+     & df['Retailer'].isin(['Walmart', 'Amazon'])),
+]
+
+
+@pytest.mark.parametrize('query, wanted', FILTER_CASES)
+def test_filters_match_pandas(client, frame, query, wanted):
+    expected = frame[wanted(frame)]
+    kpis = client.get(f'/api/kpis?{query}').get_json()
+    assert kpis['total_transactions'] == len(expected)
+    assert kpis['total_sales'] == pytest.approx(expected['Total Sales'].sum())
+    assert kpis['total_units'] == expected['Units Sold'].sum()
+    assert kpis['num_products'] == expected['Product'].nunique()
+    assert kpis['num_retailers'] == expected['Retailer'].nunique()
+
+    trace = client.get(f'/api/sales-by-region?{query}').get_json()['data'][0]
+    by_region = expected.groupby('Region')['Total Sales'].sum()
+    assert dict(zip(trace['x'], trace_values(trace['y']))) == pytest.approx(by_region.to_dict())
+
+
+@pytest.mark.parametrize('query', ['year=abc', 'quarter=1,x', 'from=03/01', 'from=03/01/2021', 'to=2021-13-01'])
+def test_filters_reject_malformed_values(client, query):
+    response = client.get(f'/api/kpis?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def test_pivot_matches_pandas(client, frame):
+    import numpy as np
+
+    query = 'rows=region,product&columns=year&values=sales:sum,price:mean,margin:weighted,count&retailer=Amazon'
+    table = client.get(f'/api/pivot?{query}').get_json()
+    expected = frame[frame['Retailer'] == 'Amazon']
+    grouped = expected.groupby(['Region', 'Product', 'Year'])
+    reference = {
+        'sales_sum': grouped['Total Sales'].sum(),
+        'price_mean': grouped['Price per Unit'].mean(),
+        'margin_weighted': grouped['Operating Profit'].sum() / grouped['Total Sales'].sum(),
+        'count': grouped.size(),
+    }
+    assert table['filtered_rows'] == len(expected)
+    assert [tuple(labels) for labels in table['rows']['labels']] == \
+        sorted(set(zip(expected['Region'], expected['Product'])))
+    assert [labels[0] for labels in table['columns']['labels']] == sorted(expected['Year'].unique())
+
+    pivoted = expected.pivot_table(index=['Region', 'Product'], columns='Year', values='Total Sales', aggfunc='sum')
+    # Empty cells are null, as pivot_table's NaN
+    np.testing.assert_allclose(np.array(table['values'][0]['data'], dtype=float), pivoted.to_numpy())
+    for value in table['values']:
+        for row, row_labels in zip(value['data'], table['rows']['labels']):
+            for cell, column_labels in zip(row, table['columns']['labels']):
+                key = tuple(row_labels + column_labels)
+                if key in reference[value['name']].index:
+                    assert cell == pytest.approx(reference[value['name']][key])
+                else:
+                    assert cell is None
+
+
+def test_pivot_rejects_oversized_results(client, monkeypatch):
+    import dashboard.pivot
+
+    monkeypatch.setattr(dashboard.pivot, 'MAX_RESULT_CELLS', 20)
+    response = client.get('/api/pivot?rows=state&columns=product')
+    assert response.status_code == 400
+    assert 'limit 20' in response.get_json()['error']
+
+
+def test_summary_stats_apply_filters(client, frame):
+    stats = client.get('/api/summary-stats?region=West&year=2021').get_json()
+    expected = frame[(frame['Region'] == 'West') & (frame['Year'] == 2021)]
+    by_retailer = expected.groupby('Retailer')
+    assert set(stats['By Region']) == {'West'}
+    assert set(stats['By Retailer']) == set(expected['Retailer'])
+    for retailer, row in stats['By Retailer'].items():
+        assert row['Total Sales'] == pytest.approx(by_retailer['Total Sales'].sum()[retailer])
+        assert row['Units Sold'] == by_retailer['Units Sold'].sum()[retailer]
+        assert row['Operating Margin'] == pytest.approx(by_retailer['Operating Margin'].mean()[retailer])
+
+
+@pytest.mark.parametrize('query, wanted', [
+    ('', lambda df: df['Year'] > 0),
+    # Whole months: answered from the tree's monthly slices
+    ('from=2021-03-01&to=2021-05-31&product=Men\'s Apparel',
+     lambda df: (df['Invoice Date'] >= '2021-03-01') & (df['Invoice Date'] <= '2021-05-31')
+     & (df['Product'] == "Men's Apparel")),
+    # Off month boundaries: answered from the matching rows (position_totals)
+    ('from=2020-11-17&to=2021-02-09&sales_method=Online',
+     lambda df: (df['Invoice Date'] >= '2020-11-17') & (df['Invoice Date'] <= '2021-02-09')
+     & (df['Sales Method'] == 'Online')),
+])
+def test_drilldown_matches_pandas(client, frame, query, wanted):
+    expected = frame[wanted(frame)]
+    levels = [([], 'Region', expected)]
+    region = expected['Region'].iloc[0]
+    state = expected.loc[expected['Region'] == region, 'State'].iloc[0]
+    levels.append(([region], 'State', expected[expected['Region'] == region]))
+    levels.append(([region, state], 'City', expected[(expected['Region'] == region) & (expected['State'] == state)]))
+
+    for path, column, rows in levels:
+        result = client.get(f"/api/drilldown?path={'/'.join(path)}&{query}").get_json()
+        grouped = rows.groupby(column)
+        children = {child['name']: child for child in result['children']}
+        assert set(children) == set(rows[column])
+        assert result['node']['transactions'] == len(rows)
+        for name, child in children.items():
+            assert child['sales'] == pytest.approx(grouped['Total Sales'].sum()[name])
+            assert child['profit'] == pytest.approx(grouped['Operating Profit'].sum()[name])
+            assert child['transactions'] == grouped.size()[name]
+            assert child['avg_margin'] == pytest.approx(grouped['Operating Margin'].mean()[name])
+
+
+def test_export_rows_match_filters(client, frame):
+    import io
+    import json
+
+    import pandas as pd
+
+    query = 'region=West&year=2021&from=2021-02-10'
+    expected = frame[(frame['Region'] == 'West') & (frame['Year'] == 2021) & (frame['Invoice Date'] >= '2021-02-10')]
+
+    response = client.get(f'/api/export?{query}')
+    exported = pd.read_csv(io.BytesIO(response.get_data()))
+    assert int(response.headers['X-Row-Count']) == len(exported) == len(expected)
+    assert list(exported.columns) == list(frame.columns)
+    assert set(exported['Region']) == {'West'}
+    assert exported['Total Sales'].sum() == expected['Total Sales'].sum()
+
+    response = client.get(f'/api/export?format=ndjson&columns=Retailer,Total Sales&{query}')
+    records = [json.loads(line) for line in response.get_data().splitlines()]
+    assert len(records) == len(expected)
+    assert all(list(record) == ['Retailer', 'Total Sales'] for record in records)
+    assert sum(record['Total Sales'] for record in records) == expected['Total Sales'].sum()
+
+
+def test_export_gzip(client):
+    import gzip
+
+    plain = client.get('/api/export?format=ndjson&retailer=Amazon').get_data()
+    response = client.get('/api/export?format=ndjson&retailer=Amazon&gzip=1')
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.ndjson.gz"')
+    assert gzip.decompress(response.get_data()) == plain
+
+
+def test_export_parquet_needs_pyarrow(client, monkeypatch):
+    import dashboard.api.routes
+
+    monkeypatch.setattr(dashboard.api.routes, 'PARQUET_AVAILABLE', False)
+    response = client.get('/api/export?format=parquet')
+    assert response.status_code == 501
+    assert 'pyarrow' in response.get_json()['error']
+
+
+def test_transactions_pages_cover_every_row(client, frame):
+    # Price per Unit has long runs of ties, which pages must split without repeating or dropping rows
+    key = ['Retailer', 'Invoice Date', 'City', 'Product', 'Price per Unit', 'Units Sold', 'Sales Method']
+    selected = frame[frame['Region'] == 'West'].assign(
+        **{'Invoice Date': frame['Invoice Date'].dt.strftime('%Y-%m-%d')})
+    ascending = selected.sort_values('Price per Unit', kind='stable')
+
+    for order, expected in (('asc', ascending), ('desc', ascending.iloc[::-1])):
+        served, cursor = [], None
+        while True:
+            query = f'/api/transactions?sort=price&order={order}&limit=37&region=West'
+            body = client.get(query + (f'&cursor={cursor}' if cursor else '')).get_json()
+            assert len(body['rows']) <= 37
+            served.extend(tuple(row[column] for column in key) for row in body['rows'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        assert served == list(expected[key].itertuples(index=False, name=None))
+
+
+def test_transactions_reject_tampered_cursors(client):
+    import base64
+    import json
+
+    cursor = client.get('/api/transactions?sort=price&limit=5').get_json()['next_cursor']
+    payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+    def encoded(value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+    assert client.get(f'/api/transactions?sort=price&limit=5&cursor={cursor}').status_code == 200
+    for tampered in (cursor[:-3], 'not-a-cursor', encoded(payload[:3]),
+                     encoded(payload[:3] + ['7']), encoded(payload[:2] + ['high', payload[3]]),
+                     encoded(['units'] + payload[1:])):
+        response = client.get(f'/api/transactions?sort=price&limit=5&cursor={tampered}')
+        assert response.status_code == 400, tampered
+        assert 'cursor' in response.get_json()['error'].lower()
+    # A valid cursor only continues the sort and direction it was issued for
+    assert client.get(f'/api/transactions?sort=units&limit=5&cursor={cursor}').status_code == 400
+    assert client.get(f'/api/transactions?sort=price&order=asc&limit=5&cursor={cursor}').status_code == 400
+
+
+TOP_CASES = [
+    ('by=state', ['State'], 'Total Sales', 10, None),
+    ('by=city&measure=profit&n=7&region=West', ['City'], 'Operating Profit', 7, lambda df: df['Region'] == 'West'),
+    ('by=retailer,product&measure=units&n=5&year=2021',
+     ['Retailer', 'Product'], 'Units Sold', 5, lambda df: df['Year'] == 2021),
+]
+
+
+@pytest.mark.parametrize('query,dims,column,n,keep', TOP_CASES)
+def test_top_matches_pandas(client, frame, query, dims, column, n, keep):
+    selected = frame if keep is None else frame[keep(frame)]
+    expected = selected.groupby(dims)[column].sum().nlargest(n)
+
+    body = client.get(f'/api/top?{query}').get_json()
+    assert body['total_groups'] == selected.groupby(dims).ngroups
+    measure = {'Total Sales': 'sales', 'Operating Profit': 'profit', 'Units Sold': 'units'}[column]
+    served = [(tuple(item['labels']), item[measure]) for item in body['items']]
+    assert served == [(label if isinstance(label, tuple) else (label,), float(value))
+                      for label, value in expected.items()]
+
+
+def test_top_states_sends_integer_sums(client, frame):
+    expected = frame.groupby('State')['Total Sales'].sum().nlargest(10)
+    trace = client.get('/api/top-states').get_json()['data'][0]
+    assert trace['x'] == expected.index.tolist()
+    assert trace_values(trace['y']) == expected.tolist()
+    assert all(isinstance(value, int) for row in trace['customdata'] for value in row)
@@ -0,0 +1,118 @@
+# /dashboard/timing.py
+
+"""
+Per-phase request timing.
+
+With SERVER_TIMING=1, every request gets a timer. Routes call mark(phase)
+at the end of each phase: filter, aggregate, figure and serialize for the
+chart endpoints. Each mark is charged the time since the previous one. The
+phases go out in a standard Server-Timing header, which browser devtools
+show under Timing. They are also recorded into rolling per-route, per-phase
+windows, which GET /admin/timings summarises as percentiles and histograms.
+
+When disabled no hooks are registered, and mark() is a single lookup in g.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g, request
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class RequestTimer:
+    """Phase durations of one request, in mark order"""
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.phases = {}
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def total_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+
+def mark(name):
+    """Charge the time since the previous mark to phase `name` (no-op when timing is off)"""
+    timer = g.get('request_timer')
+    if timer is not None:
+        timer.mark(name)
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class TimingStats:
+    """Rolling windows of the last `window` durations per (route, phase)"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, phases):
+        with self._lock:
+            for name, ms in phases.items():
+                samples = self._samples.get((route, name))
+                if samples is None:
+                    samples = self._samples[(route, name)] = deque(maxlen=self.window)
+                samples.append(ms)
+
+    def summary(self):
+        """{route: {phase: count, percentiles and bucket counts}}"""
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+
+        routes = {}
+        for (route, name), values in sorted(samples.items()):
+            histogram = [0] * (len(BUCKETS_MS) + 1)
+            bucket = 0
+            for ms in values:
+                while bucket < len(BUCKETS_MS) and ms > BUCKETS_MS[bucket]:
+                    bucket += 1
+                histogram[bucket] += 1
+            routes.setdefault(route, {})[name] = {
+                'count': len(values),
+                'p50_ms': round(_percentile(values, 0.50), 3),
+                'p95_ms': round(_percentile(values, 0.95), 3),
+                'p99_ms': round(_percentile(values, 0.99), 3),
+                'max_ms': round(values[-1], 3),
+                # le_ms is the bucket's upper bound (None for the overflow bucket)
+                'histogram': [{'le_ms': bound, 'count': count}
+                              for bound, count in zip(BUCKETS_MS + [None], histogram)],
+            }
+        return routes
+
+
+def _start_timer():
+    g.request_timer = RequestTimer()
+
+
+def _finish_timer(response):
+    timer = g.get('request_timer')
+    if timer is None:
+        return response
+    phases = dict(timer.phases, total=timer.total_ms())
+    response.headers['Server-Timing'] = ', '.join(
+        f'{name};dur={ms:.2f}' for name, ms in phases.items())
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    current_app.timing_stats.record(route, phases)
+    return response
+
+
+def init_timing(app):
+    """Enable per-phase timing if SERVER_TIMING is set"""
+    app.timing_stats = TimingStats(int(os.environ.get('SERVER_TIMING_WINDOW', '1000')))
+    app.timing_enabled = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes', 'on')
+    if app.timing_enabled:
+        app.before_request(_start_timer)
+        app.after_request(_finish_timer)
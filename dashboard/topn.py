@@ -0,0 +1,169 @@
+# /dashboard/topn.py
+
+"""
+Top-N rankings behind /api/top and the Top 10 States chart.
+
+Rows are grouped with np.bincount over integer group codes, as in the pivot
+engine. np.partition then finds the N-th best value in O(groups), the groups
+better than it (and the first ones equal to it, by group order) are the N
+best, and only those N are sorted and have their labels decoded. Any
+dimension or combination of dimensions can be ranked (city, state x
+product...).
+
+Unfiltered rankings over one of the dimensions kept by the incremental
+Aggregates (Product, Retailer, Region, Sales Method, State) read its group
+sums directly. Those sums are merged on every append, so ingested rows are
+ranked without a rescan.
+"""
+
+import numpy as np
+
+from .aggregates import GROUP_DIMENSIONS, MEASURES, ROW_COUNT
+from .pivot import PIVOT_DIMENSIONS
+
+# Query name -> column; margin ranks by mean margin, count by transactions
+TOPN_MEASURES = {
+    'sales': 'Total Sales',
+    'profit': 'Operating Profit',
+    'units': 'Units Sold',
+    'margin': 'Operating Margin',
+    'count': None,
+}
+DEFAULT_TOP = 10
+MAX_TOP = 1000
+# Dense bincount arrays up to this many cells (and a few per row), np.unique compaction above
+DENSE_CELLS = 1 << 22
+
+
+class TopNError(ValueError):
+    """A malformed ranking request"""
+
+
+def parse_ranking(by, measure, n):
+    """Validated (dimensions, measure, n) from the query values"""
+    dims = [dim.strip() for dim in by.split(',') if dim.strip()]
+    if not dims:
+        raise TopNError('by needs at least one dimension')
+    unknown = [dim for dim in dims if dim not in PIVOT_DIMENSIONS]
+    if unknown:
+        raise TopNError(f"Unknown dimension: {', '.join(unknown)} (expected {', '.join(PIVOT_DIMENSIONS)})")
+    if len(set(dims)) != len(dims):
+        raise TopNError(f'Repeated dimension in {by}')
+    if measure not in TOPN_MEASURES:
+        raise TopNError(f"Unknown measure: {measure} (expected {', '.join(TOPN_MEASURES)})")
+    try:
+        n = int(n)
+    except ValueError:
+        raise TopNError(f'Invalid n: {n}')
+    if not 1 <= n <= MAX_TOP:
+        raise TopNError(f'n must be between 1 and {MAX_TOP}')
+    return dims, measure, n
+
+
+def select_top(values, n, ascending=False):
+    """Indices of the n largest (smallest if ascending) values, best first; ties in index order, NaN last"""
+    keys = values if ascending else -values
+    if n < len(keys):
+        # Every value better than the n-th best is in; of those equal to it, the first by index
+        boundary = np.partition(keys, n - 1)[n - 1]
+        if np.isnan(boundary):
+            better, equal = np.flatnonzero(~np.isnan(keys)), np.flatnonzero(np.isnan(keys))
+        else:
+            better, equal = np.flatnonzero(keys < boundary), np.flatnonzero(keys == boundary)
+        candidates = np.concatenate([better, equal[:n - len(better)]])
+    else:
+        candidates = np.arange(len(keys))
+    return candidates[np.lexsort((candidates, keys[candidates]))]
+
+
+def group_sums(dataset, dims, positions=None):
+    """
+    Sums of the groups that have rows: (decode, {measure column: sums},
+    transaction counts), for the dataset's rows or those at positions.
+    decode(indices) gives the label lists of those groups only, so a ranking
+    decodes its n winners rather than every group.
+    """
+    if positions is None and len(dims) == 1 and PIVOT_DIMENSIONS[dims[0]] in GROUP_DIMENSIONS:
+        table = dataset.aggregates.groups[PIVOT_DIMENSIONS[dims[0]]]
+        table = table[table['count'] > 0]
+        index = table.index.to_numpy(dtype=object)
+        return (lambda indices: [[label] for label in index[indices].tolist()],
+                {col: table[col].to_numpy(dtype=np.float64) for col in MEASURES},
+                table['count'].to_numpy(dtype=np.float64))
+
+    length = len(dataset) if positions is None else len(positions)
+    key = np.zeros(length, dtype=np.int64)
+    labels, radices = [], []
+    for dim in dims:
+        codes, dim_labels = dataset.group_codes(PIVOT_DIMENSIONS[dim])
+        if positions is not None:
+            codes = codes[positions]
+        radix = len(dim_labels) + 1
+        key *= radix
+        key += codes.astype(np.int64) + 1  # code -1 (missing) becomes 0
+        labels.append(np.array([None] + dim_labels.tolist(), dtype=object))
+        radices.append(radix)
+
+    cells = int(np.prod(radices, dtype=object))
+    if cells <= min(DENSE_CELLS, max(4 * length, 1 << 16)):
+        group, cell_keys = key, None
+        ngroups = cells
+    else:
+        cell_keys, group = np.unique(key, return_inverse=True)
+        ngroups = len(cell_keys)
+
+    df = dataset.df
+
+    def column(col):
+        values = df[col].to_numpy(dtype=np.float64)
+        return values if positions is None else values[positions]
+
+    occupied = np.flatnonzero(np.bincount(group, minlength=ngroups))
+    counts = np.bincount(group, weights=column(ROW_COUNT) if ROW_COUNT in df.columns else None,
+                         minlength=ngroups)[occupied]
+    sums = {col: np.bincount(group, weights=column(col), minlength=ngroups)[occupied] for col in MEASURES}
+
+    occupied_keys = occupied if cell_keys is None else cell_keys[occupied]
+
+    def decode(indices):
+        """Label lists of the groups at indices, one label per dimension"""
+        keys = occupied_keys[indices]
+        columns = []
+        for dim_labels, radix in zip(reversed(labels), reversed(radices)):
+            columns.append(dim_labels[keys % radix].tolist())
+            keys = keys // radix
+        return [list(cell) for cell in zip(*reversed(columns))]
+
+    return decode, sums, counts
+
+
+def top_n(dataset, dims, measure, n, positions=None, ascending=False):
+    """The n groups of dims ranked by measure, best first, with all their measures"""
+    decode, sums, counts = group_sums(dataset, dims, positions)
+    margins = np.divide(sums['Operating Margin'], counts, out=np.full(len(counts), np.nan), where=counts > 0)
+    if measure == 'count':
+        ranked = counts
+    elif measure == 'margin':
+        ranked = margins
+    else:
+        ranked = sums[TOPN_MEASURES[measure]]
+    total = float(ranked.sum()) if measure != 'margin' else None
+    selected = select_top(ranked, n, ascending)
+    items = []
+    for i, labels in zip(selected.tolist(), decode(selected)):
+        items.append({
+            'labels': labels,
+            'sales': float(sums['Total Sales'][i]),
+            'profit': float(sums['Operating Profit'][i]),
+            'units': float(sums['Units Sold'][i]),
+            'transactions': int(round(counts[i])),
+            'avg_margin': float(margins[i]),
+            'share': float(ranked[i]) / total if total else None,
+        })
+    return {
+        'dimensions': dims,
+        'measure': measure,
+        'order': 'asc' if ascending else 'desc',
+        'total_groups': len(counts),
+        'items': items,
+    }
@@ -0,0 +1,140 @@
+# /dashboard/transactions.py
+
+"""
+Keyset pagination over individual transactions, behind /api/transactions.
+
+Each sortable column has a SortIndex: row positions ordered by the column
+(ties in row order) and the sorted values, built once per dataset version.
+A page never counts rows to skip. Its cursor holds the sort value and row
+position of the last row served, and the next page starts at the binary
+search position of that key, so a deep page costs O(log n + page size) like
+the first one.
+
+Filters are checked on the positions as the walk reaches them, a block at a
+time. A filter that keeps a fraction f of the rows therefore reads about
+page size / f rows per page.
+"""
+
+import base64
+import json
+
+import numpy as np
+
+# Query name -> column
+SORT_COLUMNS = {
+    'date': 'Invoice Date',
+    'sales': 'Total Sales',
+    'profit': 'Operating Profit',
+    'units': 'Units Sold',
+    'price': 'Price per Unit',
+    'margin': 'Operating Margin',
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
+class CursorError(ValueError):
+    """A cursor that is malformed or was issued for another sort"""
+
+
+def sort_values(column):
+    """Column values as a numeric array that orders like the column (dates as int64 ns)"""
+    values = column.to_numpy()
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').view(np.int64)
+    return values.astype(np.float64)
+
+
+def merge_sorted(order, sorted_values, values, offset):
+    """
+    (order, sorted values) with the rows of values, at positions offset and
+    on, merged in. Only the new rows are sorted; ties stay in row order.
+    """
+    batch_order = np.argsort(values, kind='stable')
+    batch_values = values[batch_order]
+    at = np.searchsorted(sorted_values, batch_values, 'right')
+    return np.insert(order, at, batch_order + offset), np.insert(sorted_values, at, batch_values)
+
+
+class SortIndex:
+    """Row positions ordered by one column, ties in row order"""
+
+    def __init__(self, order, sorted_values):
+        self.order = order
+        self.sorted_values = sorted_values
+
+    @classmethod
+    def from_values(cls, values):
+        order = np.argsort(values, kind='stable')
+        return cls(order, values[order])
+
+    def appended(self, values, offset):
+        """New SortIndex with the rows of values (at positions offset and on) merged in"""
+        return SortIndex(*merge_sorted(self.order, self.sorted_values, values, offset))
+
+    def __len__(self):
+        return len(self.order)
+
+    def rank(self, value, position, side):
+        """
+        Index in the sort order of the key (value, position): the first key
+        above it (side='right') or the key itself / the first one above (side='left')
+        """
+        lo = int(np.searchsorted(self.sorted_values, value, 'left'))
+        hi = int(np.searchsorted(self.sorted_values, value, 'right'))
+        # Equal values are in row order, so the position is a second binary search
+        return lo + int(np.searchsorted(self.order[lo:hi], position, side))
+
+    def memory_bytes(self):
+        return self.order.nbytes + self.sorted_values.nbytes
+
+
+def encode_cursor(sort, descending, value, position):
+    payload = json.dumps([sort, 'desc' if descending else 'asc', value, position], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, descending):
+    """(value, position) of a cursor issued for the same sort and direction"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, direction, value, position = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise CursorError('Invalid cursor')
+    # Dates travel as int64 nanoseconds, which a float would round
+    if not isinstance(value, (int, float)) or not isinstance(position, int):
+        raise CursorError('Invalid cursor')
+    if cursor_sort != sort or direction != ('desc' if descending else 'asc'):
+        raise CursorError(f'Cursor was issued for sort={cursor_sort}&order={direction}')
+    return value, position
+
+
+def page(index, descending, limit, after=None, matches=None, bounds=None):
+    """
+    Positions of the next `limit` rows in sort order after the key `after`
+    ((value, position) or None for the first page), keeping only positions
+    for which matches(positions) is True. bounds = [lo, hi) restricts the walk
+    to part of the sort order. Returns (positions, more rows follow).
+    """
+    lo, hi = bounds if bounds is not None else (0, len(index))
+    if after is None:
+        cursor = hi if descending else lo
+    else:
+        cursor = min(max(index.rank(*after, side='left' if descending else 'right'), lo), hi)
+    found = []
+    needed = limit + 1  # one extra row tells whether there is a next page
+    block = max(needed, 64)
+    while needed > 0 and (cursor > lo if descending else cursor < hi):
+        if descending:
+            positions = index.order[max(lo, cursor - block):cursor][::-1]
+            cursor -= len(positions)
+        else:
+            positions = index.order[cursor:min(hi, cursor + block)]
+            cursor += len(positions)
+        if matches is not None:
+            positions = positions[matches(positions)]
+        found.append(positions[:needed])
+        needed -= len(found[-1])
+        block = min(block * 2, 1 << 16)
+    positions = np.concatenate(found) if found else np.array([], dtype=np.int64)
+    return positions[:limit], len(positions) > limit
@@ -0,0 +1,39 @@
+# /gunicorn.conf.py
+
+"""
+Production gunicorn settings for the dashboard.
+
+    gunicorn -c gunicorn.conf.py run:app
+
+The app (and with it the dataset) is loaded once in the master and shared
+with the forked workers. The dataset is frozen into read-only arrays in
+create_app, and gc.freeze() below keeps the garbage collector from touching
+the preloaded objects. Together these stop copy-on-write from giving each
+worker its own copy of the data.
+"""
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from observability.memory import process_memory, format_memory
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '4'))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+preload_app = True
+timeout = 60
+
+
+def when_ready(server):
+    """Master is up with the app preloaded: freeze everything allocated so far"""
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Master memory after preload: {format_memory(process_memory())}")
+
+
+def post_worker_init(worker):
+    """Report each worker's memory once it is ready to serve"""
+    worker.log.info(f"Worker memory at startup: {format_memory(process_memory())}")
@@ -5,12 +5,15 @@ Deploy this separately on Render, Railway, or Heroku
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import os
 import sys
 from pathlib import Path
 
 # Add predictions module to path
 predictions_path = Path(__file__).parent.parent / "predictions"
 sys.path.insert(0, str(predictions_path))
+# Project root, for the observability package shared with the dashboard
+sys.path.append(str(Path(__file__).parent.parent))
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin requests from Vercel
@@ -23,6 +26,22 @@ except ImportError:
     MODELS_AVAILABLE = False
     predictor = None
 
+# Prometheus metrics on /metrics (METRICS=off to disable)
+from metrics import init_metrics, record_prediction, time_inference
+init_metrics(app, model_loaded=lambda: MODELS_AVAILABLE)
+
+# Slow /api requests to a JSON-lines log (SLOW_REQUEST_MS to enable)
+from slowlog import init_slowlog
+init_slowlog(app)
+
+# Sanitized request traces for benchmarks/replay.py (TRACE_LOG to enable)
+from observability.recorder import init_recorder
+init_recorder(app, 'ml_api')
+
+# Per-request profiling behind PROFILE_SECRET, or every PROFILE_EVERY_N requests
+from observability.profiling import init_profiling
+init_profiling(app, os.path.join(os.path.dirname(__file__), 'profiles'))
+
 @app.route('/')
 def home():
     """Health check endpoint"""
@@ -82,15 +101,17 @@ def predict():
                 return jsonify({'error': f'Missing required field: {field}'}), 400
 
         # Make prediction
-        result = predictor.predict_demand(
-            retailer=data['retailer'],
-            region=data['region'],
-            product=data['product'],
-            sales_method=data['sales_method'],
-            price_per_unit=float(data['price_per_unit']),
-            month=int(data['month']),
-            quarter=int(data['quarter'])
-        )
+        with time_inference():
+            result = predictor.predict_demand(
+                retailer=data['retailer'],
+                region=data['region'],
+                product=data['product'],
+                sales_method=data['sales_method'],
+                price_per_unit=float(data['price_per_unit']),
+                month=int(data['month']),
+                quarter=int(data['quarter'])
+            )
+        record_prediction('error' if 'error' in result else 'ok')
 
         return jsonify(result)
 
@@ -0,0 +1,61 @@
+"""
+Prometheus metrics for the ML API (GET /metrics, text format 0.0.4).
+
+Requests are counted and timed by the thread-sharded collector shared with
+the dashboard (see observability/metrics.py). This module adds model
+inference latency and prediction outcomes.
+
+Set METRICS=off to disable collection and the endpoint.
+"""
+
+import os
+import time
+
+from flask import g
+
+from observability.memory import process_memory
+from observability.metrics import Metrics, instrument_app
+
+
+metrics = Metrics()
+ENABLED = os.environ.get('METRICS', '').lower() not in ('0', 'off', 'false', 'no')
+
+metrics.describe('ml_api_inference_duration_seconds', 'histogram', 'Model inference latency')
+metrics.describe('ml_api_predictions_total', 'counter', 'Predictions by outcome (ok, error)')
+metrics.describe('ml_api_model_loaded', 'gauge', '1 if the units model is loaded')
+metrics.describe('process_resident_memory_bytes', 'gauge', 'Resident set size')
+
+
+class time_inference:
+    """Context manager timing one model inference (also kept in g.inference_ms for the slow log)"""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        g.inference_ms = elapsed * 1000
+        if ENABLED:
+            metrics.observe('ml_api_inference_duration_seconds', (), elapsed)
+        return False
+
+
+def record_prediction(outcome):
+    if ENABLED:
+        metrics.inc('ml_api_predictions_total', (('outcome', outcome),))
+
+
+def init_metrics(app, model_loaded):
+    """Register the request hooks and GET /metrics unless METRICS=off"""
+    if not ENABLED:
+        return
+
+    @metrics.collector
+    def collect_process():
+        return [
+            ('ml_api_model_loaded', (), int(bool(model_loaded()))),
+            ('process_resident_memory_bytes', (), process_memory()['rss']),
+        ]
+
+    instrument_app(app, metrics, 'ml_api')
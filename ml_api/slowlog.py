@@ -0,0 +1,72 @@
+"""
+Slow-request log for the ML API.
+
+Same JSON-lines format as dashboard/slowlog.py, written through the log
+shared by both services (see observability/logs.py). With SLOW_REQUEST_MS
+set, /api/* requests slower than that are logged with their query
+parameters, the JSON body of predictions, the model inference time and the
+response size. Credential-like keys are redacted.
+
+SLOW_REQUEST_LOG (default ml_api/slow_requests.jsonl), SLOW_REQUEST_LOG_MB
+(default 10) and SLOW_REQUEST_LOG_BACKUPS (default 3) bound the disk use.
+"""
+
+import os
+import time
+
+from flask import g, request
+
+from observability.logs import JsonLinesLog, sanitize
+
+LOGGED_PREFIXES = ('/api/',)
+
+
+def init_slowlog(app):
+    """Log slow /api requests if SLOW_REQUEST_MS is set"""
+    threshold_ms = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+    if threshold_ms <= 0:
+        return
+    log = JsonLinesLog(
+        os.environ.get('SLOW_REQUEST_LOG') or os.path.join(os.path.dirname(__file__), 'slow_requests.jsonl'),
+        max_bytes=int(float(os.environ.get('SLOW_REQUEST_LOG_MB', '10')) * 1024 * 1024),
+        backups=int(os.environ.get('SLOW_REQUEST_LOG_BACKUPS', '3')),
+    )
+
+    @app.before_request
+    def start_request():
+        g.slowlog_started = time.perf_counter()
+
+    @app.after_request
+    def log_if_slow(response):
+        started = g.get('slowlog_started')
+        if started is None or not request.path.startswith(LOGGED_PREFIXES):
+            return response
+        total_ms = (time.perf_counter() - started) * 1000
+        if total_ms < threshold_ms:
+            return response
+
+        phases = {}
+        if g.get('inference_ms') is not None:
+            phases['inference'] = round(g.inference_ms, 2)
+        record = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule is not None else None,
+            'params': sanitize({key: values[0] if len(values) == 1 else values
+                                for key, values in request.args.lists()}),
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 2),
+            'phases_ms': phases,
+            'response_bytes': None if response.is_streamed else response.calculate_content_length(),
+            'pid': os.getpid(),
+        }
+        if request.method == 'POST':
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                record['body'] = sanitize(body)
+        try:
+            log.write(record)
+        except OSError as e:
+            print(f"Could not write slow request log: {e}")
+        return response
@@ -1,95 +1,350 @@
 """
-Test script for ML API
-Run this to verify the API works before deploying
+Contract and load tests for the ML API
+
+Runs fully offline. A model is trained from data/adidas_sales_cleaned.csv
+into a temporary directory (MODEL_DIR), and the API is served in-process on
+an ephemeral port, so no deployed service or committed model is needed.
+
+    python -m pytest ml_api/test_api.py     # contracts plus a short load sweep
+    python ml_api/test_api.py               # full 1-64 client sweep, compared with baseline_load.json
+    python ml_api/test_api.py --save        # record a new baseline
+
+The sweep sends /api/predict requests from N concurrent keep-alive clients
+and reports requests/sec and p50/p95/p99 latency per client count. The
+baseline is machine-specific: re-record it on the machine that runs the
+comparison before judging a predictor.py change.
 """
 
-import requests
+import argparse
+import contextlib
+import http.client
+import io
 import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ML_API_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = ML_API_DIR.parent
+DATA_FILE = PROJECT_ROOT / "data" / "adidas_sales_cleaned.csv"
+BASELINE_PATH = ML_API_DIR / "baseline_load.json"
+
+CLIENT_COUNTS = [1, 2, 4, 8, 16, 32, 64]
+# Throughput drop (fraction of the baseline) reported as a regression
+DEFAULT_THRESHOLD = 0.25
+
+SAMPLE_REQUEST = {
+    "retailer": "Foot Locker",
+    "region": "West",
+    "product": "Men's Street Footwear",
+    "sales_method": "In-store",
+    "price_per_unit": 50.0,
+    "month": 6,
+    "quarter": 2
+}
+
+# Every successful prediction carries these numeric fields
+PREDICTION_NUMBERS = ['predicted_units', 'predicted_sales', 'price_per_unit',
+                      'units_lower', 'units_upper', 'units_margin',
+                      'sales_lower', 'sales_upper', 'sales_margin', 'confidence_score',
+                      'units_r2', 'units_mae', 'revenue_r2', 'revenue_mae']
+
+
+def train_fixture_model(model_dir, data_file=DATA_FILE):
+    """Train the units predictor into model_dir with train_models.py (output silenced)"""
+    sys.path.insert(0, str(PROJECT_ROOT / "predictions"))
+    import pandas as pd
+    import train_models
+
+    df = pd.read_csv(data_file)
+    df['Invoice Date'] = pd.to_datetime(df['Invoice Date'])
+    train_models.MODEL_DIR = Path(model_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = train_models.train_units_predictor(df)
+        train_models.save_metadata(df, model)
+
+
+def load_app(model_dir):
+    """Import ml_api/app.py with the predictor reading model_dir"""
+    os.environ['MODEL_DIR'] = str(model_dir)
+    sys.path.insert(0, str(ML_API_DIR))
+    # The predictor singleton reads MODEL_DIR on import; drop one imported by another test module
+    sys.modules.pop('predictor', None)
+    import app as app_module
+    assert app_module.MODELS_AVAILABLE, f"no model loaded from {model_dir}"
+    return app_module.app
+
+
+class ApiServer:
+    """Serve a WSGI app on an ephemeral localhost port from a background thread"""
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class KeepAliveHandler(WSGIRequestHandler):
+            protocol_version = 'HTTP/1.1'
 
-# Change this to your deployed URL after deployment
-# For local testing: http://localhost:5000
-API_URL = "http://localhost:5000"
-
-def test_health():
-    """Test health endpoint"""
-    print("\n=== Testing Health Endpoint ===")
-    response = requests.get(f"{API_URL}/health")
-    print(f"Status Code: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
-
-def test_metadata():
-    """Test metadata endpoint"""
-    print("\n=== Testing Metadata Endpoint ===")
-    response = requests.get(f"{API_URL}/api/metadata")
-    print(f"Status Code: {response.status_code}")
-    data = response.json()
-    print(f"Retailers: {data.get('retailers', [])[:3]}...")  # Show first 3
-    print(f"Regions: {data.get('regions', [])}")
-    print(f"Products: {data.get('products', [])[:3]}...")
-
-def test_metrics():
-    """Test metrics endpoint"""
-    print("\n=== Testing Metrics Endpoint ===")
-    response = requests.get(f"{API_URL}/api/metrics")
-    print(f"Status Code: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
-
-def test_prediction():
-    """Test prediction endpoint"""
-    print("\n=== Testing Prediction Endpoint ===")
-
-    test_data = {
-        "retailer": "Foot Locker",
-        "region": "West",
-        "product": "Men's Street Footwear",
-        "sales_method": "In-store",
-        "price_per_unit": 50.0,
-        "month": 6,
-        "quarter": 2
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.thread.join()
+        return False
+
+    def connection(self):
+        return http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+
+    def request(self, method, path, body=None):
+        """(status, parsed JSON) for one request on a fresh connection"""
+        conn = self.connection()
+        try:
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+
+def run_clients(server, clients, duration):
+    """Requests/sec and latency percentiles of `clients` concurrent predict loops"""
+    body = json.dumps(SAMPLE_REQUEST)
+    headers = {'Content-Type': 'application/json'}
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    barrier = threading.Barrier(clients + 1)
+
+    def client(index):
+        conn = server.connection()
+        barrier.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('POST', '/api/predict', body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[index] += 1
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                conn.close()
+                conn = server.connection()
+            latencies[index].append(time.perf_counter() - start)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_ms = np.concatenate([np.array(values) for values in latencies]) * 1000
+    p50, p95, p99 = np.percentile(all_ms, [50, 95, 99])
+    return {
+        'clients': clients,
+        'requests': len(all_ms),
+        'errors': sum(errors),
+        'rps': round(len(all_ms) / elapsed, 1),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
     }
 
-    print(f"Input: {json.dumps(test_data, indent=2)}")
-
-    response = requests.post(
-        f"{API_URL}/api/predict",
-        json=test_data
-    )
-
-    print(f"Status Code: {response.status_code}")
-    result = response.json()
-
-    if response.status_code == 200:
-        print("\n✅ Prediction Successful!")
-        print(f"Predicted Units: {result.get('predicted_units', 0):.0f}")
-        print(f"Predicted Revenue: ${result.get('predicted_sales', 0):,.2f}")
-        print(f"Confidence Score: {result.get('confidence_score', 0):.1f}%")
-        print(f"Confidence Level: {result.get('confidence_level', 'Unknown')}")
-        print(f"\nUnits Range: {result.get('units_lower', 0):.0f} - {result.get('units_upper', 0):.0f}")
-        print(f"Revenue Range: ${result.get('sales_lower', 0):,.2f} - ${result.get('sales_upper', 0):,.2f}")
-    else:
-        print(f"\n❌ Prediction Failed!")
-        print(f"Error: {result.get('error', 'Unknown error')}")
-
-if __name__ == "__main__":
-    print("=" * 60)
-    print("ML API Test Suite")
-    print("=" * 60)
-
-    try:
-        test_health()
-        test_metadata()
-        test_metrics()
-        test_prediction()
-
-        print("\n" + "=" * 60)
-        print("✅ All tests completed!")
-        print("=" * 60)
-
-    except requests.exceptions.ConnectionError:
-        print("\n❌ Error: Could not connect to API")
-        print(f"Make sure the API is running at {API_URL}")
-        print("\nTo start the API locally:")
-        print("  cd ml_api")
-        print("  python app.py")
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
+
+def sweep(server, client_counts, duration):
+    for _ in range(20):
+        server.request('POST', '/api/predict', SAMPLE_REQUEST)
+    return [run_clients(server, clients, duration) for clients in client_counts]
+
+
+def print_sweep(results):
+    print(f"{'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for r in results:
+        print(f"{r['clients']:>8} {r['rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['errors']:>7}")
+
+
+def find_regressions(baseline, results, threshold):
+    """Client counts whose throughput fell more than `threshold` below the baseline"""
+    previous = {r['clients']: r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        old = previous.get(r['clients'])
+        if old and r['rps'] < old['rps'] * (1 - threshold):
+            regressions.append(f"{r['clients']} clients: {r['rps']:.1f} req/s vs {old['rps']:.1f} baseline")
+    return regressions
+
+
+# --- pytest ---
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    model_dir = tmp_path_factory.mktemp('models')
+    train_fixture_model(model_dir)
+    with ApiServer(load_app(model_dir)) as api:
+        yield api
+
+
+def test_health_contract(server):
+    status, body = server.request('GET', '/health')
+    assert status == 200
+    assert body == {'status': 'healthy', 'models': 'loaded'}
+
+
+def test_metadata_contract(server):
+    status, body = server.request('GET', '/api/metadata')
+    assert status == 200
+    for key in ['retailers', 'regions', 'products', 'sales_methods']:
+        assert isinstance(body[key], list) and body[key]
+        assert body[key] == sorted(body[key])
+    assert len(body['months']) == 12
+    assert body['quarters'] == [1, 2, 3, 4]
+    assert 0 < body['min_price'] <= body['max_price']
+
+
+def test_metrics_contract(server):
+    status, body = server.request('GET', '/api/metrics')
+    assert status == 200
+    for key in ['units_mae', 'units_rmse', 'units_r2', 'revenue_mae', 'revenue_rmse', 'revenue_r2']:
+        assert isinstance(body[key], (int, float))
+    assert body['units_mae'] >= 0 and body['revenue_mae'] >= 0
+
+
+def test_predict_contract(server):
+    status, body = server.request('POST', '/api/predict', SAMPLE_REQUEST)
+    assert status == 200
+    for key in PREDICTION_NUMBERS:
+        assert isinstance(body[key], (int, float)), key
+    assert body['model_type'] in ('LinearRegression', 'RandomForest')
+    assert body['confidence_level'] in ('High', 'Medium', 'Low')
+    assert 0 <= body['confidence_score'] <= 100
+    assert 0 <= body['units_lower'] <= body['predicted_units'] <= body['units_upper']
+    assert body['predicted_sales'] == pytest.approx(body['predicted_units'] * SAMPLE_REQUEST['price_per_unit'])
+
+
+def test_predict_is_deterministic(server):
+    first = server.request('POST', '/api/predict', SAMPLE_REQUEST)[1]
+    second = server.request('POST', '/api/predict', SAMPLE_REQUEST)[1]
+    assert first == second
+
+
+@pytest.mark.parametrize('field', list(SAMPLE_REQUEST))
+def test_predict_requires_every_field(server, field):
+    data = {key: value for key, value in SAMPLE_REQUEST.items() if key != field}
+    status, body = server.request('POST', '/api/predict', data)
+    assert status == 400
+    assert body['error'] == f'Missing required field: {field}'
+
+
+def test_predict_rejects_invalid_numbers(server):
+    status, body = server.request('POST', '/api/predict', dict(SAMPLE_REQUEST, price_per_unit='abc'))
+    assert status == 400
+    assert body['error'].startswith('Invalid input')
+
+
+def test_predict_reports_unknown_category(server):
+    status, body = server.request('POST', '/api/predict', dict(SAMPLE_REQUEST, retailer='No Such Retailer'))
+    assert 'error' in body
+    assert 'predicted_units' not in body
+
+
+def test_slow_log_redacts_credentials(tmp_path, monkeypatch):
+    from flask import Flask
+    sys.path.insert(0, str(ML_API_DIR))
+    sys.path.append(str(PROJECT_ROOT))
+    from slowlog import init_slowlog
+
+    log_path = tmp_path / 'slow.jsonl'
+    monkeypatch.setenv('SLOW_REQUEST_MS', '0.000001')
+    monkeypatch.setenv('SLOW_REQUEST_LOG', str(log_path))
+    app = Flask(__name__)
+    app.add_url_rule('/api/predict', 'predict', lambda: {}, methods=['POST'])
+    init_slowlog(app)
+    app.test_client().post('/api/predict?api_key=abc', json=dict(SAMPLE_REQUEST, token='secret'))
+
+    record = json.loads(log_path.read_text().splitlines()[-1])
+    assert record['params'] == {'api_key': '[redacted]'}
+    assert record['body']['token'] == '[redacted]'
+    assert record['body']['retailer'] == SAMPLE_REQUEST['retailer']
+
+
+def test_load_sweep(server):
+    """Short sweep up to 64 clients: every request must succeed"""
+    duration = float(os.environ.get('LOAD_TEST_SECONDS', '0.5'))
+    results = sweep(server, [1, 8, 64], duration)
+    print_sweep(results)
+    for r in results:
+        assert r['errors'] == 0
+        assert r['requests'] >= r['clients']
+
+
+# --- script ---
+
+def main():
+    parser = argparse.ArgumentParser(description='ML API load sweep against an in-process server')
+    parser.add_argument('--clients', type=int, nargs='+', default=CLIENT_COUNTS, help='Client counts to sweep')
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per client count')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Throughput drop that counts as a regression (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        print("Training fixture model...")
+        train_fixture_model(model_dir)
+        with ApiServer(load_app(model_dir)) as api:
+            results = sweep(api, args.clients, args.duration)
+    print_sweep(results)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'meta': {
+                    'duration_seconds': args.duration,
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'cpus': os.cpu_count(),
+                },
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+        print(f"\n[OK] Baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save to record one")
+        return 0
+    with open(args.baseline) as f:
+        regressions = find_regressions(json.load(f), results, args.threshold)
+    if regressions:
+        print("\n[REGRESSION] Throughput below baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\n[OK] Throughput within baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,9 @@
+# /observability/__init__.py
+
+"""
+Request metrics, profiling, traffic traces, JSON-lines logs and process
+memory shared by the dashboard and the ML API.
+
+Both services import this package from the project root. The ML API adds
+the root to sys.path, as it does for predictions/.
+"""
@@ -0,0 +1,64 @@
+# /observability/logs.py
+
+"""
+JSON-lines logs shared by both services (slow-request log, traffic traces).
+
+Records are sanitized before they are written: query parameters and JSON
+keys that look like credentials are replaced by "[redacted]". Files are
+rotated by size, to .1, .2, ... with a bounded number of old files kept.
+"""
+
+import json
+import os
+import re
+import threading
+
+# Query and JSON keys that look like credentials
+SENSITIVE_KEY = re.compile(r'token|secret|passw|key|auth|session|cookie|credential', re.IGNORECASE)
+REDACTED = '[redacted]'
+
+
+def sanitize(value):
+    """Copy of a JSON value with credential-like keys redacted"""
+    if isinstance(value, dict):
+        return {key: REDACTED if SENSITIVE_KEY.search(str(key)) else sanitize(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+class JsonLinesLog:
+    """Append-only JSON-lines file with size-based rotation"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            if size and size + len(line) > self.max_bytes:
+                self._rotate()
+            # O_APPEND keeps lines from several workers whole
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        os.replace(self.path, f'{self.path}.1')
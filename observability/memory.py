@@ -0,0 +1,61 @@
+# /observability/memory.py
+
+"""
+Process memory of either service.
+
+RSS alone double-counts pages shared between forked workers, so on Linux this
+also reads PSS (proportional share) and the shared/private split from
+/proc/self/smaps_rollup. Elsewhere it falls back to peak RSS from getrusage.
+"""
+
+import os
+import sys
+
+
+def _read_kb_fields(path, fields):
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in fields:
+                    values[fields[key]] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return values
+
+
+def process_memory():
+    """
+    Current process memory in bytes
+    Returns a dict with rss and, where available, pss/shared/private
+    """
+    memory = _read_kb_fields('/proc/self/smaps_rollup', {
+        'Rss': 'rss',
+        'Pss': 'pss',
+        'Shared_Clean': 'shared_clean',
+        'Shared_Dirty': 'shared_dirty',
+        'Private_Clean': 'private_clean',
+        'Private_Dirty': 'private_dirty',
+    })
+    if 'rss' not in memory:
+        memory.update(_read_kb_fields('/proc/self/status', {'VmRSS': 'rss'}))
+    if 'rss' not in memory:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is bytes on macOS and kilobytes on Linux
+            memory['rss'] = peak if sys.platform == 'darwin' else peak * 1024
+        except ImportError:
+            memory['rss'] = 0
+    if 'shared_clean' in memory:
+        memory['shared'] = memory.pop('shared_clean') + memory.pop('shared_dirty', 0)
+        memory['private'] = memory.pop('private_clean', 0) + memory.pop('private_dirty', 0)
+    return memory
+
+
+def format_memory(memory):
+    """One-line human readable summary of process_memory()"""
+    parts = [f"{key.upper()}={value / (1024 * 1024):.1f}MB"
+             for key, value in memory.items()]
+    return f"pid={os.getpid()} " + ' '.join(parts)
@@ -0,0 +1,191 @@
+# /observability/metrics.py
+
+"""
+Prometheus metrics collector (text format 0.0.4) used by both services.
+
+Counters and histograms are sharded per thread. A request thread only
+updates its own dicts, so the hot path takes no lock. The lock is only taken
+when a thread records its first sample, when it ends and when /metrics sums
+the shards. A thread's shard is folded into a shared total when the thread
+ends, so servers that start a thread per request (the Flask dev server)
+keep one shard per live thread.
+Gauges are read at scrape time from the collectors each service registers.
+"""
+
+import bisect
+import threading
+import time
+import weakref
+
+from flask import g, request
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _add_shard(counters, histograms, shard):
+    """Add a (counters, histograms) shard into the given dicts"""
+    shard_counters, shard_histograms = shard
+    # dict.copy() is atomic under the GIL, so owners can keep writing
+    for key, value in shard_counters.copy().items():
+        counters[key] = counters.get(key, 0) + value
+    for key, state in shard_histograms.copy().items():
+        merged = histograms.setdefault(key, [0] * len(state))
+        for i, value in enumerate(list(state)):
+            merged[i] += value
+
+
+class _ShardOwner:
+    """Kept in a thread's local storage only: freed, and so finalized, when the thread ends"""
+
+    __slots__ = ('__weakref__',)
+
+
+class Metrics:
+    """Thread-sharded counters and histograms plus scrape-time gauges"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        # Shards of the live threads by id, and the sums of the ended ones
+        self._shards = {}
+        self._retired = ({}, {})
+        # Reentrant: a shard can be finalized by the garbage collector while this thread holds it
+        self._lock = threading.RLock()
+        self._meta = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        """Declare a metric's type (counter, gauge, histogram) and help text"""
+        self._meta[name] = (kind, help_text)
+
+    def collector(self, func):
+        """Register func() -> [(name, labels, value)], called on every scrape"""
+        self._collectors.append(func)
+        return func
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            finalizer = weakref.finalize(owner, self._retire, shard)
+            finalizer.atexit = False
+        return shard
+
+    def _retire(self, shard):
+        """Fold the shard of an ended thread into the retired sums"""
+        with self._lock:
+            self._shards.pop(id(shard), None)
+            _add_shard(*self._retired, shard)
+
+    def inc(self, name, labels=(), value=1):
+        """Add value to a counter (negative values for gauges tracked as counts)"""
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """Record one histogram sample"""
+        histograms = self._shard()[1]
+        key = (name, labels)
+        state = histograms.get(key)
+        if state is None:
+            # One count per bucket, the +Inf bucket, then the sum
+            state = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _merged(self):
+        counters, histograms = {}, {}
+        with self._lock:
+            shards = list(self._shards.values())
+            _add_shard(counters, histograms, self._retired)
+        for shard in shards:
+            _add_shard(counters, histograms, shard)
+        return counters, histograms
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        counters, histograms = self._merged()
+        samples = {}
+        for (name, labels), value in sorted(counters.items()):
+            samples.setdefault(name, []).append((name, labels, value))
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), state in sorted(histograms.items()):
+            series = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                series.append((f'{name}_bucket', labels + (('le', _format_value(float(bound))),), cumulative))
+            series.append((f'{name}_sum', labels, state[-1]))
+            series.append((f'{name}_count', labels, cumulative))
+
+        lines = []
+        for name in sorted(samples):
+            kind, help_text = self._meta.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample_name, labels, value in samples[name]:
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_app(app, metrics, prefix):
+    """
+    Record app's requests as <prefix>_http_requests_total, _request_duration_seconds
+    and _requests_in_flight, and serve everything in metrics at GET /metrics
+    """
+    in_flight = f'{prefix}_http_requests_in_flight'
+    metrics.describe(f'{prefix}_http_requests_total', 'counter', 'Requests by route, method and status')
+    metrics.describe(f'{prefix}_http_request_duration_seconds', 'histogram', 'Request latency by route')
+    metrics.describe(in_flight, 'gauge', 'Requests being handled')
+    # Seed the in-flight gauge so it is exported before the first request
+    metrics.inc(in_flight, value=0)
+
+    def start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics_in_flight = True
+        metrics.inc(in_flight)
+
+    def record_request(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            metrics.inc(f'{prefix}_http_requests_total',
+                        (('route', route), ('method', request.method), ('status', str(response.status_code))))
+            metrics.observe(f'{prefix}_http_request_duration_seconds', (('route', route),),
+                            time.perf_counter() - started)
+        return response
+
+    def end_request(exc):
+        if g.pop('metrics_in_flight', False):
+            metrics.inc(in_flight, value=-1)
+
+    def metrics_endpoint():
+        return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.before_request(start_request)
+    app.after_request(record_request)
+    app.teardown_request(end_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
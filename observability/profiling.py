@@ -0,0 +1,255 @@
+# /observability/profiling.py
+
+"""
+On-demand and periodic request profiling (stdlib only), used by both services.
+
+On demand: with PROFILE_SECRET set, a request that carries
+    X-Profile-Token: <secret>
+    X-Profile: sample | cprofile
+is run under a profiler, and the profile is returned instead of the normal
+response. The original status is kept in X-Profile-Status.
+- sample: a sampling profiler (one stack every PROFILE_INTERVAL_MS). Returns
+  collapsed stacks that flamegraph.pl, speedscope or inferno read directly.
+  The sampler thread needs the GIL, so the effective rate is bounded by the
+  interpreter switch interval (5 ms). Use cprofile for short requests.
+- cprofile: deterministic cProfile. Returns a pstats table sorted by
+  cumulative time.
+Profiled requests send Cache-Control: no-cache, so they never hit the
+response cache.
+
+Periodic: PROFILE_EVERY_N=N samples every Nth request into PROFILE_DIR
+(default: the directory each service passes to init_profiling). Only the
+newest PROFILE_KEEP files (default 200) are kept. The response is not held
+back: its body is passed through chunk by chunk (streamed exports included)
+and the profile is written when the server closes it.
+
+Profiling wraps the WSGI app, so it covers every hook, the view and the
+response body. On-demand profiles run the body to completion but drop its
+chunks instead of keeping them in memory.
+"""
+
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id, interval, stop_codes=()):
+        self.thread_id = thread_id
+        self.interval = interval
+        # Frames at and above these code objects (the server) are left out
+        self.stop_codes = set(stop_codes)
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _stack(self, frame):
+        """Frames below a stop code, root first (None when the thread is outside the request)"""
+        stack = []
+        while frame is not None and frame.f_code not in self.stop_codes:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        if frame is None and self.stop_codes:
+            # The server between two body chunks, not the request
+            return None
+        return tuple(reversed(stack))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = self._stack(frame)
+            if stack is None:
+                continue
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def collapsed(self):
+        """'root;...;leaf count' lines, heaviest first"""
+        lines = [f"{';'.join(stack)} {count}"
+                 for stack, count in sorted(self.counts.items(), key=lambda item: -item[1]) if stack]
+        return '\n'.join(lines) + '\n'
+
+
+class ProfiledBody:
+    """
+    Response iterable handing the body's chunks to the server as they come;
+    closing it stops the sampler and calls finish()
+    """
+
+    def __init__(self, body, sampler, finish):
+        self.body = body
+        self.sampler = sampler
+        self.finish = finish
+        self._closed = False
+
+    def __iter__(self):
+        yield from self.body
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.sampler.stop()
+            self.finish()
+
+
+def _slug(path):
+    return re.sub(r'[^A-Za-z0-9]+', '-', path).strip('-')[:60] or 'root'
+
+
+class ProfilingMiddleware:
+    """WSGI middleware running selected requests under a profiler"""
+
+    def __init__(self, wsgi_app, secret=None, every_n=0, directory=None, keep=200, interval=0.001):
+        self.wsgi_app = wsgi_app
+        self.secret = secret
+        self.every_n = every_n
+        self.directory = directory
+        self.keep = keep
+        self.interval = interval
+        self._requests = itertools.count(1)
+        self._rotate_lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        mode = environ.get('HTTP_X_PROFILE', '').lower()
+        if mode and self.secret:
+            token = environ.get('HTTP_X_PROFILE_TOKEN', '')
+            if hmac.compare_digest(token.encode(), self.secret.encode()) and mode in PROFILE_MODES:
+                return self._on_demand(mode, environ, start_response)
+        if self.every_n and next(self._requests) % self.every_n == 0:
+            return self._periodic(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+    def _profiled(self, environ, profiler):
+        """Run the request to completion (body included, its chunks dropped) under profiler"""
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, headers
+            return lambda data: None
+
+        started = time.perf_counter()
+        with profiler:
+            result = self.wsgi_app(environ, capture)
+            try:
+                for _ in result:
+                    pass
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        captured['seconds'] = time.perf_counter() - started
+        return captured
+
+    def _sampler(self, *stop_codes):
+        return StackSampler(threading.get_ident(), self.interval, stop_codes)
+
+    def _on_demand(self, mode, environ, start_response):
+        environ['HTTP_CACHE_CONTROL'] = 'no-cache'
+        if mode == 'sample':
+            sampler = self._sampler(self._profiled.__code__)
+            captured = self._profiled(environ, sampler)
+            report = sampler.collapsed()
+        else:
+            profile = cProfile.Profile()
+            captured = self._profiled(environ, profile)
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(60)
+            report = out.getvalue()
+
+        data = report.encode('utf-8')
+        start_response('200 OK', [
+            ('Content-Type', 'text/plain; charset=utf-8'),
+            ('Content-Length', str(len(data))),
+            ('Cache-Control', 'no-store'),
+            ('X-Profile-Status', captured['status']),
+            ('X-Profile-Duration-Ms', f"{captured['seconds'] * 1000:.1f}"),
+        ])
+        return [data]
+
+    def _periodic(self, environ, start_response):
+        # Samples are taken in the app call and while the server iterates the body
+        sampler = self._sampler(self._periodic.__code__, ProfiledBody.__iter__.__code__)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except BaseException:
+            sampler.stop()
+            raise
+
+        def finish():
+            try:
+                self._write_profile(environ, sampler, time.perf_counter() - started)
+            except OSError as e:
+                print(f"Could not write request profile: {e}")
+
+        return ProfiledBody(body, sampler, finish)
+
+    def _write_profile(self, environ, sampler, seconds):
+        os.makedirs(self.directory, exist_ok=True)
+        name = '{}-{}-{}-{}-{:.0f}ms.collapsed'.format(
+            time.strftime('%Y%m%d-%H%M%S'), os.getpid(), environ.get('REQUEST_METHOD', 'GET'),
+            _slug(environ.get('PATH_INFO', '')), seconds * 1000)
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(sampler.collapsed())
+
+        with self._rotate_lock:
+            profiles = sorted(entry for entry in os.listdir(self.directory) if entry.endswith('.collapsed'))
+            for stale in profiles[:max(0, len(profiles) - self.keep)]:
+                try:
+                    os.remove(os.path.join(self.directory, stale))
+                except OSError:
+                    pass
+
+
+def init_profiling(app, default_directory):
+    """
+    Wrap app.wsgi_app when on-demand (PROFILE_SECRET) or periodic (PROFILE_EVERY_N)
+    profiling is on; periodic profiles go to PROFILE_DIR, else default_directory
+    """
+    secret = os.environ.get('PROFILE_SECRET') or None
+    every_n = int(os.environ.get('PROFILE_EVERY_N', '0'))
+    if not secret and not every_n:
+        return
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        secret=secret,
+        every_n=every_n,
+        directory=os.environ.get('PROFILE_DIR') or default_directory,
+        keep=int(os.environ.get('PROFILE_KEEP', '200')),
+        interval=float(os.environ.get('PROFILE_INTERVAL_MS', '1')) / 1000,
+    )
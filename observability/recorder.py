@@ -0,0 +1,79 @@
+# /observability/recorder.py
+
+"""
+Traffic recorder, used by both services.
+
+With TRACE_LOG=<path>, every request except /admin, /metrics and /static is
+appended to a JSON-lines trace: arrival time, service, method, path, query,
+JSON body, status and duration. benchmarks/replay.py replays the traces
+against local instances at the recorded pace (or N times faster); the
+service tag lets one recording drive both the dashboard and the ML API.
+
+Traces are sanitized before they are written. Headers and cookies are never
+recorded. Query parameters and JSON keys that look like credentials (token,
+secret, password, key, auth, ...) are replaced by "[redacted]". Non-JSON
+bodies are reduced to their size. The file is rotated like the slow-request
+log: TRACE_LOG_MB (default 50) per file, TRACE_LOG_BACKUPS (default 5) old
+files kept.
+"""
+
+import os
+import time
+
+from flask import current_app, g, request
+
+from .logs import REDACTED, SENSITIVE_KEY, JsonLinesLog, sanitize
+
+SKIPPED_PREFIXES = ('/admin', '/metrics', '/static')
+
+
+def sanitized_query(args):
+    """Query string as [key, value] pairs (order and repeats kept), credentials redacted"""
+    return [[key, REDACTED if SENSITIVE_KEY.search(key) else value]
+            for key, value in args.items(multi=True)]
+
+
+def _start_request():
+    g.trace_arrival = time.time()
+    g.trace_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.get('trace_started')
+    if started is None or request.path.startswith(SKIPPED_PREFIXES):
+        return response
+    record = {
+        'ts': round(g.trace_arrival, 6),
+        'service': current_app.trace_service,
+        'method': request.method,
+        'path': request.path,
+        'query': sanitized_query(request.args),
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+    if request.content_length:
+        body = request.get_json(silent=True)
+        if body is not None:
+            record['body'] = sanitize(body)
+        else:
+            record['body_bytes'] = request.content_length
+    try:
+        current_app.trace_log.write(record)
+    except OSError as e:
+        print(f"Could not write traffic trace: {e}")
+    return response
+
+
+def init_recorder(app, service):
+    """Record sanitized request traces, tagged with service, if TRACE_LOG is set"""
+    path = os.environ.get('TRACE_LOG')
+    if not path:
+        return
+    app.trace_service = service
+    app.trace_log = JsonLinesLog(
+        path,
+        max_bytes=int(float(os.environ.get('TRACE_LOG_MB', '50')) * 1024 * 1024),
+        backups=int(os.environ.get('TRACE_LOG_BACKUPS', '5')),
+    )
+    app.before_request(_start_request)
+    app.after_request(_record_request)
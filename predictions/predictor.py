@@ -5,12 +5,14 @@ This module provides demand forecasting using the trained Units Predictor model.
 Predicts Units Sold, then calculates Total Sales = Units × Price
 """
 
+import os
 import pickle
 import numpy as np
 from pathlib import Path
 import json
 
-MODEL_DIR = Path(__file__).parent / "trained_models"
+# MODEL_DIR overrides the bundled models (e.g. one written by train_models.py --model-dir)
+MODEL_DIR = Path(os.environ.get('MODEL_DIR') or Path(__file__).parent / "trained_models")
 
 class UnitsPredictor:
     """Units prediction service for demand forecasting"""
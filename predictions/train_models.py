@@ -4,13 +4,22 @@ Train Units Predictor Model for Adidas Sales
 This script trains a demand forecasting model:
 - Units Predictor (Linear Regression) - Predicts Units Sold
 - Total Sales is calculated as: Predicted Units x Price per Unit
+
+Every candidate is also benchmarked for serving cost: training time,
+artifact size, load time, and single-row and 1k-batch prediction latency.
+Candidates over a --max-* budget are rejected, and a costlier candidate
+must beat a cheaper one by more than --min-r2-gain to be chosen.
 """
 
+import argparse
+import os
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import pickle
 import json
+import tempfile
+import time
 from datetime import datetime
 
 from sklearn.model_selection import train_test_split
@@ -26,13 +35,102 @@ MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
 RANDOM_STATE = 42
 
+# Prediction latency sampling
+SINGLE_ROW_RUNS = 200
+BATCH_ROWS = 1000
+BATCH_RUNS = 20
+LOAD_RUNS = 5
+
 def print_header(text):
     print("\n" + "="*80)
     print(text)
     print("="*80)
 
-def train_units_predictor(df):
+def benchmark_candidate(model, label_encoders, X_test, train_seconds):
+    """Serving cost of a fitted candidate: artifact size, load time, prediction latency"""
+    artifact = pickle.dumps({'model': model, 'encoders': label_encoders})
+
+    # Load time of the artifact from disk, as the predictor loads it
+    with tempfile.NamedTemporaryFile(suffix='.pkl', delete=False) as f:
+        f.write(artifact)
+        artifact_path = f.name
+    try:
+        load_times = []
+        for _ in range(LOAD_RUNS):
+            start = time.perf_counter()
+            with open(artifact_path, 'rb') as f:
+                pickle.load(f)
+            load_times.append(time.perf_counter() - start)
+    finally:
+        os.remove(artifact_path)
+
+    rows = X_test[np.arange(SINGLE_ROW_RUNS) % len(X_test)]
+    single_times = []
+    for i in range(SINGLE_ROW_RUNS):
+        start = time.perf_counter()
+        model.predict(rows[i:i + 1])
+        single_times.append(time.perf_counter() - start)
+
+    batch = X_test[np.arange(BATCH_ROWS) % len(X_test)]
+    model.predict(batch)
+    batch_times = []
+    for _ in range(BATCH_RUNS):
+        start = time.perf_counter()
+        model.predict(batch)
+        batch_times.append(time.perf_counter() - start)
+
+    single_ms = np.array(single_times) * 1000
+    return {
+        'train_seconds': round(train_seconds, 3),
+        'artifact_bytes': len(artifact),
+        'load_ms': round(float(np.median(load_times)) * 1000, 3),
+        'single_row_p50_ms': round(float(np.percentile(single_ms, 50)), 3),
+        'single_row_p95_ms': round(float(np.percentile(single_ms, 95)), 3),
+        'batch_1k_ms': round(float(np.median(batch_times)) * 1000, 3),
+    }
+
+def print_cost(cost):
+    print(f"  Train time: {cost['train_seconds']:.2f}s")
+    print(f"  Artifact: {cost['artifact_bytes'] / 1024:,.0f} KB, load {cost['load_ms']:.1f} ms")
+    print(f"  Predict: single row p50 {cost['single_row_p50_ms']:.2f} ms / p95 {cost['single_row_p95_ms']:.2f} ms, "
+          f"1k batch {cost['batch_1k_ms']:.2f} ms")
+
+def budget_violations(cost, budgets):
+    """Reasons a candidate is over budget (empty if within every budget)"""
+    reasons = []
+    if budgets.get('max_single_row_ms') and cost['single_row_p95_ms'] > budgets['max_single_row_ms']:
+        reasons.append(f"single-row p95 {cost['single_row_p95_ms']:.2f} ms > {budgets['max_single_row_ms']} ms")
+    if budgets.get('max_batch_ms') and cost['batch_1k_ms'] > budgets['max_batch_ms']:
+        reasons.append(f"1k batch {cost['batch_1k_ms']:.2f} ms > {budgets['max_batch_ms']} ms")
+    if budgets.get('max_artifact_mb') and cost['artifact_bytes'] > budgets['max_artifact_mb'] * 1024 * 1024:
+        reasons.append(f"artifact {cost['artifact_bytes'] / (1024 * 1024):.1f} MB > {budgets['max_artifact_mb']} MB")
+    return reasons
+
+def select_candidate(candidates, budgets, min_r2_gain):
+    """
+    Cheapest candidate (by single-row latency) within budget, unless a costlier
+    one beats it by more than min_r2_gain R2. None if every candidate is rejected.
+    """
+    eligible = []
+    for candidate in candidates:
+        reasons = budget_violations(candidate['cost'], budgets)
+        if reasons:
+            print(f"[REJECTED] {candidate['model_type']}: {'; '.join(reasons)}")
+        else:
+            eligible.append(candidate)
+    if not eligible:
+        return None
+
+    eligible.sort(key=lambda c: c['cost']['single_row_p50_ms'])
+    best = eligible[0]
+    for candidate in eligible[1:]:
+        if candidate['r2'] > best['r2'] + min_r2_gain:
+            best = candidate
+    return best
+
+def train_units_predictor(df, budgets=None, min_r2_gain=0.0):
     """Train model to predict Units Sold (demand forecasting)"""
+    budgets = budgets or {}
     print_header("TRAINING UNITS PREDICTOR (DEMAND FORECASTING)")
 
     print("\n[INFO] Target: Units Sold")
@@ -79,7 +177,9 @@ def train_units_predictor(df):
     # Train Linear Regression model
     print("\n[TRAINING] Linear Regression model...")
     model_lr = LinearRegression()
+    start = time.perf_counter()
     model_lr.fit(X_train, y_train)
+    train_lr = time.perf_counter() - start
 
     y_pred_lr = model_lr.predict(X_test)
     mae_lr = mean_absolute_error(y_test, y_pred_lr)
@@ -89,6 +189,8 @@ def train_units_predictor(df):
     print(f"  MAE: {mae_lr:.2f} units")
     print(f"  RMSE: {rmse_lr:.2f} units")
     print(f"  R2: {r2_lr:.4f} ({r2_lr*100:.2f}%)")
+    cost_lr = benchmark_candidate(model_lr, label_encoders, X_test, train_lr)
+    print_cost(cost_lr)
 
     # Train Random Forest for comparison (using optimized hyperparameters)
     print("\n[TRAINING] Random Forest model (optimized hyperparameters)...")
@@ -99,7 +201,9 @@ def train_units_predictor(df):
         random_state=RANDOM_STATE,
         n_jobs=-1
     )
+    start = time.perf_counter()
     model_rf.fit(X_train, y_train)
+    train_rf = time.perf_counter() - start
 
     y_pred_rf = model_rf.predict(X_test)
     mae_rf = mean_absolute_error(y_test, y_pred_rf)
@@ -109,22 +213,27 @@ def train_units_predictor(df):
     print(f"  MAE: {mae_rf:.2f} units")
     print(f"  RMSE: {rmse_rf:.2f} units")
     print(f"  R2: {r2_rf:.4f} ({r2_rf*100:.2f}%)")
-
-    # Choose best model
-    if r2_rf > r2_lr:
-        print(f"\n[DECISION] Using Random Forest (R2: {r2_rf:.4f} > {r2_lr:.4f})")
-        model = model_rf
-        mae = mae_rf
-        r2 = r2_rf
-        rmse = rmse_rf
-        model_type = 'RandomForest'
-    else:
-        print(f"\n[DECISION] Using Linear Regression (R2: {r2_lr:.4f} >= {r2_rf:.4f})")
-        model = model_lr
-        mae = mae_lr
-        r2 = r2_lr
-        rmse = rmse_lr
-        model_type = 'LinearRegression'
+    cost_rf = benchmark_candidate(model_rf, label_encoders, X_test, train_rf)
+    print_cost(cost_rf)
+
+    # Choose best model: accuracy, subject to the latency and size budgets
+    candidates = [
+        {'model_type': 'LinearRegression', 'model': model_lr, 'mae': mae_lr, 'r2': r2_lr, 'rmse': rmse_lr,
+         'cost': cost_lr},
+        {'model_type': 'RandomForest', 'model': model_rf, 'mae': mae_rf, 'r2': r2_rf, 'rmse': rmse_rf,
+         'cost': cost_rf},
+    ]
+    print()
+    chosen = select_candidate(candidates, budgets, min_r2_gain)
+    if chosen is None:
+        raise SystemExit("[ERROR] Every candidate is over budget; no model saved")
+    others = ', '.join(f"{c['model_type']} {c['r2']:.4f}" for c in candidates if c is not chosen)
+    print(f"[DECISION] Using {chosen['model_type']} (R2: {chosen['r2']:.4f}; others: {others})")
+    model = chosen['model']
+    mae = chosen['mae']
+    r2 = chosen['r2']
+    rmse = chosen['rmse']
+    model_type = chosen['model_type']
 
     # Validate: Calculate revenue and compare to actual Total Sales
     print("\n" + "-"*80)
@@ -198,7 +307,14 @@ def train_units_predictor(df):
             'revenue_mae': revenue_mae,
             'revenue_rmse': revenue_rmse,
             'revenue_r2': revenue_r2,
+            **chosen['cost'],
         },
+        # Accuracy and serving cost of every candidate, chosen or not
+        'candidates': {
+            c['model_type']: {'units_mae': c['mae'], 'units_rmse': c['rmse'], 'units_r2': c['r2'], **c['cost']}
+            for c in candidates
+        },
+        'budgets': dict(budgets, min_r2_gain=min_r2_gain),
         'trained_date': datetime.now().isoformat(),
         'description': 'Units Predictor - Predicts Units Sold, then calculates Total Sales = Units x Price'
     }
@@ -211,8 +327,8 @@ def train_units_predictor(df):
 
     return model_data
 
-def save_metadata(df):
-    """Save metadata about unique values for dropdowns"""
+def save_metadata(df, model):
+    """Save metadata about unique values for dropdowns, plus the model benchmarks"""
     print_header("SAVING METADATA")
 
     metadata = {
@@ -233,7 +349,10 @@ def save_metadata(df):
             'min_samples_split': 3,
             'random_state': 42,
             'n_jobs': -1
-        }
+        },
+        'model_type': model['model_type'],
+        'benchmarks': model['candidates'],
+        'budgets': model['budgets'],
     }
 
     metadata_path = MODEL_DIR / "metadata.json"
@@ -242,22 +361,48 @@ def save_metadata(df):
 
     print(f"[OK] Metadata saved to: {metadata_path}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the units predictor')
+    parser.add_argument('--data', type=Path, default=DATA_FILE,
+                        help='Training CSV (e.g. a synthetic dataset from benchmarks/synthetic_data.py)')
+    parser.add_argument('--model-dir', type=Path, default=MODEL_DIR,
+                        help='Where to write the model and metadata')
+    parser.add_argument('--max-single-row-ms', type=float,
+                        help='Reject candidates whose single-row prediction p95 is slower than this')
+    parser.add_argument('--max-batch-ms', type=float,
+                        help='Reject candidates slower than this on a 1,000-row batch')
+    parser.add_argument('--max-artifact-mb', type=float,
+                        help='Reject candidates whose pickled artifact is larger than this')
+    parser.add_argument('--min-r2-gain', type=float, default=0.0,
+                        help='R2 a slower candidate must gain over a faster one to be chosen')
+    return parser.parse_args()
+
 def main():
     """Main training pipeline"""
+    global MODEL_DIR
+    args = parse_args()
+    MODEL_DIR = args.model_dir
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+
     print_header("ADIDAS UNITS PREDICTOR - DEMAND FORECASTING")
     print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
     # Load data
-    print("Loading dataset...")
-    df = pd.read_csv(DATA_FILE)
+    print(f"Loading dataset from {args.data}...")
+    df = pd.read_csv(args.data)
     df['Invoice Date'] = pd.to_datetime(df['Invoice Date'])
     print(f"[OK] Loaded {len(df):,} records\n")
 
     # Train model
-    model = train_units_predictor(df)
+    budgets = {
+        'max_single_row_ms': args.max_single_row_ms,
+        'max_batch_ms': args.max_batch_ms,
+        'max_artifact_mb': args.max_artifact_mb,
+    }
+    model = train_units_predictor(df, {k: v for k, v in budgets.items() if v}, args.min_r2_gain)
 
     # Save metadata
-    save_metadata(df)
+    save_metadata(df, model)
 
     print_header("TRAINING COMPLETE")
     print(f"End Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
@@ -268,6 +413,8 @@ def main():
     print(f"Units MAE: {model['metrics']['units_mae']:.2f} units")
     print(f"Revenue R2: {model['metrics']['revenue_r2']:.4f} ({model['metrics']['revenue_r2']*100:.2f}%)")
     print(f"Revenue MAE: ${model['metrics']['revenue_mae']:,.2f}")
+    print(f"Single-row p95: {model['metrics']['single_row_p95_ms']:.2f} ms, "
+          f"artifact: {model['metrics']['artifact_bytes'] / 1024:,.0f} KB")
 
     print(f"\nModel saved to: {MODEL_DIR}\n")
     print("Files:")